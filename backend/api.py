@@ -1,6 +1,9 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import FastAPI, HTTPException, Depends, Response, Header, Query, Request
+from fastapi.responses import PlainTextResponse
+import time
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Literal
 import sys
 import os
 
@@ -9,14 +12,27 @@ sys.path.append(os.getcwd())
 
 from backend.models.risk_engine import RiskEngine
 from backend.models.counterfactuals import Counterfactuals
+from backend.models.simulation_sessions import SimulationSessionManager
 # from backend.models.llm_engine import LLMEngine # Deprecated
 from backend.models.clinical_llm import ClinicalLLM
 from backend.models.history_engine import HistoryEngine
+from backend.models.batch_coalescer import BatchCoalescer
+from backend.models.explain_jobs import ExplanationJobManager
+from backend.models.cohort_engine import CohortEngine
+from backend.models.engine_registry import EngineRegistry
+from backend.models.model_registry import ModelRegistry
+from backend.models.hot_swap import HotSwapRiskEngine
+from backend.models.metrics import METRICS
+from backend.models.shared_artifacts import artifact_mmap_mode
+from backend.dependencies import get_engine
 
 # Import Schemas
 from backend.schemas.patient import (
     PatientRequest, RiskResponse, ExplanationResponse, 
-    ReportResponse, SimulationRequest, SimulationResponse
+    ReportResponse, BatchPatientRequest, BatchRiskResponse, ExplanationJobResponse, SimulationRequest, SimulationResponse,
+    ScenarioRequest, ScenarioResponse, CounterfactualRequest, CounterfactualResponse,
+    SensitivityRequest, SensitivityResponse, SimulationSessionResponse,
+    SessionSimulationRequest, SessionSimulationResponse
 )
 
 # Import Routes
@@ -25,8 +41,59 @@ from backend.routes import cohort, feedback, fhir
 from fastapi.staticfiles import StaticFiles
 from backend.models.pdf_service import PDFService
 
-# 1. Initialize App
-app = FastAPI(title="Clinical Risk Predictor API", version="2.0")
+# 1. Engine Registry (one instance of each engine, shared by all routers)
+# Coalesce concurrent /predict calls into vectorized batches
+PREDICT_WINDOW_MS = 2.0
+PREDICT_MAX_BATCH = 64
+
+engines = EngineRegistry()
+# Versioned model directories; ACTIVE picks the version served at startup
+model_registry = ModelRegistry()
+DEFAULT_MODEL_DIR = "backend/models"
+
+def _load_risk_engine(model_dir: str = DEFAULT_MODEL_DIR):
+    return RiskEngine(model_dir=model_dir, mmap_mode=artifact_mmap_mode())
+
+def _build_risk_engine():
+    # Wrapped so /admin/models can hot-swap versions without a restart
+    active = model_registry.active_version()
+    model_dir = model_registry.version_dir(active) if active else DEFAULT_MODEL_DIR
+    return HotSwapRiskEngine(_load_risk_engine(model_dir), model_registry, engine_factory=_load_risk_engine)
+
+def _build_coalescer():
+    risk_engine = engines.get("risk")
+    return BatchCoalescer(risk_engine, PREDICT_WINDOW_MS, PREDICT_MAX_BATCH) if risk_engine else None
+
+def _build_explain_jobs():
+    # Background SHAP jobs for /explain/async (bounded process pool)
+    risk_engine = engines.get("risk")
+    return ExplanationJobManager(risk_engine, max_workers=2) if risk_engine else None
+
+engines.register("risk", _build_risk_engine)
+engines.register("coalescer", _build_coalescer)
+engines.register("explain_jobs", _build_explain_jobs, lazy=True)
+# Scenario library is read once, not per request
+engines.register("counterfactuals", lambda: Counterfactuals(engines.get("risk")) if engines.get("risk") else None)
+# What-if sessions keep each patient's baseline score and explanation
+engines.register("simulation_sessions",
+                 lambda: SimulationSessionManager(engines.get("risk")) if engines.get("risk") else None)
+# Maps the fitted cohort from a snapshot (rebuilt when the CSV's checksum changes),
+# so workers start without refitting and share its pages; TWIN_INDEX=ivf for the IVF index
+engines.register("cohort", lambda: CohortEngine(snapshot_dir="data/cohort_snapshot"))
+# Downloads (first run) and loads in a background thread; see /ready
+engines.register("clinical_llm", lambda: ClinicalLLM(background=True))
+engines.register("history", HistoryEngine)
+engines.register("pdf", PDFService)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # No-op for engines already built (preloaded master, test overrides)
+    app.state.engines.init_eager()
+    yield
+
+# 2. Initialize App
+app = FastAPI(title="Clinical Risk Predictor API", version="2.0", lifespan=lifespan)
+app.state.engines = engines
 
 # Mount PDF directory
 pdf_dir = os.path.join(os.getcwd(), "backend", "pdfs")
@@ -37,7 +104,7 @@ app.include_router(cohort.router)
 app.include_router(feedback.router)
 app.include_router(fhir.router)
 
-# 2. CORS Setup (Allow All for Dev)
+# 3. CORS Setup (Allow All for Dev)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -46,173 +113,421 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 3. Load Model (Global State)
-try:
-    risk_engine = RiskEngine()
-    print("Risk Engine loaded successfully.")
-except Exception as e:
-    print(f"Error loading Risk Engine: {e}")
-    risk_engine = None
-
-# Initialize Clinical LLM (Embedded)
-try:
-    # This will trigger the download on first run!
-    clinical_llm = ClinicalLLM()
-    print("Clinical LLM initialized.")
-except Exception as e:
-    print(f"Error initializing Clinical LLM: {e}")
-    clinical_llm = None
-
-# Initialize History Engine
-try:
-    history_engine = HistoryEngine()
-    print("History Engine initialized.")
-except Exception as e:
-    print(f"Error initializing History Engine: {e}")
-    history_engine = None
-
-# Initialize PDF Service
-try:
-    pdf_service = PDFService()
-    print("PDF Service initialized.")
-except Exception as e:
-    print(f"Error initializing PDF Service: {e}")
-    pdf_service = None
+# 4. Metrics
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template (e.g. /explain/jobs/{job_id}) keeps label cardinality bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        METRICS.observe("http_request_duration_seconds", (request.method, path, str(status)),
+                        time.perf_counter() - started)
+
+def _histogram_samples(snapshot, labels=None):
+    labels = labels or {}
+    samples = [("_bucket", dict(labels, le=le), count) for le, count in snapshot["buckets"].items()]
+    samples += [("_sum", labels, snapshot["sum"]), ("_count", labels, snapshot["count"])]
+    return samples
+
+def _collect_engine_metrics():
+    # Read engines only if already built: a scrape must not trigger loading
+    stats = engines.stats()
+    yield ("engine_init_seconds", "gauge", "Time taken to initialize each engine.",
+           [("", {"engine": name}, s["init_seconds"]) for name, s in stats.items() if s.get("init_seconds") is not None])
+    yield ("engine_ready", "gauge", "1 if the engine initialized successfully.",
+           [("", {"engine": name}, 1 if s["status"] in ("ready", "overridden") else 0) for name, s in stats.items()])
+
+    risk_engine = engines.get("risk") if engines.is_built("risk") else None
+    if risk_engine is not None and hasattr(risk_engine, "cache_stats"):
+        cache = risk_engine.cache_stats()
+        yield ("prediction_cache_events_total", "counter", "Prediction cache lookups and evictions.",
+               [("", {"event": e}, cache[e]) for e in ("hits", "misses", "evictions")])
+        yield ("prediction_cache_entries", "gauge", "Entries in the prediction cache.", [("", {}, cache["size"])])
+
+    coalescer = engines.get("coalescer") if engines.is_built("coalescer") else None
+    if coalescer is not None:
+        stats = coalescer.stats()
+        yield ("coalescer_batch_size", "histogram", "Requests scored per coalesced batch.",
+               _histogram_samples(stats["batch_size"]))
+        yield ("coalescer_wait_milliseconds", "histogram", "Time requests waited in the coalescer queue.",
+               _histogram_samples(stats["wait_ms"]))
+        yield ("coalescer_queue_depth", "gauge", "Requests waiting to be batched.", [("", {}, stats["queue_depth"])])
+
+    clinical_llm = engines.get("clinical_llm") if engines.is_built("clinical_llm") else None
+    if clinical_llm is not None:
+        yield ("clinical_llm_ready", "gauge", "1 once the Clinical LLM is loaded.",
+               [("", {"state": clinical_llm.state}, 1 if clinical_llm.is_ready else 0)])
+
+METRICS.register_collector(_collect_engine_metrics)
 
 # 5. Helper Functions
+# Seconds clients should wait before retrying while the Clinical LLM loads
+LLM_RETRY_AFTER_SECONDS = 30
+
 def get_risk_level(score: float) -> str:
     if score < 0.2: return "Low"
     if score < 0.6: return "Moderate"
     return "High"
 
+def score_patients(risk_engine, patients):
+    """
+    Scores patients and returns (scores, model_version) from the same model.
+    """
+    if hasattr(risk_engine, "score_batch"):
+        return risk_engine.score_batch(patients)
+    return risk_engine.predict_risk_batch(patients), getattr(risk_engine, "model_version", None)
+
+def lease_engine(risk_engine):
+    """
+    Context manager yielding one model version for a multi-step handler
+    (see HotSwapRiskEngine.lease); plain engines are yielded as they are.
+    """
+    lease = getattr(risk_engine, "lease", None)
+    return lease() if lease is not None else nullcontext(risk_engine)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Admin endpoints are open unless ADMIN_TOKEN is set
+    expected = os.environ.get("ADMIN_TOKEN")
+    if expected and x_admin_token != expected:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def require_clinical_llm(clinical_llm):
+    if clinical_llm is None or clinical_llm.state == ClinicalLLM.FAILED:
+        error = clinical_llm.error if clinical_llm is not None else None
+        raise HTTPException(status_code=503, detail=f"Clinical LLM failed to load: {error or 'see server logs'}")
+    if not clinical_llm.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Clinical LLM is still loading (possibly downloading). Retry later.",
+            headers={"Retry-After": str(LLM_RETRY_AFTER_SECONDS)}
+        )
+
 # 6. Endpoints
 @app.get("/health")
-def health_check():
+def health_check(risk_engine=Depends(get_engine("risk"))):
     if risk_engine is None:
         raise HTTPException(status_code=503, detail="Risk Engine not initialized")
     return {"status": "healthy", "model_loaded": True}
 
+@app.get("/ready")
+def readiness(response: Response, risk_engine=Depends(get_engine("risk")),
+              clinical_llm=Depends(get_engine("clinical_llm"))):
+    components = {
+        "risk_engine": {"state": ClinicalLLM.READY if risk_engine is not None else ClinicalLLM.FAILED},
+        "clinical_llm": clinical_llm.status() if clinical_llm is not None else {"state": ClinicalLLM.FAILED},
+    }
+    states = {c["state"] for c in components.values()}
+    if states == {ClinicalLLM.READY}:
+        status = ClinicalLLM.READY
+    elif ClinicalLLM.FAILED in states:
+        status = ClinicalLLM.FAILED
+    else:
+        status = ClinicalLLM.LOADING
+
+    # Predictions only need the risk engine; report endpoints answer 503 + Retry-After until the LLM is ready
+    if risk_engine is None:
+        response.status_code = 503
+    return {"status": status, "components": components}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/stats")
+def cache_stats(risk_engine=Depends(get_engine("risk"))):
+    if risk_engine is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    return risk_engine.cache_stats()
+
+@app.get("/engines")
+def engine_stats():
+    # Init status, duration and RSS growth per engine
+    return app.state.engines.stats()
+
+@app.get("/predict/coalescer/stats")
+def coalescer_stats(predict_coalescer=Depends(get_engine("coalescer"))):
+    if predict_coalescer is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    return predict_coalescer.stats()
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+def list_models(risk_engine=Depends(get_engine("risk"))):
+    serving = risk_engine.status() if hasattr(risk_engine, "status") else {}
+    return {"versions": model_registry.list_versions(), "registry_active": model_registry.active_version(), **serving}
+
+@app.post("/admin/models/{version}/activate", status_code=202, dependencies=[Depends(require_admin)])
+def activate_model(version: str, risk_engine=Depends(get_engine("risk"))):
+    if risk_engine is None or not hasattr(risk_engine, "swap_to"):
+        raise HTTPException(status_code=503, detail="Risk Engine does not support hot-swap")
+    try:
+        return risk_engine.swap_to(version)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.get("/")
 def root():
     return {"message": "Clinical Risk Predictor API is running", "docs": "/docs"}
 
 @app.post("/predict", response_model=RiskResponse)
-def predict_risk(patient: PatientRequest):
+def predict_risk(patient: PatientRequest, risk_engine=Depends(get_engine("risk")),
+                 predict_coalescer=Depends(get_engine("coalescer")),
+                 history_engine=Depends(get_engine("history"))):
     if risk_engine is None:
         raise HTTPException(status_code=503, detail="Risk Engine not ready")
     
     try:
         data = patient.dict()
-        score = risk_engine.predict_risk(data)
+        if predict_coalescer is not None:
+            score, model_version = predict_coalescer.predict_with_version(data)
+        else:
+            scores, model_version = score_patients(risk_engine, [data])
+            score = scores[0]
         level = get_risk_level(score)
         
         # Save to history
         if history_engine:
             try:
-                history_engine.save_record(data, score, level)
+                history_engine.save_record(data, score, level, model_version=model_version)
+            except Exception as hist_e:
+                print(f"Warning: Failed to save history: {hist_e}")
+
+        return {"risk_score": score, "risk_level": level, "model_version": model_version}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/batch", response_model=BatchRiskResponse)
+def predict_risk_batch(request: BatchPatientRequest, risk_engine=Depends(get_engine("risk")),
+                       history_engine=Depends(get_engine("history"))):
+    if risk_engine is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    
+    try:
+        data = [p.dict() for p in request.patients]
+        scores, model_version = score_patients(risk_engine, data)
+        levels = [get_risk_level(s) for s in scores]
+        
+        # Save to history in one write
+        if history_engine:
+            try:
+                history_engine.save_records(data, scores, levels, model_version=model_version)
             except Exception as hist_e:
                 print(f"Warning: Failed to save history: {hist_e}")
 
-        return {"risk_score": score, "risk_level": level}
+        return {
+            "results": [{"risk_score": s, "risk_level": l, "model_version": model_version} for s, l in zip(scores, levels)],
+            "model_version": model_version
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/history")
-def get_history(limit: int = 10):
+def get_history(limit: int = 10, history_engine=Depends(get_engine("history"))):
     if history_engine is None:
         raise HTTPException(status_code=503, detail="History Engine not ready")
     return history_engine.get_history(limit)
 
 
 @app.post("/explain", response_model=ExplanationResponse)
-def explain_risk(patient: PatientRequest):
+def explain_risk(patient: PatientRequest, risk_engine=Depends(get_engine("risk")),
+                 tier: Optional[Literal["fast", "standard", "exact"]] = None,
+                 budget_ms: Optional[float] = Query(None, gt=0)):
+    # tier trades attribution quality for latency; budget_ms caps it further
     if risk_engine is None:
         raise HTTPException(status_code=503, detail="Risk Engine not ready")
     
     try:
         data = patient.dict()
-        explanations = risk_engine.explain_risk(data)
-        return {"explanations": explanations}
+        with lease_engine(risk_engine) as engine:
+            result = engine.explain_risk_detailed(data, tier=tier, budget_ms=budget_ms)
+            return dict(result, model_version=getattr(engine, "model_version", None))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/explain/async", response_model=ExplanationJobResponse, status_code=202)
+def submit_explanation_job(patient: PatientRequest, explain_jobs=Depends(get_engine("explain_jobs"))):
+    if explain_jobs is None:
+        raise HTTPException(status_code=503, detail="Explanation jobs not available")
+    
+    try:
+        return explain_jobs.submit(patient.dict())
+    except OverflowError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/explain/jobs/{job_id}", response_model=ExplanationJobResponse)
+def get_explanation_job(job_id: str, explain_jobs=Depends(get_engine("explain_jobs"))):
+    if explain_jobs is None:
+        raise HTTPException(status_code=503, detail="Explanation jobs not available")
+    
+    job = explain_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+def simulate_pair(risk_engine, patient: Dict[str, Any], modifications: Dict[str, Any]):
+    """
+    Scores the patient and the modified patient in one batch (one model version).
+    Returns (original_risk, new_risk, modified_data, model_version).
+    """
+    modified = dict(patient, **modifications)
+    scores, model_version = score_patients(risk_engine, [patient, modified])
+    return scores[0], scores[1], modified, model_version
+
 @app.post("/simulate", response_model=SimulationResponse)
-def simulate_risk(request: SimulationRequest):
+def simulate_risk(request: SimulationRequest, risk_engine=Depends(get_engine("risk"))):
     if risk_engine is None:
         raise HTTPException(status_code=503, detail="Risk Engine not ready")
     
     try:
-        cf = Counterfactuals(risk_engine)
-        result = cf.predict_simulation(request.patient.dict(), request.modifications)
-        
-        original_risk = risk_engine.predict_risk(request.patient.dict())
-        new_risk = result['new_risk']
-        
+        original_risk, new_risk, _, model_version = simulate_pair(risk_engine, request.patient.dict(),
+                                                                  request.modifications)
         return {
             "original_risk": original_risk,
             "new_risk": new_risk,
-            "risk_reduction": original_risk - new_risk
+            "risk_reduction": original_risk - new_risk,
+            "model_version": model_version
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/simulate/sessions", response_model=SimulationSessionResponse, status_code=201)
+def create_simulation_session(patient: PatientRequest, sessions=Depends(get_engine("simulation_sessions"))):
+    if sessions is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    return sessions.create(patient.dict())
+
+@app.get("/simulate/sessions/stats")
+def simulation_session_stats(sessions=Depends(get_engine("simulation_sessions"))):
+    if sessions is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    return sessions.stats()
+
+@app.get("/simulate/sessions/{session_id}", response_model=SimulationSessionResponse)
+def get_simulation_session(session_id: str, sessions=Depends(get_engine("simulation_sessions"))):
+    if sessions is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    session = sessions.summary(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/simulate/sessions/{session_id}/simulate", response_model=SessionSimulationResponse)
+def simulate_in_session(session_id: str, request: SessionSimulationRequest,
+                        sessions=Depends(get_engine("simulation_sessions"))):
+    if sessions is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    try:
+        result = sessions.simulate(session_id, request.modifications)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return result
+
+@app.delete("/simulate/sessions/{session_id}", status_code=204)
+def delete_simulation_session(session_id: str, sessions=Depends(get_engine("simulation_sessions"))):
+    if sessions is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return Response(status_code=204)
+
+@app.post("/simulate/scenarios", response_model=ScenarioResponse)
+def simulate_scenarios(request: ScenarioRequest, counterfactuals=Depends(get_engine("counterfactuals"))):
+    if counterfactuals is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    if request.top_k is not None and request.top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1")
+    
+    return counterfactuals.rank_scenarios(request.patient.dict(), request.scenarios, request.top_k)
+
+@app.post("/simulate/optimize", response_model=CounterfactualResponse)
+def optimize_counterfactual(request: CounterfactualRequest, counterfactuals=Depends(get_engine("counterfactuals"))):
+    if counterfactuals is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    if not 0.0 < request.target_risk <= 1.0 or request.top_k < 1 or request.time_limit_ms <= 0:
+        raise HTTPException(status_code=422, detail="Need 0 < target_risk <= 1, top_k >= 1 and time_limit_ms > 0")
+    
+    features = None
+    if request.features is not None:
+        features = {name: r.dict(exclude_none=True) for name, r in request.features.items()}
+    try:
+        return counterfactuals.minimal_changes(request.patient.dict(), request.target_risk, features,
+                                               request.top_k, request.time_limit_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.post("/simulate/sensitivity", response_model=SensitivityResponse)
+def simulate_sensitivity(request: SensitivityRequest, counterfactuals=Depends(get_engine("counterfactuals"))):
+    if counterfactuals is None:
+        raise HTTPException(status_code=503, detail="Risk Engine not ready")
+    
+    axes = [axis.dict(exclude_none=True) for axis in request.axes]
+    try:
+        return counterfactuals.sensitivity(request.patient.dict(), axes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 @app.post("/simulate/report", response_model=ReportResponse)
-def generate_simulation_report(request: SimulationRequest):
+def generate_simulation_report(request: SimulationRequest, risk_engine=Depends(get_engine("risk")),
+                               clinical_llm=Depends(get_engine("clinical_llm"))):
     if risk_engine is None:
         raise HTTPException(status_code=503, detail="Risk Engine not ready")
-    if clinical_llm is None:
-         raise HTTPException(status_code=503, detail="Clinical LLM failed to load.")
+    require_clinical_llm(clinical_llm)
     
     try:
-        # Calculate Risks
-        original_risk = risk_engine.predict_risk(request.patient.dict())
-        
-        # Calculate New Risk
-        cf = Counterfactuals(risk_engine)
-        result = cf.predict_simulation(request.patient.dict(), request.modifications)
-        new_risk = result['new_risk']
+        patient = request.patient.dict()
+        original_risk, new_risk, modified, model_version = simulate_pair(risk_engine, patient, request.modifications)
         
         # Generate Text
-        report = clinical_llm.generate_simulation_report(
-            request.patient.dict(), 
-            result['modified_data'], 
-            original_risk, 
-            new_risk
-        )
-        return {"report": report}
+        report = clinical_llm.generate_simulation_report(patient, modified, original_risk, new_risk)
+        return {"report": report, "model_version": model_version}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/report", response_model=ReportResponse)
-def generate_report(patient: PatientRequest):
+def generate_report(patient: PatientRequest, risk_engine=Depends(get_engine("risk")),
+                    clinical_llm=Depends(get_engine("clinical_llm")),
+                    pdf_service=Depends(get_engine("pdf"))):
     if risk_engine is None:
         raise HTTPException(status_code=503, detail="Risk Engine not ready")
-    if clinical_llm is None:
-         raise HTTPException(status_code=503, detail="Clinical LLM failed to load. Check server logs.")
-    if clinical_llm.model is None:
-         raise HTTPException(status_code=503, detail="Clinical LLM model not loaded (possibly downloading...). Check server console.")
+    require_clinical_llm(clinical_llm)
     
     try:
         data = patient.dict()
-        score = risk_engine.predict_risk(data)
-        level = get_risk_level(score)
-        explanations = risk_engine.explain_risk(data)
-        
-        report = clinical_llm.generate_report(data, score, level, explanations)
-        
-        pdf_filename = None
-        pdf_url = None
-        
-        if pdf_service:
-            try:
-                pdf_filename = pdf_service.generate_report(data, score, level, report)
-                # Helper to get base URL? For now relative
-                pdf_url = f"/pdfs/{pdf_filename}"
-            except Exception as pdf_e:
-                print(f"Error generating PDF: {pdf_e}")
+        # Score and explanation from the same model, even across a hot swap
+        with lease_engine(risk_engine) as engine:
+            scores, model_version = score_patients(engine, [data])
+            score = scores[0]
+            level = get_risk_level(score)
+            explanations = engine.explain_risk(data)
+            
+            report = clinical_llm.generate_report(data, score, level, explanations)
+            
+            pdf_filename = None
+            pdf_url = None
+            
+            if pdf_service:
+                try:
+                    pdf_filename = pdf_service.generate_report(data, score, level, report)
+                    # Helper to get base URL? For now relative
+                    pdf_url = f"/pdfs/{pdf_filename}"
+                except Exception as pdf_e:
+                    print(f"Error generating PDF: {pdf_e}")
 
-        return {"report": report, "pdf_url": pdf_url}
+        return {"report": report, "pdf_url": pdf_url, "model_version": model_version}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
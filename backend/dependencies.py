@@ -0,0 +1,19 @@
+from functools import lru_cache
+
+from fastapi import Request
+
+
+@lru_cache(maxsize=None)
+def get_engine(name: str):
+    """
+    FastAPI dependency returning the named engine from the app's EngineRegistry
+    (None if it failed to initialize). Usage: Depends(get_engine("risk")).
+
+    The same callable is returned for a given name, so tests can also use
+    app.dependency_overrides[get_engine("risk")] = lambda: fake.
+    """
+    def dependency(request: Request):
+        return request.app.state.engines.get(name)
+
+    dependency.__name__ = f"get_{name}_engine"
+    return dependency
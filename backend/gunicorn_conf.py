@@ -0,0 +1,34 @@
+# Gunicorn config for multi-worker deployments with shared model memory.
+#
+#   gunicorn backend.api:app -c backend/gunicorn_conf.py
+#
+# The app (RiskEngine, CohortEngine, ...) is imported once in the master with
+# artifacts memory-mapped read-only, then workers are forked and share those
+# pages copy-on-write instead of each loading its own copy.
+# Deploy new artifacts by writing a new file and renaming it over the old one
+# (os.replace) - never rewrite a mapped file in place.
+import os
+
+# Must be set before the app module is imported (preload below)
+os.environ.setdefault("SHARED_ARTIFACTS", "1")
+
+from backend.models.shared_artifacts import freeze_for_fork, memory_usage
+
+bind = "0.0.0.0:8001"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before workers fork.
+    # Build the engines here (not in each worker's lifespan) so they are shared.
+    from backend.api import app
+    app.state.engines.init_eager()
+    freeze_for_fork()
+    server.log.info(f"Master memory after preload: {memory_usage()}")
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked. Memory: {memory_usage()}")
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+from .metrics import Histogram
+
+
+class BatchCoalescer:
+    """
+    Micro-batching scheduler in front of RiskEngine.
+
+    Requests that arrive within `window_ms` of the first queued request (or
+    until `max_batch_size` is reached) are scored together with one
+    predict_risk_batch call, and each caller's Future is resolved with its
+    own score.
+    """
+
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+    WAIT_MS_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+    def __init__(self, risk_engine, window_ms: float = 2.0, max_batch_size: int = 64):
+        self.risk_engine = risk_engine
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batch_sizes = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(self.WAIT_MS_BUCKETS)
+        self.errors = 0
+
+        self._closed = False
+        self._start_worker()
+        # Threads don't survive fork (preloaded multi-worker servers): restart in the child
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, name="predict-coalescer", daemon=True)
+        self._worker.start()
+
+    def _after_fork(self):
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        if not self._closed:
+            self._start_worker()
+
+    def submit(self, patient_data: Dict[str, Any]) -> Future:
+        """
+        Queues one patient and returns a Future for its risk score.
+        """
+        if self._closed:
+            raise RuntimeError("BatchCoalescer is closed")
+        future = Future()
+        self._queue.put((patient_data, future, time.perf_counter()))
+        return future
+
+    def predict(self, patient_data: Dict[str, Any], timeout: float = 30.0) -> float:
+        """
+        Blocking helper for sync endpoints.
+        """
+        return self.submit(patient_data).result(timeout=timeout)
+
+    def predict_with_version(self, patient_data: Dict[str, Any], timeout: float = 30.0):
+        """
+        Like predict, also returning the model version that scored the batch
+        (None if the engine doesn't report one).
+        """
+        future = self.submit(patient_data)
+        score = future.result(timeout=timeout)
+        return score, getattr(future, "model_version", None)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.perf_counter() + self.window_ms / 1000.0
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._score(batch)
+            if stop:
+                return
+
+    def _score(self, batch: List[tuple]):
+        started = time.perf_counter()
+        with self._stats_lock:
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.wait_ms.observe((started - enqueued) * 1000)
+
+        patients = [patient for patient, _, _ in batch]
+        try:
+            # score_batch scores the whole batch on one model version and reports it
+            if hasattr(self.risk_engine, "score_batch"):
+                scores, model_version = self.risk_engine.score_batch(patients)
+            else:
+                scores, model_version = self.risk_engine.predict_risk_batch(patients), None
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), score in zip(batch, scores):
+            future.model_version = model_version
+            future.set_result(score)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "window_ms": self.window_ms,
+                "max_batch_size": self.max_batch_size,
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batch_sizes.count,
+                "requests": int(self.batch_sizes.sum),
+                "errors": self.errors,
+                "batch_size": self.batch_sizes.snapshot(),
+                "wait_ms": self.wait_ms.snapshot(),
+            }
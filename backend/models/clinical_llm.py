@@ -1,15 +1,28 @@
 import os
+import re
 import sys
+import threading
 from typing import Dict, Any, List, Optional
 try:
     from gpt4all import GPT4All
-    from huggingface_hub import hf_hub_download
+    from huggingface_hub import hf_hub_url, get_hf_file_metadata
+    from huggingface_hub.utils import build_hf_headers
 except ImportError:
     GPT4All = None
-    hf_hub_download = None
+
+from backend.utils.download import resumable_download, sha256_file
+from backend.models.metrics import timed
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
 
 class ClinicalLLM:
-    def __init__(self, model_repo="MaziyarPanahi/BioMistral-7B-GGUF", model_file="BioMistral-7B.Q4_K_M.gguf"):
+    # Readiness states reported by /ready
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, model_repo="MaziyarPanahi/BioMistral-7B-GGUF", model_file="BioMistral-7B.Q4_K_M.gguf",
+                 background=False, sha256=None):
         """
         Initialize the Clinical LLM model using GPT4All.
         Automatically downloads the GGUF model if not present locally.
@@ -17,6 +30,10 @@ class ClinicalLLM:
         Args:
             model_repo (str): HuggingFace repository ID.
             model_file (str): Specific GGUF file name to download.
+            background (bool): Download/load in a daemon thread and return immediately.
+                Check `state` (loading/ready/failed) before generating.
+            sha256 (str): Expected checksum of the GGUF file. Defaults to the
+                LFS checksum published by the Hub.
         """
         self.model = None
         # Store models in backend/models/weights
@@ -24,32 +41,61 @@ class ClinicalLLM:
         self.model_path = os.path.join(self.weights_dir, model_file)
         self.repo_id = model_repo
         self.filename = model_file
+        self.expected_sha256 = sha256
+        
+        self.state = self.LOADING
+        self.error = None
+        self.download_progress = {"bytes": 0, "total": None}
+        self._loader = None
         
         if GPT4All is None:
             print("❌ Error: gpt4all not installed. Cannot run ClinicalLLM.")
+            self._fail("gpt4all not installed")
             return
 
-        self._load_model()
+        if background:
+            self._start_loader()
+            # Threads don't survive fork (preloaded multi-worker servers): restart in the child
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._after_fork)
+        else:
+            self._load_model()
+
+    def _start_loader(self):
+        self._loader = threading.Thread(target=self._load_model, name="clinical-llm-loader", daemon=True)
+        self._loader.start()
+
+    def _after_fork(self):
+        if self.state == self.LOADING:
+            self._start_loader()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == self.READY
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        if self._loader is not None:
+            self._loader.join(timeout)
+        return self.is_ready
 
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "error": self.error, "download": dict(self.download_progress)}
+
+    def _fail(self, error: str):
+        self.error = error
+        self.state = self.FAILED
+
+    @timed("clinical_llm", "load")
     def _load_model(self):
         """Downloads (if needed) and loads the model into memory."""
         os.makedirs(self.weights_dir, exist_ok=True)
 
-        if not os.path.exists(self.model_path):
-            print(f"⬇️ Clinical Model not found. Downloading {self.filename} from {self.repo_id}...")
-            print("This is a one-time download (~4-5GB). Please be patient.")
-            try:
-                # Download to the specific path
-                downloaded_path = hf_hub_download(
-                    repo_id=self.repo_id,
-                    filename=self.filename,
-                    local_dir=self.weights_dir,
-                    local_dir_use_symlinks=False
-                )
-                print(f"✅ Download complete: {downloaded_path}")
-            except Exception as e:
-                print(f"❌ Failed to download model: {e}")
-                return
+        try:
+            self._ensure_weights()
+        except Exception as e:
+            print(f"❌ Failed to download model: {e}")
+            self._fail(f"Download failed: {e}")
+            return
 
         print(f"🧠 Loading Clinical Model: {self.filename}...")
         try:
@@ -65,10 +111,71 @@ class ClinicalLLM:
                 self.model = GPT4All(model_name=self.filename, model_path=self.weights_dir, allow_download=False, device='cpu')
             
             print("✅ Clinical Model loaded successfully.")
+            self.state = self.READY
         except Exception as e:
             print(f"❌ Failed to load model execution: {e}")
             self.model = None
+            self._fail(f"Load failed: {e}")
+
+    def _ensure_weights(self):
+        """
+        Makes sure a checksum-verified GGUF is at model_path.
+        A verified checksum is recorded next to the file so restarts don't rehash ~4GB.
+        """
+        checksum_path = self.model_path + ".sha256"
+        if os.path.exists(self.model_path) and os.path.exists(checksum_path):
+            return
+
+        url, expected_sha256, expected_size = self._remote_file_info()
+        if os.path.exists(self.model_path):
+            if expected_sha256 is None:
+                # Offline and never verified: trust the existing file
+                return
+            if sha256_file(self.model_path) == expected_sha256:
+                self._write_checksum(checksum_path, expected_sha256)
+                return
+            print(f"⚠️ {self.filename} does not match its checksum. Downloading again.")
+            os.remove(self.model_path)
+
+        if url is None:
+            raise RuntimeError("Model not available locally and the Hub could not be reached")
+
+        print(f"⬇️ Clinical Model not found. Downloading {self.filename} from {self.repo_id}...")
+        print("This is a one-time download (~4-5GB). Interrupted downloads resume on restart.")
+        resumable_download(
+            url, self.model_path,
+            expected_sha256=expected_sha256, expected_size=expected_size,
+            headers=build_hf_headers(), progress=self._on_progress
+        )
+        if expected_sha256:
+            self._write_checksum(checksum_path, expected_sha256)
+        print(f"✅ Download complete: {self.model_path}")
+
+    def _remote_file_info(self):
+        """
+        (url, sha256, size) of the GGUF on the Hub; (None, pinned sha256, None) if unreachable.
+        For LFS files the Hub's ETag is the file's SHA-256.
+        """
+        try:
+            url = hf_hub_url(repo_id=self.repo_id, filename=self.filename)
+            metadata = get_hf_file_metadata(url)
+        except Exception as e:
+            print(f"⚠️ Could not fetch model metadata from the Hub: {e}")
+            return None, self.expected_sha256, None
+
+        etag = (metadata.etag or "").strip('"').lower()
+        sha256 = self.expected_sha256 or (etag if SHA256_PATTERN.match(etag) else None)
+        return metadata.location or url, sha256, metadata.size
+
+    def _on_progress(self, downloaded: int, total: Optional[int]):
+        self.download_progress = {"bytes": downloaded, "total": total}
+
+    @staticmethod
+    def _write_checksum(path: str, sha256: str):
+        with open(path, "w") as f:
+            f.write(sha256 + "\n")
 
+    @timed("clinical_llm", "generate_report")
     def generate_report(self, patient_data: Dict[str, Any], risk_score: float, risk_level: str, explanations: list) -> str:
         """
         Generates a clinical report for the patient.
@@ -126,6 +233,7 @@ Write a concise 1-paragraph clinical summary.
         except Exception as e:
             return f"Error during generation: {e}"
 
+    @timed("clinical_llm", "generate_simulation_report")
     def generate_simulation_report(self, original_data: Dict[str, Any], modified_data: Dict[str, Any], original_risk: float, new_risk: float) -> str:
         """
         Generates a comparative report for a 'What-If' simulation.
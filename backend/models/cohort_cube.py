@@ -0,0 +1,263 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .model_registry import file_sha256
+
+# Binned measures: bin i is [edges[i], edges[i + 1]); the last bin is open-ended
+CUBE_BINS = {
+    "age": [0, 18, 30, 45, 60, 75],
+    "bmi": [0, 18.5, 25, 30, 35, 40],
+    "HbA1c_level": [0, 5.7, 6.5, 7.0, 8.0],
+    "blood_glucose_level": [0, 100, 126, 140, 200],
+}
+CUBE_CATEGORIES = ["gender", "smoking_history", "hypertension", "heart_disease"]
+OUTCOME = "diabetes"
+
+
+def _bin_labels(edges: List[float]) -> List[str]:
+    fmt = lambda v: f"{v:g}"
+    return [f"{fmt(lo)}-{fmt(hi)}" for lo, hi in zip(edges, edges[1:])] + [f"{fmt(edges[-1])}+"]
+
+
+def read_appended_rows(source: Dict[str, Any]) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """
+    Rows appended to the CSV at source["path"] after the source["bytes"]
+    already read (whole lines only: a partly written last line waits), and
+    the source advanced past them. None if the bytes already read changed,
+    checked against source["checksum"]: the caller must rebuild.
+    """
+    path, consumed = source["path"], source["bytes"]
+    size = os.path.getsize(path)
+    if size == consumed:
+        return pd.DataFrame(columns=source["columns"]), source
+    if size < consumed:
+        return None
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining, last = consumed, b""
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining, last = remaining - len(chunk), chunk
+        tail = f.read()
+    # A last line read without its newline must have been closed by the appender
+    extended = not last.endswith(b"\n") and not tail.startswith((b"\n", b"\r\n"))
+    if extended or digest.hexdigest() != source["checksum"]:
+        return None
+
+    tail = tail[:tail.rfind(b"\n") + 1]
+    if not tail:
+        return pd.DataFrame(columns=source["columns"]), source
+    new = pd.read_csv(io.BytesIO(tail), header=None, names=source["columns"])
+    digest.update(tail)
+    return new, dict(source, bytes=consumed + len(tail), checksum=digest.hexdigest())
+
+
+class CohortCube:
+    """
+    Counts and outcome sums over every combination of binned age / BMI /
+    HbA1c / glucose and gender, smoking history, hypertension and heart
+    disease, so /cohort/stats answers any filter + group-by by summing
+    cells instead of scanning the cohort.
+
+    Filters select whole cells: a range on a binned measure must start and
+    end on bin edges, and categorical filters list the accepted values.
+    append() adds rows in place; refresh() adds the rows appended to the
+    source CSV since the cube was built (the already-read bytes must be
+    unchanged, checked by checksum, else it rebuilds from scratch).
+    Categories not seen before grow their axis.
+    """
+
+    def __init__(self):
+        self.dims = list(CUBE_BINS) + CUBE_CATEGORIES
+        self.labels: Dict[str, List[Any]] = {d: _bin_labels(e) for d, e in CUBE_BINS.items()}
+        self.labels.update({d: [] for d in CUBE_CATEGORIES})
+        self.counts = np.zeros([len(self.labels[d]) for d in self.dims], dtype=np.int64)
+        self.outcomes = np.zeros_like(self.counts)
+        self.rows = 0
+        # Source CSV already counted: bytes read, their checksum and the header
+        self.source = None
+        self._lock = threading.Lock()
+        # Serializes refresh(): the source offset is read and advanced under it
+        self._refresh_lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, source_path: Optional[str] = None) -> "CohortCube":
+        cube = cls()
+        cube.append(df)
+        if source_path:
+            cube.source = {"path": source_path, "bytes": os.path.getsize(source_path),
+                           "checksum": file_sha256(source_path), "columns": list(df.columns)}
+        return cube
+
+    @classmethod
+    def from_csv(cls, path: str) -> "CohortCube":
+        return cls.from_frame(pd.read_csv(path), path)
+
+    def _codes(self, dim: str, values: np.ndarray) -> np.ndarray:
+        if dim in CUBE_BINS:
+            edges = np.asarray(CUBE_BINS[dim], dtype=np.float64)
+            values = np.asarray(values, dtype=np.float64)
+            return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 1)
+
+        known = {str(label): i for i, label in enumerate(self.labels[dim])}
+        uniques, inverse = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        for value in uniques:
+            if value not in known:
+                known[value] = self._grow(dim, value)
+        return np.array([known[u] for u in uniques], dtype=np.int64)[inverse.ravel()]
+
+    def _grow(self, dim: str, value: str) -> int:
+        # Keep 0 / 1 flags as ints so labels read like the data
+        label = int(value) if value.lstrip("-").isdigit() else str(value)
+        self.labels[dim].append(label)
+        axis = self.dims.index(dim)
+        pad = [(0, 0)] * self.counts.ndim
+        pad[axis] = (0, 1)
+        self.counts = np.pad(self.counts, pad)
+        self.outcomes = np.pad(self.outcomes, pad)
+        return len(self.labels[dim]) - 1
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Adds rows (cohort columns incl. the outcome) to their cells; returns the count added.
+        """
+        if len(df) == 0:
+            return 0
+        missing = [c for c in self.dims + [OUTCOME] if c not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns {missing}")
+        with self._lock:
+            codes = [self._codes(dim, df[dim].to_numpy()) for dim in self.dims]
+            cells = np.ravel_multi_index(codes, self.counts.shape)
+            size = self.counts.size
+            self.counts += np.bincount(cells, minlength=size).reshape(self.counts.shape)
+            outcome = df[OUTCOME].to_numpy(dtype=np.float64)
+            self.outcomes += np.bincount(cells, weights=outcome, minlength=size).astype(np.int64).reshape(self.counts.shape)
+            self.rows += len(df)
+        return len(df)
+
+    def refresh(self) -> int:
+        """
+        Counts rows appended to the source CSV since the last build or
+        refresh; returns how many were added. Rebuilds fully if the bytes
+        already counted changed.
+        """
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        if not self.source:
+            return 0
+        appended = read_appended_rows(self.source)
+        if appended is None:
+            rebuilt = CohortCube.from_csv(self.source["path"])
+            with self._lock:
+                self.labels, self.counts, self.outcomes = rebuilt.labels, rebuilt.counts, rebuilt.outcomes
+                self.rows, self.source = rebuilt.rows, rebuilt.source
+            return self.rows
+        new, self.source = appended
+        return self.append(new)
+
+    def _mask(self, dim: str, spec: Dict[str, Any]) -> np.ndarray:
+        labels = self.labels[dim]
+        if spec.get("values") is not None:
+            wanted = {str(v) for v in spec["values"]}
+            return np.array([str(label) in wanted for label in labels], dtype=bool)
+        if dim not in CUBE_BINS:
+            raise ValueError(f"{dim} is categorical: filter it with 'values' from {labels}")
+
+        edges = CUBE_BINS[dim]
+        low, high = spec.get("min"), spec.get("max")
+        for bound in (low, high):
+            if bound is not None and bound not in edges:
+                raise ValueError(f"{dim} ranges must start and end on bin edges {edges}")
+        starts = np.asarray(edges, dtype=np.float64)
+        ends = np.append(starts[1:], np.inf)
+        mask = np.ones(len(edges), dtype=bool)
+        if low is not None:
+            mask &= starts >= low
+        if high is not None:
+            mask &= ends <= high
+        return mask
+
+    def query(self, filters: Optional[Dict[str, Dict[str, Any]]] = None,
+              group_by: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Count, outcome cases and rate of the rows matching every filter,
+        overall and per combination of the group_by dimensions (groups with
+        no rows are left out). filters maps a dimension to {"min", "max"}
+        (binned measures) or {"values": [...]}.
+        """
+        started = time.perf_counter()
+        filters, group_by = filters or {}, group_by or []
+        unknown = (set(filters) | set(group_by)) - set(self.dims)
+        if unknown:
+            raise ValueError(f"Unknown dimensions {sorted(unknown)}. Use {self.dims}")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("group_by dimensions must be distinct")
+
+        with self._lock:
+            masks = [self._mask(d, filters[d]) if d in filters else np.ones(len(self.labels[d]), dtype=bool)
+                     for d in self.dims]
+            selected = np.ix_(*masks)
+            counts, outcomes = self.counts[selected], self.outcomes[selected]
+            labels = {d: [label for label, keep in zip(self.labels[d], mask) if keep]
+                      for d, mask in zip(self.dims, masks)}
+            rows = self.rows
+
+        # Sum out everything but the group-by axes, in group_by order
+        axes = [self.dims.index(d) for d in group_by]
+        other = tuple(i for i in range(len(self.dims)) if i not in axes)
+        counts = np.moveaxis(counts.sum(axis=other, keepdims=True), axes, range(len(axes)))
+        outcomes = np.moveaxis(outcomes.sum(axis=other, keepdims=True), axes, range(len(axes)))
+        counts = counts.reshape([len(labels[d]) for d in group_by])
+        outcomes = outcomes.reshape(counts.shape)
+
+        def summary(count, cases):
+            return {"count": int(count), "diabetes_cases": int(cases),
+                    "diabetes_rate": round(float(cases / count), 4) if count else None}
+
+        groups = []
+        if group_by:
+            for cell in zip(*np.nonzero(counts)):
+                key = {d: labels[d][i] for d, i in zip(group_by, cell)}
+                groups.append({"key": key, **summary(counts[cell], outcomes[cell])})
+        return {
+            "rows": rows,
+            **summary(counts.sum(), outcomes.sum()),
+            "group_by": group_by,
+            "groups": groups,
+            "filters": {d: labels[d] for d in filters},
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "cube_counts.npy"), self.counts)
+        np.save(os.path.join(directory, "cube_outcomes.npy"), self.outcomes)
+
+    def state(self) -> Dict[str, Any]:
+        """
+        JSON-serializable metadata stored next to the arrays written by save().
+        """
+        return {"labels": self.labels, "rows": self.rows, "source": self.source}
+
+    @classmethod
+    def load(cls, directory: str, state: Dict[str, Any]) -> "CohortCube":
+        cube = cls()
+        # Small: loaded into memory (not mapped) so append() can update them
+        cube.counts = np.load(os.path.join(directory, "cube_counts.npy"))
+        cube.outcomes = np.load(os.path.join(directory, "cube_outcomes.npy"))
+        cube.labels, cube.rows, cube.source = state["labels"], state["rows"], state["source"]
+        return cube
@@ -3,87 +3,436 @@ import numpy as np
 from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 import os
+import threading
 import joblib
+from .metrics import timed
+from .shared_artifacts import read_column_blocks
+from .cohort_snapshot import active_snapshot, read_manifest, write_snapshot
+from .cohort_cube import CUBE_BINS, CUBE_CATEGORIES, OUTCOME, CohortCube, read_appended_rows
+from .model_registry import file_sha256
+from .twin_index import INDEX_TYPES, ExactIndex, IVFIndex, read_index_manifest
+from .mixed_twin_index import GowerTwinIndex, parse_weights
+
+PERCENTILE_METRICS = ["bmi", "HbA1c_level", "blood_glucose_level", "age"]
+# Same right-closed bands as RiskEngine's Age_Category
+AGE_BAND_BINS = [0, 30, 45, 60, 100]
+AGE_BAND_LABELS = ['Young', 'Middle', 'Senior', 'Elderly']
+STRATIFY_OPTIONS = ("gender", "age_band", "hypertension")
+# Twin index type ("exact" or "ivf") when the constructor doesn't set one
+TWIN_INDEX_ENV = "TWIN_INDEX"
+# "numeric": scaled age / BMI / HbA1c / glucose; "mixed": Gower-style, categories included
+TWIN_MODES = ("numeric", "mixed")
+# Mixed-mode weights when the constructor doesn't set them, e.g. "hypertension=2,gender=0.5"
+TWIN_WEIGHTS_ENV = "TWIN_WEIGHTS"
+
+
+def age_band(ages) -> np.ndarray:
+    """
+    Vectorized age band labels ("Unknown" outside the bins).
+    """
+    ages = np.asarray(ages, dtype=np.float64)
+    idx = np.searchsorted(AGE_BAND_BINS, ages, side='left')
+    labels = np.array(['Unknown'] + AGE_BAND_LABELS + ['Unknown'], dtype=object)
+    return labels[idx]
 
 class CohortEngine:
-    def __init__(self, data_path="data/diabetes_dataset.csv"):
+    def __init__(self, data_path="data/diabetes_dataset.csv", snapshot_dir=None, index=None, index_dir=None,
+                 index_params=None, twin_weights=None):
         # Fix path to be absolute or relative to project root
         project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         self.data_path = os.path.join(project_root, data_path)
+        # Optional root of versioned, memory-mapped snapshots (see cohort_snapshot)
+        self.snapshot_dir = os.path.join(project_root, snapshot_dir) if snapshot_dir else None
+        self.snapshot_version = None
+        # Twin search: exact NearestNeighbors, or an IVF index persisted in index_dir
+        self.index_kind = index or os.environ.get(TWIN_INDEX_ENV, "exact")
+        if self.index_kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown twin index '{self.index_kind}'. Use one of {list(INDEX_TYPES)}")
+        self.index_dir = os.path.join(project_root, index_dir) if index_dir else None
+        self.index_params = {k: v for k, v in (index_params or {}).items() if v is not None}
+        self.index = None
+        # Mixed-mode twin index, built on first use
+        self.twin_weights = twin_weights if twin_weights is not None else parse_weights(os.environ.get(TWIN_WEIGHTS_ENV))
+        self.mixed_index = None
+        GowerTwinIndex(self.twin_weights)  # validates the weights
         self.df = None
         self.scaler = StandardScaler()
         self.nn_model = NearestNeighbors(n_neighbors=5, algorithm='auto')
         self.feature_cols = ['age', 'bmi', 'HbA1c_level', 'blood_glucose_level']
+        # metric -> sorted values; stratify_by -> stratum -> metric -> sorted values
+        self.sorted_metrics = {}
+        self.strata_sorted = {}
+        # column -> (values or codes, categories or None): typed arrays for twin gathers
+        self.columns = {}
+        # Counts / outcome sums for /cohort/stats (None without the cube's columns)
+        self.cube = None
+        # Source CSV loaded so far (path, bytes, checksum, columns): see refresh()
+        self.source = None
+        self._ingest_lock = threading.RLock()
         self._load_data()
 
     def _load_data(self):
         try:
-            if os.path.exists(self.data_path):
-                self.df = pd.read_csv(self.data_path)
-                # Ensure columns exist
-                missing = [c for c in self.feature_cols if c not in self.df.columns]
-                if missing:
-                    print(f"CohortEngine Warning: Missing columns {missing} in dataset.")
-                    self.df = None
-                    return
-                
-                # Preprocess for NN
-                # Handle categorical? For now we focus on numerical for "Digital Twin" distance
-                # Ideally we encode 'gender' etc. but let's stick to vitals for simplicity or encode
-                
-                # Simple encoding for distance calculation
-                data_for_clustering = self.df[self.feature_cols].copy()
-                self.scaler.fit(data_for_clustering)
-                self.nn_model.fit(self.scaler.transform(data_for_clustering))
-                print(f"CohortEngine: Loaded {len(self.df)} records for cohort analysis.")
-            else:
+            if not os.path.exists(self.data_path):
                 print(f"CohortEngine: Dataset not found at {self.data_path}")
+                return
+            if self.snapshot_dir:
+                snapshot = active_snapshot(self.snapshot_dir, self.data_path, self.index_kind)
+                if snapshot is None:
+                    print(f"CohortEngine: Building cohort snapshot in {self.snapshot_dir}...")
+                    if not self._fit():
+                        return
+                    version_dir = write_snapshot(self, self.snapshot_dir, self.data_path)
+                    # Reload so every worker maps the same published files
+                    snapshot = (version_dir, read_manifest(version_dir))
+                self._load_snapshot(*snapshot)
+            elif not self._fit():
+                return
+            self._build_columns()
+            print(f"CohortEngine: Loaded {len(self.df)} records for cohort analysis.")
         except Exception as e:
             print(f"CohortEngine Error loading data: {e}")
             self.df = None
 
-    def get_percentiles(self, patient_data: dict):
+    def _fit(self) -> bool:
+        """
+        Reads the CSV and fits the scaler, twin index and percentile arrays.
+        """
+        self.df = pd.read_csv(self.data_path)
+        # Ensure columns exist
+        missing = [c for c in self.feature_cols if c not in self.df.columns]
+        if missing:
+            print(f"CohortEngine Warning: Missing columns {missing} in dataset.")
+            self.df = None
+            return False
+
+        # Preprocess for NN
+        # Handle categorical? For now we focus on numerical for "Digital Twin" distance
+        # Ideally we encode 'gender' etc. but let's stick to vitals for simplicity or encode
+
+        # Simple encoding for distance calculation
+        data_for_clustering = self.df[self.feature_cols].to_numpy(dtype=np.float64)
+        self.scaler.fit(data_for_clustering)
+        self.index = self._load_or_build_index(data_for_clustering)
+        self._build_percentile_index()
+        if all(c in self.df.columns for c in list(CUBE_BINS) + CUBE_CATEGORIES + [OUTCOME]):
+            self.cube = CohortCube.from_frame(self.df, self.data_path)
+        self.source = {"path": self.data_path, "bytes": os.path.getsize(self.data_path),
+                       "checksum": file_sha256(self.data_path), "columns": list(self.df.columns)}
+        return True
+
+    def _load_snapshot(self, version_dir: str, manifest: dict):
+        """
+        Maps a published snapshot: no CSV read, no fitting.
         """
-        Calculate percentiles for the patient's vitals against the population.
+        def load(name):
+            return np.load(os.path.join(version_dir, name), mmap_mode="r")
+
+        self.df = read_column_blocks(os.path.join(version_dir, "columns"), mmap_mode="r")
+        self.feature_cols = manifest["feature_cols"]
+        scaler = manifest["scaler"]
+        self.scaler.mean_ = np.array(scaler["mean"])
+        self.scaler.scale_ = np.array(scaler["scale"])
+        self.scaler.var_ = np.array(scaler["var"])
+        self.scaler.n_samples_seen_ = scaler["n_samples_seen"]
+        self.scaler.n_features_in_ = len(self.feature_cols)
+
+        if self.index_kind == "exact":
+            self.nn_model = joblib.load(os.path.join(version_dir, "nn_model.joblib"), mmap_mode="r")
+            self.index = ExactIndex(self.nn_model, load("scaled_features.npy"))
+        else:
+            self.index = IVFIndex.load(os.path.join(version_dir, "index"), mmap_mode="r")
+
+        self.sorted_metrics = {m: load(name) for m, name in manifest["sorted_metrics"].items()}
+        self.strata_sorted = {
+            stratify_by: {stratum: {m: load(name) for m, name in metrics.items()} for stratum, metrics in strata.items()}
+            for stratify_by, strata in manifest["strata_sorted"].items()
+        }
+        if manifest.get("cube"):
+            self.cube = CohortCube.load(version_dir, manifest["cube"])
+        self.snapshot_version = manifest["version"]
+        self.source = {"path": self.data_path, "bytes": manifest["source"]["size"],
+                       "checksum": manifest["source"]["checksum"], "columns": list(self.df.columns)}
+
+    def _index_meta(self) -> dict:
+        """
+        What a persisted index was built from; it is rebuilt when this changes.
+        """
+        return {"rows": len(self.df), "features": self.feature_cols,
+                "scaler_mean": self.scaler.mean_.tolist(), "scaler_scale": self.scaler.scale_.tolist()}
+
+    def _load_or_build_index(self, data: np.ndarray):
+        """
+        Exact: fits NearestNeighbors. IVF: maps the index saved in index_dir
+        if it was built from this cohort and scaler, else builds it (and
+        saves it when index_dir is set).
+        """
+        if self.index_kind == "exact":
+            return ExactIndex(self.nn_model).fit(self.scaler.transform(data))
+
+        if self.index_dir:
+            manifest = read_index_manifest(self.index_dir)
+            if manifest is not None and manifest.get("meta") == self._index_meta():
+                try:
+                    return IVFIndex.load(self.index_dir, mmap_mode="r")
+                except (OSError, ValueError) as e:
+                    print(f"CohortEngine: Rebuilding twin index ({e})")
+            print(f"CohortEngine: Building twin index in {self.index_dir}...")
+        index = IVFIndex(**self.index_params).fit(self.scaler.transform(data))
+        if self.index_dir:
+            index.save(self.index_dir, **self._index_meta())
+        return index
+
+    def save_index(self, directory: str = None):
+        """
+        Persists the IVF twin index (including inserted rows) to directory or index_dir.
+        """
+        if not getattr(self.index, "persistent", False):
+            raise ValueError(f"The '{self.index_kind}' twin index cannot be saved")
+        self.index.save(directory or self.index_dir, **self._index_meta())
+
+    def add_patients(self, patients: list) -> list:
+        """
+        Appends patients (all cohort columns, outcome included) to the source
+        CSV and ingests them (see refresh), so they are found as twins and
+        counted in percentiles and stats, and kept at the next start.
+        Returns the new row ids.
+        """
+        if self.df is None:
+            raise ValueError("Cohort not loaded")
+        new = pd.DataFrame(patients)
+        missing = [c for c in self.df.columns if c not in new.columns]
+        if missing:
+            raise ValueError(f"Missing columns {missing}")
+        new = new[list(self.df.columns)]
+
+        with self._ingest_lock:
+            # Rows appended by others first, so the refresh below reads only ours
+            self.refresh()
+            with open(self.data_path, "rb") as f:
+                f.seek(max(os.path.getsize(self.data_path) - 1, 0))
+                unterminated = f.read(1) not in (b"", b"\n")
+            with open(self.data_path, "a", newline="") as f:
+                if unterminated:
+                    f.write("\n")
+                new.to_csv(f, header=False, index=False, lineterminator="\n")
+            added = self.refresh()
+            return list(range(len(self.df) - added, len(self.df)))
+
+    def refresh(self) -> int:
+        """
+        Ingests rows appended to the source CSV since it was loaded, so twins
+        (both modes), percentiles and stats all see them; returns how many.
+        The scaler is not refit, so the IVF index takes them incrementally;
+        its inserts live in memory until save_index(). Reloads everything if
+        the rows already loaded changed.
+        """
+        with self._ingest_lock:
+            if self.df is None or not self.source:
+                return 0
+            appended = read_appended_rows(self.source)
+            if appended is None:
+                print("CohortEngine: Source data rewritten, reloading...")
+                self.cube, self.mixed_index, self.source = None, None, None
+                self._load_data()
+                return len(self.df) if self.df is not None else 0
+            new, source = appended
+            if len(new):
+                self._ingest(new[list(self.df.columns)])
+            self.source = source
+            return len(new)
+
+    def _ingest(self, new: pd.DataFrame):
+        self.index.add(self.scaler.transform(new[self.feature_cols].to_numpy(dtype=np.float64)))
+        if self.cube is not None:
+            self.cube.append(new)
+        if self.mixed_index is not None:
+            self.mixed_index.add(new)
+        self.df = pd.concat([self.df, new], ignore_index=True)
+        self._build_percentile_index()
+        self._build_columns()
+
+    @timed("cohort_engine", "stats")
+    def cohort_stats(self, filters: dict = None, group_by: list = None) -> dict:
+        """
+        Counts and diabetes rates from the cube (see CohortCube.query), after
+        ingesting any rows appended to the source CSV since the last call.
+        """
+        if self.cube is None:
+            raise ValueError("Cohort stats need the cube columns and the diabetes outcome")
+        self.refresh()
+        return self.cube.query(filters, group_by)
+
+    def _stratum_keys(self, stratify_by: str, frame) -> np.ndarray:
+        """
+        Stratum label of each row of a DataFrame (or list of patient dicts).
+        """
+        if stratify_by == "age_band":
+            return age_band(frame["age"])
+        return np.asarray([str(v) for v in frame[stratify_by]], dtype=object)
+
+    def _build_percentile_index(self):
+        """
+        Sorted copy of each metric, overall and per stratum, so a percentile
+        is a binary search instead of a scan over the cohort.
+        """
+        metrics = [m for m in PERCENTILE_METRICS if m in self.df.columns]
+        self.sorted_metrics = {m: np.sort(self.df[m].to_numpy(dtype=np.float64)) for m in metrics}
+        self.strata_sorted = {}
+        for stratify_by in STRATIFY_OPTIONS:
+            if stratify_by not in self.df.columns and stratify_by != "age_band":
+                continue
+            keys = self._stratum_keys(stratify_by, self.df)
+            self.strata_sorted[stratify_by] = {
+                stratum: {m: np.sort(self.df[m].to_numpy(dtype=np.float64)[keys == stratum]) for m in metrics}
+                for stratum in np.unique(keys)
+            }
+
+    @staticmethod
+    def _percentile_of(sorted_values: np.ndarray, values) -> np.ndarray:
+        # % of the cohort strictly lower than each value
+        return np.searchsorted(sorted_values, values, side='left') / len(sorted_values) * 100
+
+    @timed("cohort_engine", "percentiles")
+    def get_percentiles(self, patient_data: dict, stratify_by: str = None):
+        """
+        Calculate percentiles for the patient's vitals against the population,
+        or against patients in the same stratum (gender, age_band or hypertension).
         """
         if self.df is None:
             return {}
+        return self.get_percentiles_batch([patient_data], stratify_by)[0]
+
+    @timed("cohort_engine", "percentiles_batch")
+    def get_percentiles_batch(self, patients: list, stratify_by: str = None) -> list:
+        """
+        get_percentiles for many patients at once: one vectorized binary
+        search per metric (and stratum). Patients whose stratum is not in
+        the cohort are compared against the whole population.
+        """
+        if self.df is None:
+            return [{} for _ in patients]
+        if stratify_by is not None and stratify_by not in self.strata_sorted:
+            raise ValueError(f"Unknown stratification '{stratify_by}'. Use one of {STRATIFY_OPTIONS}")
+
+        results = [{} for _ in patients]
+        if not patients:
+            return results
+        for m, sorted_values in self.sorted_metrics.items():
+            rows = [i for i, p in enumerate(patients) if p.get(m) is not None]
+            if not rows:
+                continue
+            values = np.array([patients[i][m] for i in rows], dtype=np.float64)
+            pct = self._percentile_of(sorted_values, values)
+
+            if stratify_by is not None:
+                strata = self.strata_sorted[stratify_by]
+                keys = self._stratum_keys(stratify_by, {stratify_by: [patients[i].get(stratify_by) for i in rows],
+                                                        "age": [patients[i].get("age") for i in rows]})
+                for stratum in np.unique(keys):
+                    if stratum not in strata or len(strata[stratum][m]) == 0:
+                        continue
+                    mask = keys == stratum
+                    pct[mask] = self._percentile_of(strata[stratum][m], values[mask])
+
+            for i, p in zip(rows, pct.round(1).tolist()):
+                results[i][f"{m}_percentile"] = p
+        return results
 
-        metrics = ["bmi", "HbA1c_level", "blood_glucose_level", "age"]
-        results = {}
-        
-        for m in metrics:
-            if m in patient_data and m in self.df.columns:
-                val = patient_data[m]
-                # Calculate percentile: what % of population is strictly lower than this value
-                # Using scipy.stats.percentileofscore or simple numpy
-                less_than = (self.df[m] < val).mean() * 100
-                results[f"{m}_percentile"] = round(less_than, 1)
-        
+    def stratum_of(self, patient_data: dict, stratify_by: str):
+        """
+        The patient's stratum label, or None if it has no rows in the cohort.
+        """
+        strata = self.strata_sorted.get(stratify_by, {})
+        key = self._stratum_keys(stratify_by, {stratify_by: [patient_data.get(stratify_by)],
+                                               "age": [patient_data.get("age")]})[0]
+        return key if key in strata else None
+
+    def _build_columns(self):
+        """
+        Keeps every cohort column as a numpy array (numeric) or int codes plus
+        categories (strings, categoricals), so twins are gathered by index.
+        Numeric arrays are views of the frame (memory-mapped in shared mode).
+        """
+        self.columns = {}
+        for name in self.df.columns:
+            series = self.df[name]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self.columns[name] = (series.cat.codes.to_numpy(), np.asarray(series.cat.categories, dtype=object))
+            elif pd.api.types.is_numeric_dtype(series):
+                self.columns[name] = (series.to_numpy(), None)
+            else:
+                codes, categories = pd.factorize(series)
+                self.columns[name] = (codes.astype(np.int32), np.asarray(categories, dtype=object))
+
+    def gather_columns(self, indices: np.ndarray) -> dict:
+        """
+        Column name -> Python list of the rows at `indices` (any shape, lists
+        nested the same way). One fancy-index and one tolist() per column.
+        """
+        gathered = {}
+        for name, (values, categories) in self.columns.items():
+            picked = values[indices]
+            gathered[name] = (categories[picked] if categories is not None else picked).tolist()
+        return gathered
+
+    def _mixed_twin_index(self) -> GowerTwinIndex:
+        # Under the ingest lock, so no rows arrive between the build and add()
+        with self._ingest_lock:
+            if self.mixed_index is None:
+                self.mixed_index = GowerTwinIndex(self.twin_weights).fit(self.df)
+            return self.mixed_index
+
+    @timed("cohort_engine", "twins_batch")
+    def find_digital_twins_batch(self, patients: list, k: int = 5, layout: str = "records",
+                                 mode: str = "numeric") -> list:
+        """
+        Digital twins for many patients with one index search.
+        Returns, per patient, {"twins": ..., "distances": [...]}; twins are
+        records (one dict per twin, with its distance) or, with
+        layout="columns", column name -> list of values.
+        mode="mixed" ranks by the weighted Gower-style distance over the
+        vitals and gender, smoking history, hypertension and heart disease
+        (see mixed_twin_index) instead of the scaled vitals alone.
+        """
+        if self.df is None or not patients:
+            return [{"twins": [] if layout == "records" else {}, "distances": []} for _ in patients]
+        if layout not in ("records", "columns"):
+            raise ValueError("layout must be 'records' or 'columns'")
+        if mode not in TWIN_MODES:
+            raise ValueError(f"Unknown twin mode '{mode}'. Use one of {TWIN_MODES}")
+
+        k = max(1, min(int(k), len(self.df)))
+        if mode == "mixed":
+            distances, indices = self._mixed_twin_index().search(patients, k)
+        else:
+            query = np.array([[p.get(c, 0) for c in self.feature_cols] for p in patients], dtype=np.float64)
+            distances, indices = self.index.search(self.scaler.transform(query), k)
+
+        gathered = self.gather_columns(indices)
+        distances = distances.round(6).tolist()
+        names = list(gathered)
+        results = []
+        for i in range(len(patients)):
+            if layout == "columns":
+                twins = {name: gathered[name][i] for name in names}
+            else:
+                twins = [dict(zip(names, row), distance=d)
+                         for row, d in zip(zip(*(gathered[name][i] for name in names)), distances[i])]
+            results.append({"twins": twins, "distances": distances[i]})
         return results
 
-    def find_digital_twins(self, patient_data: dict, k=5):
+    @timed("cohort_engine", "twins")
+    def find_digital_twins(self, patient_data: dict, k=5, mode="numeric"):
         """
-        Finds 'k' similar patients (Digital Twins) and returns their outcomes (diabetes status).
+        Finds 'k' similar patients (Digital Twins) and returns their outcomes
+        (diabetes status) and their distance to the patient.
         """
         if self.df is None:
             return []
 
         try:
-            # Prepare query vector
-            query = [[patient_data.get(c, 0) for c in self.feature_cols]]
-            query_scaled = self.scaler.transform(query)
-            
-            distances, indices = self.nn_model.kneighbors(query_scaled, n_neighbors=k)
-            
-            twins = []
-            for idx in indices[0]:
-                record = self.df.iloc[idx].to_dict()
-                # Clean up numpy types for JSON serialization
-                clean_record = {k: (float(v) if isinstance(v, (np.float32, np.float64)) else int(v) if isinstance(v, (np.int64, np.int32)) else v) for k, v in record.items()}
-                twins.append(clean_record)
-            
-            return twins
+            return self.find_digital_twins_batch([patient_data], k, mode=mode)[0]["twins"]
         except Exception as e:
             print(f"Error finding twins: {e}")
             return []
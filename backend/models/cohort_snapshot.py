@@ -0,0 +1,197 @@
+"""
+Versioned snapshots of CohortEngine's fitted artifacts.
+
+    <root>/<version>/columns/            cohort as column blocks (shared_artifacts)
+    <root>/<version>/scaled_features.npy twin feature matrix, scaled
+    <root>/<version>/nn_model.joblib     exact index (or index/ for IVF)
+    <root>/<version>/sorted/*.npy        sorted percentile arrays, overall and per stratum
+    <root>/<version>/cube_*.npy          /cohort/stats cube (counts and outcome sums)
+    <root>/<version>/snapshot.json       manifest: source checksum, scaler, index, strata
+    <root>/ACTIVE                        version loaded at startup
+
+Everything is loaded memory-mapped, so a worker starts without reading the
+CSV or refitting. The version is named after the source CSV's SHA-256 and
+the index type; a snapshot is rebuilt only when the checksum changes (the
+file's size and mtime let an unchanged CSV skip hashing). Like
+ModelRegistry, a version is written under a temporary name and renamed
+into place, and published files are never modified.
+
+Build step (from the repo root):
+    python -m backend.models.cohort_snapshot --out data/cohort_snapshot
+    python -m backend.models.cohort_snapshot --data registry.csv --out data/registry_snapshot --index ivf
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from .model_registry import file_sha256
+from .shared_artifacts import write_column_blocks
+
+SNAPSHOT_FORMAT_VERSION = 2
+MANIFEST_FILE = "snapshot.json"
+ACTIVE_FILE = "ACTIVE"
+# Versions kept besides the active one (workers may still map the previous one)
+KEEP_PREVIOUS = 1
+
+
+def _source_stat(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def snapshot_version(checksum: str, index_kind: str) -> str:
+    return f"v{SNAPSHOT_FORMAT_VERSION}-{checksum[:12]}-{index_kind}"
+
+
+def read_manifest(version_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(version_dir, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def active_snapshot(root: str, source_path: str, index_kind: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    (version directory, manifest) of the active snapshot if it was built from
+    the current source CSV (by checksum) with this index type, else None.
+    """
+    try:
+        with open(os.path.join(root, ACTIVE_FILE), "r") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    version_dir = os.path.join(root, version)
+    manifest = read_manifest(version_dir)
+    if (manifest is None or manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION
+            or manifest.get("index", {}).get("kind") != index_kind):
+        return None
+
+    source = manifest["source"]
+    if {k: source.get(k) for k in ("size", "mtime")} != _source_stat(source_path):
+        # Touched or rewritten: only a different checksum means different data
+        if file_sha256(source_path) != source["checksum"]:
+            return None
+    return version_dir, manifest
+
+
+def write_snapshot(cohort, root: str, source_path: str) -> str:
+    """
+    Publishes a fitted CohortEngine as the active snapshot and returns its
+    version directory. If that version already exists (another process
+    built it), it is reused.
+    """
+    checksum = file_sha256(source_path)
+    version = snapshot_version(checksum, cohort.index_kind)
+    target = os.path.join(root, version)
+    if read_manifest(target) is None:
+        _write_version(cohort, root, target, {"path": os.path.abspath(source_path), "checksum": checksum,
+                                              "rows": len(cohort.df), **_source_stat(source_path)})
+    _set_active(root, version)
+    _prune(root, version)
+    return target
+
+
+def _write_version(cohort, root: str, target: str, source: Dict[str, Any]):
+    staging = os.path.join(root, f".staging-{os.path.basename(target)}-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(os.path.join(staging, "sorted"))
+    try:
+        write_column_blocks(cohort.df, os.path.join(staging, "columns"))
+        scaled = cohort.scaler.transform(cohort.df[cohort.feature_cols].to_numpy(dtype=np.float64))
+        np.save(os.path.join(staging, "scaled_features.npy"), scaled)
+
+        if cohort.index_kind == "exact":
+            # Uncompressed, so joblib.load(mmap_mode="r") maps the tree's arrays
+            joblib.dump(cohort.nn_model, os.path.join(staging, "nn_model.joblib"))
+        else:
+            cohort.index.save(os.path.join(staging, "index"))
+
+        if cohort.cube is not None:
+            cohort.cube.save(staging)
+
+        sorted_files = {}
+        for metric, values in cohort.sorted_metrics.items():
+            sorted_files[metric] = f"sorted/{metric}.npy"
+            np.save(os.path.join(staging, sorted_files[metric]), values)
+        strata_files = {}
+        for stratify_by, strata in cohort.strata_sorted.items():
+            strata_files[stratify_by] = {}
+            # Stratum labels are data: file names use their position instead
+            for i, (stratum, metrics) in enumerate(strata.items()):
+                strata_files[stratify_by][stratum] = {}
+                for metric, values in metrics.items():
+                    name = f"sorted/{stratify_by}-{i}-{metric}.npy"
+                    np.save(os.path.join(staging, name), values)
+                    strata_files[stratify_by][stratum][metric] = name
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "version": os.path.basename(target),
+            "created_at": time.time(),
+            "source": source,
+            "feature_cols": cohort.feature_cols,
+            "scaler": {"mean": cohort.scaler.mean_.tolist(), "scale": cohort.scaler.scale_.tolist(),
+                       "var": cohort.scaler.var_.tolist(), "n_samples_seen": int(cohort.scaler.n_samples_seen_)},
+            "index": {"kind": cohort.index_kind},
+            "sorted_metrics": sorted_files,
+            "strata_sorted": strata_files,
+            "cube": cohort.cube.state() if cohort.cube is not None else None,
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.replace(staging, target)
+        except OSError:
+            # Published concurrently by another process: keep theirs
+            if read_manifest(target) is None:
+                raise
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _set_active(root: str, version: str):
+    tmp_path = os.path.join(root, f"{ACTIVE_FILE}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(root, ACTIVE_FILE))
+
+
+def _prune(root: str, active: str):
+    """
+    Removes all but the active version and the KEEP_PREVIOUS newest others.
+    """
+    versions = [(m.get("created_at", 0), name) for name in os.listdir(root)
+                if not name.startswith(".") and name != active
+                and (m := read_manifest(os.path.join(root, name))) is not None]
+    for _, name in sorted(versions, reverse=True)[KEEP_PREVIOUS:]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the CohortEngine snapshot")
+    parser.add_argument("--data", default="data/diabetes_dataset.csv", help="Cohort CSV, relative to the repo root")
+    parser.add_argument("--out", default="data/cohort_snapshot", help="Snapshot root, relative to the repo root")
+    parser.add_argument("--index", default=None, help="Twin index type: exact (default) or ivf")
+    args = parser.parse_args()
+
+    from .cohort_engine import CohortEngine
+
+    started = time.perf_counter()
+    cohort = CohortEngine(data_path=args.data, index=args.index, snapshot_dir=args.out)
+    if cohort.df is None:
+        raise SystemExit(f"Could not load {args.data}")
+    print(f"✅ Cohort snapshot {cohort.snapshot_version} ({len(cohort.df):,} rows) ready in {args.out} "
+          f"after {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import itertools
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .metrics import timed
+
+# Actionable features the search may change. Numeric ranges default to
+# [min, current value] (only moving toward the healthy range); scale is the
+# dataset's standard deviation, so one scale unit of change costs 1.0.
+DEFAULT_FEATURE_RANGES: Dict[str, Dict[str, Any]] = {
+    "bmi": {"min": 18.5, "step": 0.5, "scale": 6.6},
+    "HbA1c_level": {"min": 4.8, "step": 0.1, "scale": 1.07},
+    "blood_glucose_level": {"min": 80.0, "step": 5.0, "scale": 40.7},
+    "smoking_history": {"values": ["former", "never"], "cost": 1.0},
+}
+SMOKERS = ("current", "ever")
+# Extra cost per changed feature: prefers plans that touch fewer things
+CHANGE_PENALTY = 0.25
+
+
+class CounterfactualSearch:
+    """
+    Minimal-cost modifications that bring a patient's risk below a target.
+
+    Candidates are a grid over the actionable features, each numeric value
+    expressed as signed steps from the patient's current value. The grid is
+    sorted by cost (normalized change plus a per-feature penalty) and scored
+    in batches with one vectorized predict_proba per batch, uncached. Because
+    candidates arrive cheapest first, the first k feasible plans found are
+    the top k, and the search stops there. Pruning keeps the plans minimal:
+    once a plan is feasible, every candidate that makes the same changes and
+    more (same direction, at least as far, plus optional extra features) is
+    dropped without being scored.
+    """
+
+    def __init__(self, risk_engine, batch_size: int = 1024, max_candidates: int = 200_000):
+        self.risk_engine = risk_engine
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+
+    def _lease(self):
+        lease = getattr(self.risk_engine, "lease", None)
+        return lease() if lease is not None else nullcontext(self.risk_engine)
+
+    def _axes(self, patient: Dict[str, Any], ranges: Dict[str, Dict[str, Any]],
+              requested: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        One axis per feature: the candidate values and their signed step
+        offsets (0 = unchanged) or category indices. requested holds the
+        caller's own specs: only a min and max given together can conflict;
+        a defaulted bound the patient is already past leaves nothing to search.
+        """
+        requested = requested or {}
+        axes = []
+        for feature, spec in ranges.items():
+            current = patient.get(feature)
+            if current is None:
+                raise ValueError(f"Patient has no value for {feature}")
+            if "values" in spec:
+                options = [v for v in spec["values"] if v != current]
+                if options:
+                    axes.append({"feature": feature, "kind": "categorical", "values": [current] + options,
+                                 "cost": float(spec.get("cost", 1.0))})
+                continue
+
+            step = float(spec.get("step", 1.0))
+            low = float(spec.get("min", current))
+            high = float(spec.get("max", current))
+            if low > high:
+                if "min" in requested.get(feature, {}) and "max" in requested.get(feature, {}):
+                    raise ValueError(f"{feature}: min {low} is above max {high}")
+                # e.g. BMI already below the default min: in range, nothing to change
+                continue
+            down = int(np.floor(max(current - low, 0.0) / step + 1e-9))
+            up = int(np.floor(max(high - current, 0.0) / step + 1e-9))
+            offsets = np.arange(-down, up + 1)
+            if len(offsets) > 1:
+                axes.append({"feature": feature, "kind": "numeric", "current": float(current), "step": step,
+                             "offsets": offsets, "scale": float(spec.get("scale", step)),
+                             "min": low, "max": high})
+        return axes
+
+    def _coarsen(self, axes: List[Dict[str, Any]]):
+        """
+        Doubles the step of the finest numeric axis until the grid fits max_candidates.
+        """
+        def size():
+            return int(np.prod([len(a["offsets"]) if a["kind"] == "numeric" else len(a["values"]) for a in axes]))
+
+        while axes and size() > self.max_candidates:
+            numeric = [a for a in axes if a["kind"] == "numeric" and len(a["offsets"]) > 2]
+            if not numeric:
+                break
+            axis = max(numeric, key=lambda a: len(a["offsets"]))
+            axis["step"] *= 2
+            axis["offsets"] = np.unique(np.trunc(axis["offsets"] / 2)).astype(int)
+
+    def _grid(self, axes):
+        """
+        Returns (offset matrix, cost vector) for every candidate except the
+        unchanged patient, sorted by cost.
+        """
+        levels = [a["offsets"] if a["kind"] == "numeric" else np.arange(len(a["values"])) for a in axes]
+        grid = np.array(list(itertools.product(*levels)), dtype=np.int64).reshape(-1, len(axes))
+        grid = grid[(grid != 0).any(axis=1)]
+
+        cost = np.zeros(len(grid))
+        for j, axis in enumerate(axes):
+            if axis["kind"] == "numeric":
+                cost += np.abs(grid[:, j]) * axis["step"] / axis["scale"]
+            else:
+                cost += (grid[:, j] != 0) * axis["cost"]
+        cost += CHANGE_PENALTY * (grid != 0).sum(axis=1)
+        order = np.argsort(cost, kind="stable")
+        return grid[order], cost[order]
+
+    @staticmethod
+    def _values(axes, offsets: np.ndarray) -> Dict[str, np.ndarray]:
+        values = {}
+        for j, axis in enumerate(axes):
+            if axis["kind"] == "numeric":
+                raw = axis["current"] + offsets[:, j] * axis["step"]
+                values[axis["feature"]] = np.clip(raw, axis["min"], axis["max"]).round(4)
+            else:
+                values[axis["feature"]] = np.asarray(axis["values"], dtype=object)[offsets[:, j]]
+        return values
+
+    @staticmethod
+    def _dominated(grid: np.ndarray, plan: np.ndarray, numeric: np.ndarray) -> np.ndarray:
+        """
+        Candidates that make every change of `plan` (same direction, at least
+        as far) and possibly more: never minimal once `plan` is feasible.
+        """
+        unchanged = plan == 0
+        same_numeric = (np.sign(grid) == np.sign(plan)) & (np.abs(grid) >= np.abs(plan))
+        same_category = grid == plan
+        covers = unchanged | np.where(numeric, same_numeric, same_category)
+        return covers.all(axis=1)
+
+    def _scan(self, engine, patient, axes, grid, cost, target_risk, top_k, deadline, result) -> str:
+        """
+        Scores the cost-sorted grid batch by batch, appending feasible plans
+        to result["plans"] and pruning what they dominate. Returns the stop reason.
+        """
+        numeric = np.array([a["kind"] == "numeric" for a in axes], dtype=bool)
+        features = [a["feature"] for a in axes]
+        alive = np.ones(len(grid), dtype=bool)
+        position = 0
+        while position < len(grid):
+            if time.perf_counter() > deadline:
+                return "time_limit"
+            # Next batch of still-eligible candidates, cheapest first
+            idx = np.flatnonzero(alive[position:])[:self.batch_size] + position
+            if len(idx) == 0:
+                break
+            position = idx[-1] + 1
+
+            batch = pd.DataFrame({**{k: [v] * len(idx) for k, v in patient.items()},
+                                  **self._values(axes, grid[idx])})
+            risks = engine.predict_risk_batch(batch, use_cache=False)
+            result["candidates_evaluated"] += len(idx)
+
+            for i, risk in zip(idx, risks):
+                # alive[i] is False when a cheaper plan earlier in this batch covers it
+                if risk >= target_risk or not alive[i]:
+                    continue
+                values = self._values(axes, grid[i:i + 1])
+                result["plans"].append({
+                    "modifications": {f: values[f][0].item() if hasattr(values[f][0], "item") else values[f][0]
+                                      for j, f in enumerate(features) if grid[i, j] != 0},
+                    "new_risk": risk,
+                    "risk_reduction": result["original_risk"] - risk,
+                    "cost": round(float(cost[i]), 4),
+                })
+                dominated = self._dominated(grid, grid[i], numeric)
+                dominated[i] = False
+                result["candidates_pruned"] += int((dominated & alive).sum())
+                alive &= ~dominated
+                if len(result["plans"]) >= top_k:
+                    return "complete"
+        return "exhausted"
+
+    @timed("counterfactuals", "minimal_changes")
+    def search(self, patient: Dict[str, Any], target_risk: float,
+               feature_ranges: Optional[Dict[str, Dict[str, Any]]] = None,
+               top_k: int = 3, time_limit_ms: float = 1000.0) -> Dict[str, Any]:
+        """
+        Returns the original risk, up to top_k plans (modifications, new risk,
+        cost) whose risk is below target_risk, cheapest first, and search
+        statistics. stop_reason is "complete" (top_k found or already below
+        target), "exhausted" (grid fully searched) or "time_limit".
+        """
+        started = time.perf_counter()
+        if hasattr(patient, "dict"):
+            patient = patient.dict()
+        if feature_ranges is None:
+            # Quitting is only an option for current smokers
+            ranges = {f: spec for f, spec in DEFAULT_FEATURE_RANGES.items()
+                      if f != "smoking_history" or patient.get(f) in SMOKERS}
+        else:
+            unknown = set(feature_ranges) - set(DEFAULT_FEATURE_RANGES)
+            if unknown:
+                raise ValueError(f"Not actionable: {sorted(unknown)}. Choose from {list(DEFAULT_FEATURE_RANGES)}")
+            # Missing step / scale / cost fall back to the defaults
+            ranges = {f: {**DEFAULT_FEATURE_RANGES[f], **spec} for f, spec in feature_ranges.items()}
+
+        axes = self._axes(patient, ranges, feature_ranges)
+        self._coarsen(axes)
+        grid, cost = self._grid(axes) if axes else (np.zeros((0, 0), dtype=np.int64), np.zeros(0))
+
+        # Hold one model version (see HotSwapRiskEngine.lease) for baseline and candidates
+        with self._lease() as engine:
+            risks, model_version = engine.score_batch([patient])
+            result = {"original_risk": risks[0], "target_risk": target_risk, "plans": [],
+                      "model_version": model_version, "grid_size": len(grid),
+                      "candidates_evaluated": 0, "candidates_pruned": 0}
+            if risks[0] < target_risk:
+                stop_reason = "complete"
+            else:
+                stop_reason = self._scan(engine, patient, axes, grid, cost, target_risk, top_k,
+                                         started + time_limit_ms / 1000.0, result)
+
+        elapsed = time.perf_counter() - started
+        result.update(stop_reason=stop_reason, elapsed_ms=round(elapsed * 1000, 1),
+                      candidates_per_second=round(result["candidates_evaluated"] / elapsed, 1) if elapsed else None)
+        return result
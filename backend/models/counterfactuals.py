@@ -1,68 +1,266 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import json
+import operator
+import os
 import pandas as pd
 import numpy as np
 import copy
+import time
 from .risk_engine import RiskEngine
+from .counterfactual_search import CounterfactualSearch
+from .prediction_cache import PredictionCache
+from .metrics import timed, stage_timer
+
+# Default scenario library; override with SCENARIO_LIBRARY=/path/to/scenarios.json
+SCENARIO_LIBRARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios.json")
+
+CONDITIONS = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne,
+    "in": lambda value, options: value in options,
+    "not_in": lambda value, options: value not in options,
+}
+CHANGES = ("value", "scale", "add")
+ACTIONABLE_FEATURES = ("bmi", "HbA1c_level", "blood_glucose_level", "smoking_history", "hypertension")
+# Risk rises with these: a scenario may lower them but never raise them
+LOWER_IS_BETTER = ("bmi", "HbA1c_level", "blood_glucose_level")
+
+# Default (min, max) of each sensitivity axis, roughly the dataset's range
+SENSITIVITY_RANGES = {
+    "age": (1.0, 80.0),
+    "bmi": (15.0, 50.0),
+    "HbA1c_level": (3.5, 9.0),
+    "blood_glucose_level": (80.0, 300.0),
+}
+SENSITIVITY_CATEGORIES = {
+    "smoking_history": ["never", "former", "not current", "current", "ever", "No Info"],
+    "hypertension": [0, 1],
+    "heart_disease": [0, 1],
+}
+MAX_SENSITIVITY_CELLS = 40_000
+
+
+def load_scenario_library(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Reads and validates a JSON list of scenarios:
+
+        {"name": "Lose 5% Weight",
+         "description": "Reduce BMI to {bmi:.1f}",       # formatted with the new values
+         "when": {"bmi": {">": 25}},                      # all conditions must hold
+         "set": {"bmi": {"scale": 0.95, "min": 18.5}}}    # value | scale | add, optional min / max
+
+    Raises ValueError on unknown features, conditions or changes.
+    """
+    path = path or os.environ.get("SCENARIO_LIBRARY") or SCENARIO_LIBRARY
+    with open(path, "r") as f:
+        scenarios = json.load(f)
+
+    for scenario in scenarios:
+        name = scenario.get("name")
+        if not name or not scenario.get("set"):
+            raise ValueError(f"Scenario {scenario!r} needs a name and a 'set' block")
+        for feature, conditions in scenario.get("when", {}).items():
+            unknown = set(conditions) - set(CONDITIONS)
+            if unknown:
+                raise ValueError(f"Scenario '{name}': unknown conditions {sorted(unknown)} on {feature}")
+        for feature, change in scenario["set"].items():
+            if feature not in ACTIONABLE_FEATURES:
+                raise ValueError(f"Scenario '{name}': {feature} is not an actionable feature")
+            kinds = [k for k in CHANGES if k in change]
+            if len(kinds) != 1 or set(change) - set(CHANGES) - {"min", "max"}:
+                raise ValueError(f"Scenario '{name}': {feature} needs exactly one of {CHANGES}")
+    return scenarios
+
 
 class Counterfactuals:
-    def __init__(self, risk_engine: RiskEngine):
+    def __init__(self, risk_engine: RiskEngine, scenarios: Optional[List[Dict[str, Any]]] = None,
+                 sensitivity_cache_size: int = 128, sensitivity_cache_ttl: float = 300.0):
         self.risk_engine = risk_engine
+        self.scenarios = scenarios if scenarios is not None else load_scenario_library()
+        # Whole curves / heatmaps, keyed by patient + grid + model version
+        self.sensitivity_cache = PredictionCache(max_size=sensitivity_cache_size, ttl_seconds=sensitivity_cache_ttl)
 
-    def simulate_scenarios(self, patient_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _applies(scenario: Dict[str, Any], patient_data: Dict[str, Any]) -> bool:
+        for feature, conditions in scenario.get("when", {}).items():
+            value = patient_data.get(feature)
+            if value is None:
+                return False
+            if not all(CONDITIONS[op](value, target) for op, target in conditions.items()):
+                return False
+        return True
+
+    @staticmethod
+    def _apply(scenario: Dict[str, Any], patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        new_data = dict(patient_data)
+        for feature, change in scenario["set"].items():
+            if "value" in change:
+                value = change["value"]
+            elif "scale" in change:
+                value = patient_data[feature] * change["scale"]
+            else:
+                value = patient_data[feature] + change["add"]
+            if "min" in change:
+                value = max(change["min"], value)
+            if "max" in change:
+                value = min(change["max"], value)
+            if feature in LOWER_IS_BETTER:
+                # e.g. a glucose floor of 90 for a patient already at 80
+                value = min(value, patient_data[feature])
+            if isinstance(value, float):
+                value = round(value, 2)
+            new_data[feature] = value
+        return new_data
+
+    def build_scenarios(self, patient_data: Dict[str, Any], names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
-        Generates predefined scenarios to see if risk can be lowered.
+        Candidate scenarios that apply to this patient and actually change it.
+        Each has name, change_description, modifications and modified_data.
         """
-        scenarios = []
-        original_risk = self.risk_engine.predict_risk(patient_data)
-        
-        # Scenario 1: Reduce BMI by 5%
-        if patient_data.get('bmi', 0) > 25:
-            new_data = copy.deepcopy(patient_data)
-            new_data['bmi'] = new_data['bmi'] * 0.95
-            new_risk = self.risk_engine.predict_risk(new_data)
-            scenarios.append({
-                "name": "Lose 5% Weight",
-                "change_description": f"Reduce BMI to {new_data['bmi']:.1f}",
-                "original_risk": original_risk,
-                "new_risk": new_risk,
-                "risk_reduction": original_risk - new_risk
+        candidates = []
+        for scenario in self.scenarios:
+            if names is not None and scenario["name"] not in names:
+                continue
+            if not self._applies(scenario, patient_data):
+                continue
+            new_data = self._apply(scenario, patient_data)
+            modifications = {k: v for k, v in new_data.items() if v != patient_data.get(k)}
+            if not modifications:
+                continue
+            candidates.append({
+                "name": scenario["name"],
+                "change_description": scenario.get("description", scenario["name"]).format(**new_data),
+                "modifications": modifications,
+                "modified_data": new_data,
             })
+        return candidates
 
-        # Scenario 2: Reduce HbA1c by 1.0
-        if patient_data.get('HbA1c_level', 0) > 6.0:
-            new_data = copy.deepcopy(patient_data)
-            new_data['HbA1c_level'] = max(5.0, new_data['HbA1c_level'] - 1.0)
-            new_risk = self.risk_engine.predict_risk(new_data)
-            scenarios.append({
-                "name": "Improve Glycemic Control",
-                "change_description": f"Lower HbA1c to {new_data['HbA1c_level']:.1f}",
-                "original_risk": original_risk,
-                "new_risk": new_risk,
-                "risk_reduction": original_risk - new_risk
-            })
-            
-        # Scenario 3: Quit Smoking (if smoker)
-        if patient_data.get('smoking_history') in ['current', 'ever']:
-            new_data = copy.deepcopy(patient_data)
-            new_data['smoking_history'] = 'never'
-            new_risk = self.risk_engine.predict_risk(new_data)
+    @timed("counterfactuals", "scenarios")
+    def rank_scenarios(self, patient_data: Dict[str, Any], names: Optional[List[str]] = None,
+                       top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Scores every applicable scenario plus the baseline in one batched
+        call (so all scores come from one model version). Returns the
+        original risk, the scenarios ranked by risk reduction, largest
+        first, and the model version.
+        """
+        if hasattr(patient_data, 'dict'):
+            patient_data = patient_data.dict()
+        candidates = self.build_scenarios(patient_data, names)
+
+        with stage_timer("counterfactuals", "score_scenarios"):
+            risks, model_version = self.risk_engine.score_batch([patient_data] + [c["modified_data"] for c in candidates])
+        original_risk = risks[0]
+
+        scenarios = []
+        for candidate, new_risk in zip(candidates, risks[1:]):
             scenarios.append({
-                "name": "Quit Smoking",
-                "change_description": "Change status to 'Never'",
+                "name": candidate["name"],
+                "change_description": candidate["change_description"],
+                "modifications": candidate["modifications"],
                 "original_risk": original_risk,
                 "new_risk": new_risk,
                 "risk_reduction": original_risk - new_risk
             })
+        scenarios.sort(key=lambda s: s["risk_reduction"], reverse=True)
+        return {"original_risk": original_risk, "scenarios": scenarios[:top_k] if top_k else scenarios,
+                "model_version": model_version}
+
+    def simulate_scenarios(self, patient_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Generates the library's scenarios to see if risk can be lowered, best first.
+        """
+        return self.rank_scenarios(patient_data)["scenarios"]
+
+    def minimal_changes(self, patient_data: Dict[str, Any], target_risk: float,
+                        feature_ranges: Optional[Dict[str, Dict[str, Any]]] = None,
+                        top_k: int = 3, time_limit_ms: float = 1000.0) -> Dict[str, Any]:
+        """
+        Cheapest modifications of the actionable features that bring the risk
+        below target_risk (see CounterfactualSearch).
+        """
+        return CounterfactualSearch(self.risk_engine).search(
+            patient_data, target_risk, feature_ranges, top_k, time_limit_ms
+        )
+
+    @staticmethod
+    def _sensitivity_axis(axis: Dict[str, Any]) -> List[Any]:
+        """
+        Grid values of one axis: explicit values, or points evenly spaced over
+        [min, max] (defaults from SENSITIVITY_RANGES / SENSITIVITY_CATEGORIES).
+        """
+        feature = axis["feature"]
+        if axis.get("values"):
+            return list(axis["values"])
+        if feature in SENSITIVITY_CATEGORIES:
+            return list(SENSITIVITY_CATEGORIES[feature])
+        if feature not in SENSITIVITY_RANGES:
+            raise ValueError(f"No sensitivity range for '{feature}'. "
+                             f"Choose from {list(SENSITIVITY_RANGES) + list(SENSITIVITY_CATEGORIES)}")
+        low, high = SENSITIVITY_RANGES[feature]
+        low, high = axis.get("min", low), axis.get("max", high)
+        points = int(axis.get("points", 50))
+        if points < 2 or low >= high:
+            raise ValueError(f"{feature}: need points >= 2 and min < max")
+        return np.linspace(low, high, points).round(4).tolist()
 
-        return scenarios
+    @timed("counterfactuals", "sensitivity")
+    def sensitivity(self, patient_data: Dict[str, Any], axes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Risk across a grid of values for one or two features, everything else
+        held at the patient's values. Returns the grid values per feature and
+        risks as a list (1D) or rows x columns (2D: rows follow the first
+        axis). The whole grid plus the baseline is one uncached batch; the
+        result is cached per patient, grid and model version.
+        """
+        started = time.perf_counter()
+        if hasattr(patient_data, 'dict'):
+            patient_data = patient_data.dict()
+        if not 1 <= len(axes) <= 2 or len({a["feature"] for a in axes}) != len(axes):
+            raise ValueError("Sensitivity needs one or two distinct features")
+        unknown = [a["feature"] for a in axes if a["feature"] not in patient_data]
+        if unknown:
+            raise ValueError(f"Not patient features: {unknown}. Choose from {list(patient_data)}")
+        grid = {a["feature"]: self._sensitivity_axis(a) for a in axes}
+        features = list(grid)
+        shape = [len(values) for values in grid.values()]
+        if int(np.prod(shape)) > MAX_SENSITIVITY_CELLS:
+            raise ValueError(f"Grid of {' x '.join(map(str, shape))} exceeds {MAX_SENSITIVITY_CELLS} cells")
 
+        cache_features = {**patient_data, "__grid__": json.dumps(grid)}
+        cached = self.sensitivity_cache.get(
+            PredictionCache.make_key("sensitivity", cache_features, self.risk_engine.model_version))
+        if cached is not None:
+            return dict(cached, cached=True, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+
+        mesh = np.meshgrid(*[np.asarray(v, dtype=object) for v in grid.values()], indexing="ij")
+        n = mesh[0].size
+        batch = pd.DataFrame({k: [v] * (n + 1) for k, v in patient_data.items()})
+        for feature, values in zip(features, mesh):
+            # Row 0 is the unchanged patient
+            batch[feature] = [patient_data[feature]] + values.ravel().tolist()
+        with stage_timer("counterfactuals", "score_sensitivity"):
+            risks, model_version = self.risk_engine.score_batch(batch, use_cache=False)
+
+        surface = np.round(np.asarray(risks[1:]).reshape(shape), 6)
+        result = {
+            "features": features,
+            "grid": grid,
+            "risks": surface.tolist(),
+            "original_risk": risks[0],
+            "model_version": model_version,
+        }
+        self.sensitivity_cache.set(PredictionCache.make_key("sensitivity", cache_features, model_version), result)
+        return dict(result, cached=False, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+
+    @timed("counterfactuals", "simulate")
     def predict_simulation(self, original_data: Dict[str, Any], modifications: Dict[str, Any]) -> Dict[str, Any]:
         """
         Predicts risk for a specific user-defined modification.
         """
         new_data = copy.deepcopy(original_data)
         new_data.update(modifications)
-        
+
         new_risk = self.risk_engine.predict_risk(new_data)
         return {
             "new_risk": new_risk,
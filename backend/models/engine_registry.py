@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .shared_artifacts import memory_usage
+
+
+class EngineRegistry:
+    """
+    Single owner of the API's engines (RiskEngine, CohortEngine, ...).
+
+    Each engine is registered with a factory and built once: eagerly by
+    init_eager() (at startup / before forking workers) or lazily on first
+    get(). A factory that raises leaves the engine as None and the error is
+    kept for stats(), matching the "engine not ready" 503s in the routes.
+    Tests can override() an engine with a fake before it is ever built.
+    """
+
+    def __init__(self):
+        # Re-entrant: factories may get() the engines they depend on
+        self._lock = threading.RLock()
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._lazy: Dict[str, bool] = {}
+        self._engines: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], lazy: bool = False):
+        with self._lock:
+            self._factories[name] = factory
+            self._lazy[name] = lazy
+            self._stats[name] = {"status": "registered", "lazy": lazy, "init_seconds": None,
+                                 "rss_delta_mb": None, "error": None}
+
+    def get(self, name: str) -> Optional[Any]:
+        """
+        Returns the engine, building it on first use. None if it failed to build.
+        """
+        if name in self._engines:
+            return self._engines[name]
+
+        with self._lock:
+            if name in self._engines:
+                return self._engines[name]
+            if name not in self._factories:
+                raise KeyError(f"Unknown engine '{name}'")
+            return self._build(name)
+
+    def _build(self, name: str):
+        stats = self._stats[name]
+        rss_before = memory_usage().get("Rss")
+        started = time.perf_counter()
+        try:
+            engine = self._factories[name]()
+            stats.update(status="ready" if engine is not None else "unavailable", error=None)
+            print(f"Engine '{name}' initialized.")
+        except Exception as e:
+            print(f"Error initializing engine '{name}': {e}")
+            engine = None
+            stats.update(status="failed", error=str(e))
+
+        stats["init_seconds"] = round(time.perf_counter() - started, 3)
+        rss_after = memory_usage().get("Rss")
+        if rss_before is not None and rss_after is not None:
+            # Includes anything the factory pulled in (imports, dependent engines)
+            stats["rss_delta_mb"] = round(rss_after - rss_before, 1)
+
+        self._engines[name] = engine
+        return engine
+
+    def init_eager(self):
+        """
+        Builds every engine not registered as lazy.
+        """
+        for name, lazy in list(self._lazy.items()):
+            if not lazy:
+                self.get(name)
+
+    def override(self, name: str, engine: Any):
+        """
+        Replaces an engine with a ready-made instance (e.g. a test fake).
+        """
+        with self._lock:
+            self._engines[name] = engine
+            self._stats.setdefault(name, {"lazy": False, "init_seconds": None, "rss_delta_mb": None})
+            self._stats[name].update(status="overridden", error=None)
+
+    def reset(self, name: str):
+        """
+        Forgets a built or overridden engine so the next get() rebuilds it.
+        """
+        with self._lock:
+            self._engines.pop(name, None)
+            if name in self._factories:
+                self._stats[name].update(status="registered", init_seconds=None, rss_delta_mb=None, error=None)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._engines
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+# Per-process engine used by pool workers
+_worker_engine = None
+
+
+def _init_worker(model_dir: str, explainer_mode: str):
+    global _worker_engine
+    from backend.models.risk_engine import RiskEngine
+    _worker_engine = RiskEngine(model_dir=model_dir, explainer_mode=explainer_mode)
+
+
+def _explain_in_worker(patient_data: Dict[str, Any], model_dir: str = None) -> list:
+    # Follow model hot-swaps: reload if the job targets another model directory
+    if model_dir is not None and os.path.dirname(_worker_engine.model_path) != model_dir:
+        _init_worker(model_dir, _worker_engine.explainer_mode)
+    return _worker_engine.explain_risk(patient_data)
+
+
+class ExplanationResultStore:
+    """
+    Small on-disk store of finished explanation jobs (one JSON file per job).
+    Entries older than ttl_seconds are treated as missing and purged.
+    """
+
+    def __init__(self, directory: str = "data/explain_jobs", ttl_seconds: float = 3600.0):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, job_id: str, record: Dict[str, Any]):
+        record = dict(record, expires_at=time.time() + self.ttl_seconds)
+        tmp_path = self._path(job_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._path(job_id))
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(job_id)
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if record.get("expires_at", 0) < time.time():
+            self._remove(path)
+            return None
+        return record
+
+    def purge_expired(self) -> int:
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r") as f:
+                    expired = json.load(f).get("expires_at", 0) < now
+            except (OSError, json.JSONDecodeError):
+                expired = True
+            if expired:
+                self._remove(path)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ExplanationJobManager:
+    """
+    Runs SHAP explanations off the request thread.
+
+    Jobs run on a bounded process pool (each worker loads its own RiskEngine).
+    The job id is a content address of the patient's engineered features and
+    the model version, so duplicate submissions attach to the job already in
+    flight or to its stored result.
+    """
+
+    def __init__(self, risk_engine, max_workers: int = 2, max_pending: int = 100,
+                 store: ExplanationResultStore = None, use_processes: bool = True):
+        self.risk_engine = risk_engine
+        self.max_pending = max_pending
+        self.store = store or ExplanationResultStore()
+        self._lock = threading.Lock()
+        self._in_flight = {}  # job_id -> (Future, submitted_at)
+
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self._executor = self._make_executor()
+        self._task = _explain_in_worker if use_processes else risk_engine.explain_risk
+
+        # A pool created before fork is unusable in the child: start a fresh one there
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+        self.store.purge_expired()
+
+    def _make_executor(self):
+        if self.use_processes:
+            return ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(os.path.dirname(self.risk_engine.model_path), self.risk_engine.explainer_mode),
+            )
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="explain-job")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._executor = self._make_executor()
+
+    def job_id_for(self, patient_data: Dict[str, Any]) -> str:
+        mode = self.risk_engine.explainer.mode if self.risk_engine.explainer else "none"
+        row = self.risk_engine._preprocess(patient_data).iloc[0].to_dict()
+        key = self.risk_engine._cache_key(f"explain-{mode}", row)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+    def submit(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns the job status for this patient, starting a job only if
+        none is in flight and no unexpired result is stored.
+        """
+        job_id = self.job_id_for(patient_data)
+
+        with self._lock:
+            future = None
+            if job_id not in self._in_flight:
+                stored = self.store.load(job_id)
+                if stored is not None:
+                    return stored
+
+                if len(self._in_flight) >= self.max_pending:
+                    raise OverflowError("Too many pending explanation jobs")
+
+                if self.use_processes:
+                    model_dir = os.path.dirname(self.risk_engine.model_path)
+                    future = self._executor.submit(self._task, patient_data, model_dir)
+                else:
+                    future = self._executor.submit(self._task, patient_data)
+                self._in_flight[job_id] = (future, time.time())
+
+        if future is not None:
+            future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+        return self.status(job_id)
+
+    def _finish(self, job_id: str, future):
+        with self._lock:
+            _, submitted_at = self._in_flight.get(job_id, (None, time.time()))
+
+        record = {"job_id": job_id, "submitted_at": submitted_at, "finished_at": time.time()}
+        try:
+            record.update(status="completed", explanations=future.result(), error=None)
+        except Exception as e:
+            record.update(status="failed", explanations=None, error=str(e))
+
+        self.store.save(job_id, record)
+        with self._lock:
+            self._in_flight.pop(job_id, None)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._in_flight.get(job_id)
+
+        if entry is not None and not entry[0].done():
+            future, submitted_at = entry
+            return self._pending_record(job_id, submitted_at, "running" if future.running() else "pending")
+
+        stored = self.store.load(job_id)
+        if stored is None and entry is not None:
+            # Finished but the result is still being written
+            return self._pending_record(job_id, entry[1], "running")
+        return stored
+
+    @staticmethod
+    def _pending_record(job_id: str, submitted_at: float, status: str) -> Dict[str, Any]:
+        return {
+            "job_id": job_id,
+            "status": status,
+            "submitted_at": submitted_at,
+            "finished_at": None,
+            "explanations": None,
+            "error": None,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,3 +1,278 @@
 # Feature importance and SHAP
+import time
+
+import numpy as np
+import pandas as pd
+import shap
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import VotingClassifier
+from sklearn.preprocessing import OneHotEncoder
+
+
 class Explainability:
-    pass
+    """
+    SHAP explanation engine for the calibrated voting pipeline.
+
+    mode="tree":   Splits the CalibratedClassifierCV(VotingClassifier) into its
+                   members, runs exact Tree SHAP (XGBoost, RandomForest) and
+                   linear SHAP (LogisticRegression) on each, combines them with
+                   the voting weights and maps one-hot columns back to the
+                   pipeline input features.
+    mode="kernel": Model-agnostic KernelExplainer over the whole pipeline
+                   (slow, kept as a fallback for models the tree mode can't split).
+
+    Quality tiers bound the work per explanation. In tree mode the calibrated
+    model is the mean of its CV folds, so a tier caps how many folds are
+    explained and stops early once the running mean of the attributions
+    moves less than `tol`. In kernel mode a tier sets nsamples.
+    """
+
+    MODES = ("tree", "kernel")
+    TIERS = {
+        "fast": {"max_folds": 1, "tol": None, "nsamples": 100},
+        "standard": {"max_folds": 3, "tol": 0.005, "nsamples": 500},
+        "exact": {"max_folds": None, "tol": None, "nsamples": "auto"},
+    }
+
+    def __init__(self, pipeline, background_data: pd.DataFrame, mode: str = "tree"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown explainer mode '{mode}'. Use one of {self.MODES}.")
+
+        self.pipeline = pipeline
+        self.background_data = background_data
+        self.feature_columns = background_data.columns.tolist()
+        self.expected_value = None
+        self.mode = mode
+
+        if mode == "tree":
+            try:
+                self._init_tree()
+            except Exception as e:
+                print(f"Warning: Tree explainer unavailable ({e}). Falling back to KernelExplainer.")
+                self.mode = "kernel"
+
+        if self.mode == "kernel":
+            self._init_kernel()
+
+    # --- Kernel mode ---
+
+    def _init_kernel(self):
+        self.kernel_explainer = shap.KernelExplainer(
+            self._predict_for_shap,
+            self.background_data,
+            link="identity"  # We're already working with probabilities
+        )
+        self.expected_value = float(np.ravel(self.kernel_explainer.expected_value)[0])
+
+    def _predict_for_shap(self, data):
+        """
+        Wrapper for SHAP that handles prediction on preprocessed data.
+        Background data is already preprocessed, so we work directly with it.
+        """
+        if isinstance(data, np.ndarray):
+            # Convert numpy array back to DataFrame using stored column names
+            data = pd.DataFrame(data, columns=self.feature_columns)
+
+        # Return probability of positive class (diabetes)
+        return self.pipeline.predict_proba(data)[:, 1]
+
+    # --- Tree mode ---
+
+    def _init_tree(self):
+        steps = self.pipeline.steps
+        self.preprocessor = self.pipeline.named_steps["preprocessor"]
+        classifier = steps[-1][1]
+
+        # (voting ensemble, calibrator) per CV fold
+        if isinstance(classifier, CalibratedClassifierCV):
+            folds = [(cc.estimator, cc.calibrators[0]) for cc in classifier.calibrated_classifiers_]
+        else:
+            folds = [(classifier, None)]
+
+        bg_t = self.preprocessor.transform(self.background_data)
+        self._bg_transformed = bg_t
+        self._column_map = self._build_column_map()
+
+        self._folds = []
+        for voting, calibrator in folds:
+            if not isinstance(voting, VotingClassifier) or voting.voting != "soft":
+                raise TypeError(f"expected a soft VotingClassifier, got {type(voting).__name__}")
+
+            weights = voting.weights if voting.weights is not None else [1.0] * len(voting.estimators_)
+            weights = np.asarray(weights, dtype=float) / np.sum(weights)
+
+            members = [self._member_explainer(est, bg_t) for est in voting.estimators_]
+            fold_bg = self._fold_output(voting, calibrator, bg_t)
+            self._folds.append({
+                "voting": voting,
+                "calibrator": calibrator,
+                "weights": weights,
+                "members": members,
+                "base_vote": float(voting.predict_proba(bg_t)[:, 1].mean()),
+                "base_output": float(fold_bg.mean()),
+            })
+
+        self.expected_value = float(np.mean([f["base_output"] for f in self._folds]))
+
+    def _member_explainer(self, estimator, bg_t):
+        if hasattr(estimator, "coef_"):
+            # Linear SHAP with an independent background: coef * (x - E[x]) in log-odds
+            return {"kind": "linear", "estimator": estimator,
+                    "coef": np.ravel(estimator.coef_), "bg_mean": bg_t.mean(axis=0),
+                    "base_proba": float(estimator.predict_proba(bg_t)[:, 1].mean())}
+
+        explainer = shap.TreeExplainer(
+            estimator,
+            data=bg_t,
+            feature_perturbation="interventional",
+            model_output="probability"
+        )
+        return {"kind": "tree", "explainer": explainer}
+
+    def _fold_output(self, voting, calibrator, X_t):
+        vote = voting.predict_proba(X_t)[:, 1]
+        if calibrator is None:
+            return vote
+        return np.clip(calibrator.predict(vote), 0.0, 1.0)
+
+    def _build_column_map(self) -> np.ndarray:
+        """
+        Returns a (n_transformed, n_input) 0/1 matrix that folds transformed
+        columns (scaled numerics, one-hot levels) back onto their input column.
+        """
+        n_out = self._bg_transformed.shape[1]
+        mapping = np.zeros((n_out, len(self.feature_columns)))
+
+        for name, transformer, columns in self.preprocessor.transformers_:
+            if name == "remainder" or transformer == "drop":
+                continue
+            out_slice = self.preprocessor.output_indices_[name]
+            steps = transformer.steps if hasattr(transformer, "steps") else [(name, transformer)]
+            encoder = next((s for _, s in steps if isinstance(s, OneHotEncoder)), None)
+
+            if encoder is not None:
+                widths = [len(c) for c in encoder.categories_]
+            else:
+                widths = [1] * len(columns)
+
+            pos = out_slice.start
+            for col, width in zip(columns, widths):
+                mapping[pos:pos + width, self.feature_columns.index(col)] = 1.0
+                pos += width
+
+        return mapping
+
+    def _member_values(self, member, X_t) -> np.ndarray:
+        if member["kind"] == "linear":
+            phi = (X_t - member["bg_mean"]) * member["coef"]
+            # Rescale log-odds attributions so they sum to the change in probability
+            margin = phi.sum(axis=1, keepdims=True)
+            proba = member["estimator"].predict_proba(X_t)[:, 1][:, None]
+            delta = proba - member["base_proba"]
+            scale = np.divide(delta, margin, out=np.zeros_like(margin), where=np.abs(margin) > 1e-12)
+            return phi * scale
+
+        values = member["explainer"].shap_values(X_t)
+        if isinstance(values, list):
+            values = values[1]
+        values = np.asarray(values)
+        if values.ndim == 3:
+            values = values[:, :, 1]
+        return values
+
+    def _fold_values(self, fold, X_t) -> np.ndarray:
+        vote_phi = sum(w * self._member_values(m, X_t) for w, m in zip(fold["weights"], fold["members"]))
+
+        # Push the ensemble attributions through the isotonic calibrator by
+        # rescaling them to the change in calibrated output
+        vote = fold["voting"].predict_proba(X_t)[:, 1]
+        output = vote if fold["calibrator"] is None else np.clip(fold["calibrator"].predict(vote), 0.0, 1.0)
+        vote_delta = (vote - fold["base_vote"])[:, None]
+        output_delta = (output - fold["base_output"])[:, None]
+        scale = np.divide(output_delta, vote_delta, out=np.ones_like(vote_delta),
+                          where=np.abs(vote_delta) > 1e-12)
+        return vote_phi * scale
+
+    def _tree_shap_values(self, df: pd.DataFrame, max_folds: int = None, tol: float = None,
+                          budget_ms: float = None):
+        """
+        Mean of per-fold attributions over up to max_folds folds.
+        Returns (values, folds_used, stop_reason).
+        """
+        started = time.perf_counter()
+        X_t = self.preprocessor.transform(df)
+        folds = self._folds[:max_folds] if max_folds else self._folds
+        mean = np.zeros(X_t.shape)
+        stop_reason = "complete" if len(folds) == len(self._folds) else "tier"
+
+        for k, fold in enumerate(folds, start=1):
+            previous = mean
+            mean = previous + (self._fold_values(fold, X_t) - previous) / k
+            if k == len(folds):
+                break
+            if tol is not None and k > 1 and np.abs(mean - previous).max() < tol:
+                stop_reason = "converged"
+                break
+            # Stop if the next fold would likely overrun the budget
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if budget_ms is not None and elapsed_ms * (k + 1) / k > budget_ms:
+                stop_reason = "budget"
+                break
+
+        return mean @ self._column_map, k, stop_reason
+
+    def _kernel_shap_values(self, df: pd.DataFrame, nsamples="auto") -> np.ndarray:
+        values = self.kernel_explainer.shap_values(df, nsamples=nsamples)
+        if isinstance(values, list):
+            values = values[1]
+        values = np.asarray(values)
+        if values.ndim == 3:
+            values = values[:, :, 1]
+        return values.reshape(len(df), -1)
+
+    # --- Public API ---
+
+    def shap_values(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Returns SHAP values of the diabetes probability, shape (n_samples, n_features),
+        in the column order of the background data.
+        """
+        df = df[self.feature_columns]
+        if self.mode == "tree":
+            return self._tree_shap_values(df)[0]
+        return self._kernel_shap_values(df)
+
+    def explain(self, df: pd.DataFrame, tier: str = "exact", budget_ms: float = None, prediction=None):
+        """
+        shap_values at a quality tier, optionally capped by a latency budget.
+
+        Returns (values, info). info has the tier, folds used, why it stopped
+        ("complete", "tier", "converged" or "budget"), elapsed ms and the
+        additivity error max |sum(values) - (f(x) - E[f(x)])| against the
+        full model's prediction (pass `prediction` to avoid recomputing it).
+        """
+        if tier not in self.TIERS:
+            raise ValueError(f"Unknown explanation tier '{tier}'. Use one of {tuple(self.TIERS)}.")
+        config = self.TIERS[tier]
+        df = df[self.feature_columns]
+
+        started = time.perf_counter()
+        info = {"tier": tier, "mode": self.mode}
+        if self.mode == "tree":
+            values, folds_used, stop_reason = self._tree_shap_values(
+                df, max_folds=config["max_folds"], tol=config["tol"], budget_ms=budget_ms)
+            info.update(folds_used=folds_used, folds_total=len(self._folds), stop_reason=stop_reason)
+        else:
+            # Kernel cost is set up front: a tight budget drops to the fast tier's sample count
+            nsamples = config["nsamples"]
+            if budget_ms is not None and budget_ms < 1000:
+                nsamples = self.TIERS["fast"]["nsamples"]
+            values = self._kernel_shap_values(df, nsamples=nsamples)
+            info.update(nsamples=nsamples, stop_reason="complete")
+        info["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        if prediction is None:
+            prediction = self.pipeline.predict_proba(df)[:, 1]
+        residual = values.sum(axis=1) - (np.ravel(prediction) - self.expected_value)
+        info["additivity_error"] = float(np.abs(residual).max())
+        return values, info
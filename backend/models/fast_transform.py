@@ -0,0 +1,105 @@
+import bisect
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+
+class CompiledPreprocessor:
+    """
+    Numpy-only replacement for the fitted ColumnTransformer, for one row at a time.
+
+    Built once at load time from the fitted pipeline: imputer fill values,
+    scaler means/scales and one-hot index tables are copied out of the
+    sklearn objects, so transforming a patient needs no DataFrame.
+    Supports the step types train_pro.py uses (SimpleImputer, StandardScaler,
+    OneHotEncoder); anything else raises TypeError at compile time.
+    """
+
+    def __init__(self, preprocessor):
+        self.numeric = []      # (input column, fill value, mean, scale, output index)
+        self.categorical = []  # (input column, fill value, {category: output index})
+        self.n_features = max(s.stop for s in preprocessor.output_indices_.values())
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == "remainder" or transformer == "drop":
+                continue
+            steps = [s for _, s in transformer.steps] if hasattr(transformer, "steps") else [transformer]
+            out_start = preprocessor.output_indices_[name].start
+            self._compile(steps, list(columns), out_start)
+
+    def _compile(self, steps, columns: List[str], out_start: int):
+        fills = [None] * len(columns)
+        means = np.zeros(len(columns))
+        scales = np.ones(len(columns))
+        encoder = None
+
+        for step in steps:
+            if isinstance(step, SimpleImputer):
+                fills = list(step.statistics_)
+            elif isinstance(step, StandardScaler):
+                if step.with_mean:
+                    means = step.mean_
+                if step.with_std:
+                    scales = step.scale_
+            elif isinstance(step, OneHotEncoder):
+                if step.drop_idx_ is not None or getattr(step, "infrequent_categories_", None):
+                    raise TypeError("OneHotEncoder with drop/infrequent categories is not supported")
+                encoder = step
+            else:
+                raise TypeError(f"Cannot compile preprocessing step {type(step).__name__}")
+
+        if encoder is None:
+            for i, col in enumerate(columns):
+                self.numeric.append((col, fills[i], float(means[i]), float(scales[i]), out_start + i))
+            return
+
+        pos = out_start
+        for i, col in enumerate(columns):
+            table = {}
+            for category in encoder.categories_[i]:
+                table[category] = pos
+                pos += 1
+            self.categorical.append((col, fills[i], table))
+
+    @staticmethod
+    def _is_missing(value) -> bool:
+        return value is None or (isinstance(value, float) and math.isnan(value))
+
+    def transform_row(self, row: Dict[str, Any]) -> np.ndarray:
+        """
+        Returns the (1, n_features) dense vector the calibrated ensemble expects.
+        """
+        out = np.zeros((1, self.n_features))
+        vec = out[0]
+
+        for col, fill, mean, scale, idx in self.numeric:
+            value = row.get(col)
+            if self._is_missing(value):
+                value = fill
+            vec[idx] = (float(value) - mean) / scale
+
+        for col, fill, table in self.categorical:
+            value = row.get(col)
+            if self._is_missing(value):
+                value = fill
+            idx = table.get(value)
+            if idx is not None:  # handle_unknown='ignore' -> all zeros
+                vec[idx] = 1.0
+
+        return out
+
+
+def cut_label(value, bins, labels):
+    """
+    Single-value equivalent of pd.cut(value, bins, labels) with right-closed bins.
+    Returns NaN when the value falls outside the bins.
+    """
+    if value is None or math.isnan(value):
+        return float("nan")
+    idx = bisect.bisect_left(bins, value)
+    if idx == 0 or idx == len(bins):
+        return float("nan")
+    return labels[idx - 1]
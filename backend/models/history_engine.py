@@ -3,6 +3,7 @@ import os
 from datetime import datetime
 from typing import Dict, Any, List
 import numpy as np
+from .metrics import timed
 
 class HistoryEngine:
     def __init__(self, storage_file="data/patient_history.json"):
@@ -35,22 +36,48 @@ class HistoryEngine:
         with open(self.storage_file, 'w') as f:
             json.dump(self.history, f, indent=4)
 
-    def save_record(self, patient_data: Dict[str, Any], risk_score: float, risk_level: str):
+    def _build_record(self, patient_data: Dict[str, Any], risk_score: float, risk_level: str, timestamp: str = None,
+                      model_version: str = None) -> Dict[str, Any]:
         """
-        Save a new prediction record.
+        Build a history record without persisting it.
         """
-        record = {
-            "timestamp": datetime.now().isoformat(),
+        return {
+            "timestamp": timestamp or datetime.now().isoformat(),
             "patient_data": patient_data,
             "risk_assessment": {
                 "score": risk_score,
-                "level": risk_level
+                "level": risk_level,
+                "model_version": model_version
             }
         }
+
+    @timed("history_engine", "save")
+    def save_record(self, patient_data: Dict[str, Any], risk_score: float, risk_level: str, model_version: str = None):
+        """
+        Save a new prediction record.
+        """
+        record = self._build_record(patient_data, risk_score, risk_level, model_version=model_version)
         self.history.append(record)
         self._save_history()
         return record
 
+    @timed("history_engine", "save")
+    def save_records(self, patient_data: List[Dict[str, Any]], risk_scores: List[float], risk_levels: List[str],
+                     model_version: str = None) -> List[Dict[str, Any]]:
+        """
+        Save many prediction records with a single write to disk.
+        """
+        timestamp = datetime.now().isoformat()
+        records = [
+            self._build_record(data, score, level, timestamp, model_version)
+            for data, score, level in zip(patient_data, risk_scores, risk_levels)
+        ]
+        if records:
+            self.history.extend(records)
+            self._save_history()
+        return records
+
+    @timed("history_engine", "read")
     def get_history(self, limit: int = 10) -> Dict[str, Any]:
         """
         Get the most recent history records + trend analysis.
@@ -0,0 +1,230 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .model_registry import ModelRegistry
+
+
+class _ServingModel:
+    """
+    One loaded RiskEngine plus the number of requests currently using it.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.version = engine.model_version
+        self.in_flight = 0
+        self.retired_at = None
+
+
+class HotSwapRiskEngine:
+    """
+    Stable facade over the RiskEngine serving the active model version.
+
+    Every call leases the engine that is active when it starts, so a swap
+    never mixes two versions inside one request. swap_to() loads a version
+    from the ModelRegistry in a background thread, warms it up with a canary
+    batch, then replaces the active engine in one assignment. The previous
+    engine keeps serving the requests that leased it and is dropped once
+    they drain (or after drain_timeout seconds).
+
+    With follow_registry, the registry's ACTIVE pointer is checked at most
+    every registry_check_interval seconds and a swap starts when another
+    process (e.g. the worker that served the admin request) moved it.
+
+    Attributes not defined here (model_version, cache_stats, explainer, ...)
+    are read from the active engine.
+    """
+
+    def __init__(self, engine, registry: ModelRegistry = None,
+                 engine_factory: Callable[[str], Any] = None,
+                 canary_size: int = 32, drain_timeout: float = 60.0,
+                 follow_registry: bool = True, registry_check_interval: float = 5.0):
+        self._lock = threading.Condition()
+        self._active = _ServingModel(engine)
+        self._draining: List[_ServingModel] = []
+        self.registry = registry or ModelRegistry()
+        self.engine_factory = engine_factory
+        self.canary_size = canary_size
+        self.drain_timeout = drain_timeout
+
+        self._swap_thread = None
+        self.swap_status: Dict[str, Any] = {"state": "idle", "version": None, "error": None}
+
+        self.follow_registry = follow_registry and engine_factory is not None
+        self.registry_check_interval = registry_check_interval
+        self._last_registry_check = time.monotonic()
+        self._failed_versions = set()
+
+    def __getattr__(self, name):
+        # Only called for attributes missing on the facade itself
+        if name.startswith("__") or name == "_active":
+            raise AttributeError(name)
+        return getattr(self._active.engine, name)
+
+    @contextmanager
+    def lease(self):
+        """
+        Yields the active engine and keeps it alive until the block exits.
+        """
+        if self.follow_registry:
+            self._check_registry()
+        with self._lock:
+            serving = self._active
+            serving.in_flight += 1
+        try:
+            yield serving.engine
+        finally:
+            with self._lock:
+                serving.in_flight -= 1
+                if serving.in_flight == 0 and serving.retired_at is not None:
+                    self._lock.notify_all()
+
+    def _check_registry(self):
+        now = time.monotonic()
+        if now - self._last_registry_check < self.registry_check_interval:
+            return
+        self._last_registry_check = now
+
+        version = self.registry.active_version()
+        if version is None or version == self._active.version or version in self._failed_versions:
+            return
+        if self._swap_thread is not None and self._swap_thread.is_alive():
+            return
+        print(f"Registry now points at model {version}. Swapping...")
+        try:
+            self.swap_to(version)
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"Warning: could not follow registry to {version}: {e}")
+
+    def predict_risk(self, patient_data) -> float:
+        with self.lease() as engine:
+            return engine.predict_risk(patient_data)
+
+    def predict_risk_batch(self, patients, use_cache: bool = True) -> list:
+        with self.lease() as engine:
+            return engine.predict_risk_batch(patients, use_cache)
+
+    def score_batch(self, patients, use_cache: bool = True):
+        with self.lease() as engine:
+            return engine.score_batch(patients, use_cache)
+
+    def explain_risk(self, patient_data, tier: str = None, budget_ms: float = None) -> list:
+        with self.lease() as engine:
+            return engine.explain_risk(patient_data, tier, budget_ms)
+
+    def explain_risk_detailed(self, patient_data, tier: str = None, budget_ms: float = None) -> dict:
+        with self.lease() as engine:
+            return engine.explain_risk_detailed(patient_data, tier, budget_ms)
+
+    def swap_to(self, version: str) -> Dict[str, Any]:
+        """
+        Starts loading `version` in the background and returns the swap status.
+        Raises RuntimeError if a swap is already in progress.
+        """
+        if self.engine_factory is None:
+            raise RuntimeError("No engine factory configured for hot-swap")
+        if self.registry.manifest(version) is None:
+            raise FileNotFoundError(f"Model version '{version}' not found")
+
+        with self._lock:
+            if self._swap_thread is not None and self._swap_thread.is_alive():
+                raise RuntimeError(f"Swap to '{self.swap_status['version']}' already in progress")
+            self.swap_status = {"state": "loading", "version": version, "error": None,
+                                "started_at": time.time(), "previous_version": self._active.version}
+            self._swap_thread = threading.Thread(target=self._swap, args=(version,),
+                                                 name=f"model-swap-{version}", daemon=True)
+            self._swap_thread.start()
+        return self.status()
+
+    def wait_for_swap(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        if self._swap_thread is not None:
+            self._swap_thread.join(timeout)
+        return self.status()
+
+    def _swap(self, version: str):
+        try:
+            self.registry.verify(version)
+            load_started = time.perf_counter()
+            engine = self.engine_factory(self.registry.version_dir(version))
+            self.swap_status["load_seconds"] = round(time.perf_counter() - load_started, 3)
+
+            self.swap_status["state"] = "warming"
+            self.swap_status["canary"] = self._warm_up(engine)
+        except Exception as e:
+            print(f"Model swap to {version} failed: {e}")
+            self._failed_versions.add(version)
+            self.swap_status.update(state="failed", error=str(e), finished_at=time.time())
+            return
+
+        with self._lock:
+            previous = self._active
+            self._active = _ServingModel(engine)
+            previous.retired_at = time.time()
+            self._draining.append(previous)
+        try:
+            self.registry.set_active(version)
+        except OSError as e:
+            print(f"Warning: could not record active model version: {e}")
+        print(f"✅ Model {version} is now serving (was {previous.version}).")
+
+        self.swap_status.update(state="draining", swapped_at=time.time())
+        drained = self._drain(previous)
+        self.swap_status.update(state="active", drained=drained, finished_at=time.time())
+
+    def _warm_up(self, engine) -> Dict[str, Any]:
+        """
+        Scores a canary batch (and one explanation) on the new engine before it
+        takes traffic. Rejects the version if any score is outside [0, 1].
+        """
+        rows = self._canary_rows(engine)
+        started = time.perf_counter()
+        scores = engine.predict_risk_batch(rows)
+        if len(scores) != len(rows) or not all(math.isfinite(s) and 0.0 <= s <= 1.0 for s in scores):
+            raise ValueError("Canary batch produced invalid risk scores")
+        # Single-row path and explainer are separate code paths: warm them too
+        engine.predict_risk(rows[0])
+        if engine.explainer is not None:
+            engine.explain_risk(rows[0])
+        canary = {"rows": len(rows), "warmup_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        # How far the new version moves scores on the same patients (informational)
+        with self.lease() as current:
+            previous_scores = current.predict_risk_batch(rows)
+        canary["mean_abs_diff_vs_previous"] = float(np.mean(np.abs(np.subtract(scores, previous_scores))))
+        return canary
+
+    def _canary_rows(self, engine) -> list:
+        background = engine.background_data
+        if background is None or len(background) == 0:
+            background = self._active.engine.background_data
+        if background is None or len(background) == 0:
+            raise ValueError("No background data to build a canary batch from")
+        return background.head(self.canary_size).to_dict("records")
+
+    def _drain(self, serving: _ServingModel) -> bool:
+        deadline = time.monotonic() + self.drain_timeout
+        with self._lock:
+            while serving.in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"Warning: {serving.in_flight} requests still on model {serving.version} after drain timeout.")
+                    break
+                self._lock.wait(remaining)
+            drained = serving.in_flight == 0
+            self._draining.remove(serving)
+        serving.engine.cache.clear()
+        return drained
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_version": self._active.version,
+                "in_flight": self._active.in_flight,
+                "draining": [{"version": s.version, "in_flight": s.in_flight} for s in self._draining],
+                "swap": dict(self.swap_status),
+            }
@@ -0,0 +1,180 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+
+class Histogram:
+    """
+    Cumulative bucket counts plus sum/count (Prometheus-style "le" buckets).
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            cumulative[f"{bound:g}"] = running
+        cumulative["+Inf"] = self.count
+        return {"buckets": cumulative, "sum": round(self.sum, 6), "count": self.count}
+
+
+# Seconds; spans single-row scoring (sub-ms) to LLM generation (tens of s)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}" if body else ""
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics in Prometheus text exposition format (0.0.4).
+
+    Histograms and counters are keyed by a label tuple. An observation is a
+    dict lookup, a bisect and a few adds under one lock, cheap enough to
+    leave on around every stage. Collectors are callables returning extra
+    (name, type, help, samples) families computed at scrape time.
+    """
+
+    def __init__(self, namespace: str = "clinical_risk"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[str, Dict[str, Any]] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def _family(self, store, name, help_text, label_names, **extra):
+        family = store.get(name)
+        if family is None:
+            family = store[name] = dict(help=help_text, label_names=tuple(label_names), series={}, **extra)
+        return family
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str], buckets=STAGE_BUCKETS):
+        with self._lock:
+            self._family(self._histograms, name, help_text, label_names, buckets=tuple(buckets))
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str]):
+        with self._lock:
+            self._family(self._counters, name, help_text, label_names)
+
+    def observe(self, name: str, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            family = self._histograms[name]
+            series = family["series"].get(labels)
+            if series is None:
+                series = family["series"][labels] = Histogram(family["buckets"])
+            series.observe(value)
+
+    def inc(self, name: str, labels: Tuple[str, ...], amount: float = 1.0):
+        with self._lock:
+            series = self._counters[name]["series"]
+            series[labels] = series.get(labels, 0.0) + amount
+
+    def register_collector(self, collector: Callable[[], Iterable[tuple]]):
+        self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            for family in list(self._histograms.values()) + list(self._counters.values()):
+                family["series"].clear()
+
+    def render(self) -> str:
+        """
+        Returns every metric in Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, family in self._histograms.items():
+                full = f"{self.namespace}_{name}"
+                lines += [f"# HELP {full} {family['help']}", f"# TYPE {full} histogram"]
+                for labels, hist in family["series"].items():
+                    pairs = list(zip(family["label_names"], labels))
+                    running = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        running += count
+                        lines.append(f"{full}_bucket{_labels(pairs + [('le', f'{bound:g}')])} {running}")
+                    lines.append(f"{full}_bucket{_labels(pairs + [('le', '+Inf')])} {hist.count}")
+                    lines.append(f"{full}_sum{_labels(pairs)} {hist.sum!r}")
+                    lines.append(f"{full}_count{_labels(pairs)} {hist.count}")
+
+            for name, family in self._counters.items():
+                full = f"{self.namespace}_{name}"
+                lines += [f"# HELP {full} {family['help']}", f"# TYPE {full} counter"]
+                for labels, value in family["series"].items():
+                    lines.append(f"{full}{_labels(zip(family['label_names'], labels))} {value!r}")
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                full = f"{self.namespace}_{name}"
+                lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+                for suffix, labels, value in samples:
+                    lines.append(f"{full}{suffix}{_labels(labels.items())} {float(value)!r}")
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRICS.histogram("stage_duration_seconds", "Latency of internal processing stages.", ("component", "stage"))
+METRICS.counter("stage_errors_total", "Stages that raised an exception.", ("component", "stage"))
+METRICS.histogram("http_request_duration_seconds", "Latency of HTTP requests by route.",
+                  ("method", "route", "status"))
+
+
+@contextmanager
+def stage_timer(component: str, stage: str):
+    """
+    Records the duration of the block (and an error if it raises) for component/stage.
+    """
+    labels = (component, stage)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        METRICS.inc("stage_errors_total", labels)
+        raise
+    finally:
+        METRICS.observe("stage_duration_seconds", labels, time.perf_counter() - started)
+
+
+def timed(component: str, stage: str):
+    """
+    Decorator form of stage_timer.
+    """
+    def decorator(fn):
+        labels = (component, stage)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                METRICS.inc("stage_errors_total", labels)
+                raise
+            finally:
+                METRICS.observe("stage_duration_seconds", labels, time.perf_counter() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,164 @@
+"""
+Mixed-type (Gower-style) digital-twin search.
+
+The distance between a patient and a cohort row averages per-feature
+dissimilarities with configurable weights:
+
+    d = (sum_j w_j * |x_j - y_j| / range_j  +  sum_c w_c * [x_c != y_c]) / sum(w)
+
+over the numeric features (age, BMI, HbA1c, glucose; range_j is the cohort's
+range) and the categorical / binary ones (gender, smoking history,
+hypertension, heart disease). It is 0 for identical patients, and a single
+category mismatch costs w_c / sum(w) whatever the vitals.
+
+The categorical term is constant within the rows sharing one combination of
+categories, so rows are partitioned by that combination, with a Manhattan
+KD-tree over the weighted numeric features inside each partition. A query
+visits partitions in order of their mismatch cost and stops once that cost
+alone exceeds its current k-th distance; with the default weights the
+exact-match partition almost always settles it. The search is exact.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+NUMERIC_FEATURES = ["age", "bmi", "HbA1c_level", "blood_glucose_level"]
+CATEGORICAL_FEATURES = ["gender", "smoking_history", "hypertension", "heart_disease"]
+DEFAULT_WEIGHTS = {name: 1.0 for name in NUMERIC_FEATURES + CATEGORICAL_FEATURES}
+
+
+def parse_weights(text: Optional[str]) -> Dict[str, float]:
+    """
+    "hypertension=2,smoking_history=0.5" -> {"hypertension": 2.0, "smoking_history": 0.5}
+    """
+    weights = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected feature=weight, got '{item.strip()}'")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+class GowerTwinIndex:
+    """
+    Exact k-nearest search under the weighted Gower-style distance above.
+
+    A weight of 0 drops the feature (a categorical then no longer splits
+    partitions); at least one numeric feature must keep a positive weight.
+    Numeric ranges are fixed at fit(); add() inserts rows by rebuilding only
+    the partitions they fall in.
+    """
+    kind = "gower"
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        unknown = set(weights or {}) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown twin weights {sorted(unknown)}. Use {list(DEFAULT_WEIGHTS)}")
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        if any(w < 0 for w in self.weights.values()):
+            raise ValueError("Twin weights must be non-negative")
+        self.numeric = [c for c in NUMERIC_FEATURES if self.weights[c] > 0]
+        self.categorical = [c for c in CATEGORICAL_FEATURES if self.weights[c] > 0]
+        if not self.numeric:
+            raise ValueError(f"At least one of {NUMERIC_FEATURES} needs a positive weight")
+        self.total_weight = sum(self.weights.values())
+        self.category_weights = np.array([self.weights[c] for c in self.categorical], dtype=np.float64)
+        self.scale = None
+        # Partition p: its category values keys[p], row ids ids[p], points[p] and tree[p]
+        self.keys: List[Tuple[str, ...]] = []
+        self.ids: List[np.ndarray] = []
+        self.points: List[np.ndarray] = []
+        self.trees: List[KDTree] = []
+        self._key_matrix = np.empty((0, len(self.categorical)), dtype=object)
+        self._partition_of: Dict[Tuple[str, ...], int] = {}
+        self.ntotal = 0
+
+    def _category_keys(self, frame) -> List[Tuple[str, ...]]:
+        # Compared as strings, so 1 / "1" and "Female" / Categorical values agree
+        columns = [[str(v) for v in frame[c]] for c in self.categorical]
+        return list(zip(*columns)) if columns else [()] * len(frame[self.numeric[0]])
+
+    def _numeric_points(self, frame) -> np.ndarray:
+        values = np.column_stack([np.asarray(frame[c], dtype=np.float64) for c in self.numeric])
+        return values * self.scale
+
+    def fit(self, df: pd.DataFrame) -> "GowerTwinIndex":
+        values = df[self.numeric].to_numpy(dtype=np.float64)
+        ranges = values.max(axis=0) - values.min(axis=0)
+        ranges[ranges == 0] = 1.0
+        self.scale = np.array([self.weights[c] for c in self.numeric]) / ranges
+        self.keys, self.ids, self.points, self.trees = [], [], [], []
+        self._partition_of = {}
+        self.ntotal = 0
+        self.add(df)
+        return self
+
+    def add(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Inserts rows after the existing ones; returns their row ids.
+        """
+        ids = np.arange(self.ntotal, self.ntotal + len(df))
+        if len(df) == 0:
+            return ids
+        points = self._numeric_points(df)
+        codes, uniques = pd.factorize(pd.Series(self._category_keys(df), dtype=object))
+        for code, key in enumerate(uniques):
+            rows = np.flatnonzero(codes == code)
+            p = self._partition_of.get(key)
+            if p is None:
+                p = self._partition_of[key] = len(self.keys)
+                self.keys.append(key)
+                self.ids.append(ids[rows])
+                self.points.append(points[rows])
+                self.trees.append(None)
+            else:
+                self.ids[p] = np.concatenate([self.ids[p], ids[rows]])
+                self.points[p] = np.vstack([self.points[p], points[rows]])
+            self.trees[p] = KDTree(self.points[p], metric="manhattan")
+        self._key_matrix = np.array(self.keys, dtype=object).reshape(len(self.keys), len(self.categorical))
+        self.ntotal += len(df)
+        return ids
+
+    def mismatch_costs(self, key: Tuple[str, ...]) -> np.ndarray:
+        """
+        Weighted categorical mismatch of every partition against one key.
+        """
+        if not self.categorical:
+            return np.zeros(len(self.keys))
+        return (self._key_matrix != np.array(key, dtype=object)) @ self.category_weights
+
+    def search(self, patients, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distances, row ids), each (len(patients), k), nearest first.
+        patients is a list of dicts or a DataFrame with the weighted features.
+        """
+        if isinstance(patients, list):
+            patients = {c: [p.get(c) for p in patients] for c in self.numeric + self.categorical}
+        points = self._numeric_points(patients)
+        keys = self._category_keys(patients)
+        k = max(1, min(int(k), self.ntotal))
+        distances = np.full((len(points), k), np.inf)
+        indices = np.full((len(points), k), -1, dtype=np.int64)
+
+        codes, uniques = pd.factorize(pd.Series(keys, dtype=object))
+        for code, key in enumerate(uniques):
+            rows = np.flatnonzero(codes == code)
+            costs = self.mismatch_costs(key)
+            for p in np.argsort(costs, kind="stable"):
+                # Partitions come cheapest first: once the cost alone can't beat
+                # a query's k-th distance, no later partition can either
+                rows = rows[distances[rows, -1] > costs[p]]
+                if len(rows) == 0:
+                    break
+                d, j = self.trees[p].query(points[rows], k=min(k, len(self.ids[p])))
+                merged_d = np.hstack([distances[rows], d + costs[p]])
+                merged_i = np.hstack([indices[rows], self.ids[p][j]])
+                order = np.argsort(merged_d, axis=1, kind="stable")[:, :k]
+                distances[rows] = np.take_along_axis(merged_d, order, axis=1)
+                indices[rows] = np.take_along_axis(merged_i, order, axis=1)
+        return distances / self.total_weight, indices
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+# File names inside a version directory (same names RiskEngine loads from model_dir)
+PIPELINE_FILE = "risk_pipeline_v1.joblib"
+BACKGROUND_FILE = "background_data.joblib"
+ONNX_FILE = "risk_pipeline_v1.onnx"
+MANIFEST_FILE = "manifest.json"
+ACTIVE_FILE = "ACTIVE"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Versioned, immutable model directories:
+
+        <root>/<version>/risk_pipeline_v1.joblib
+        <root>/<version>/background_data.joblib
+        <root>/<version>/risk_pipeline_v1.onnx   (optional)
+        <root>/<version>/manifest.json
+        <root>/ACTIVE                            (version served at startup)
+
+    A version directory is written under a temporary name and renamed into
+    place, so a reader never sees a half-published version. Published files
+    are never modified; deploying means publishing a new version.
+    """
+
+    def __init__(self, root: str = "backend/models/registry"):
+        self.root = root
+
+    def version_dir(self, version: str) -> str:
+        if not version or os.sep in version or version.startswith("."):
+            raise ValueError(f"Invalid model version '{version}'")
+        return os.path.join(self.root, version)
+
+    def publish(self, pipeline_path: str, background_path: str, onnx_path: str = None,
+                version: str = None, source: str = None, metrics: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Copies the artifacts into a new version directory and returns its manifest.
+        The version defaults to the pipeline's short SHA-256 (RiskEngine's model_version).
+        """
+        pipeline_sha = file_sha256(pipeline_path)
+        version = version or pipeline_sha[:12]
+        target = self.version_dir(version)
+        if os.path.exists(target):
+            raise FileExistsError(f"Model version '{version}' already exists")
+
+        staging = os.path.join(self.root, f".staging-{version}-{os.getpid()}")
+        os.makedirs(staging)
+        try:
+            files = {PIPELINE_FILE: pipeline_path, BACKGROUND_FILE: background_path}
+            if onnx_path:
+                files[ONNX_FILE] = onnx_path
+            for name, src in files.items():
+                shutil.copyfile(src, os.path.join(staging, name))
+
+            manifest = {
+                "version": version,
+                "created_at": time.time(),
+                "source": source,
+                "metrics": metrics or {},
+                "files": {name: file_sha256(os.path.join(staging, name)) for name in files},
+            }
+            with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return manifest
+
+    def manifest(self, version: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.version_dir(version), MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """
+        Manifests of all published versions, oldest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        manifests = [self.manifest(name) for name in os.listdir(self.root) if not name.startswith(".")]
+        return sorted((m for m in manifests if m), key=lambda m: m.get("created_at", 0))
+
+    def verify(self, version: str):
+        """
+        Raises ValueError if any file of the version doesn't match its manifest checksum.
+        """
+        manifest = self.manifest(version)
+        if manifest is None:
+            raise FileNotFoundError(f"Model version '{version}' not found")
+        for name, expected in manifest["files"].items():
+            actual = file_sha256(os.path.join(self.version_dir(version), name))
+            if actual != expected:
+                raise ValueError(f"{version}/{name} checksum mismatch")
+
+    def active_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE), "r") as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        return version if version and self.manifest(version) else None
+
+    def set_active(self, version: str):
+        if self.manifest(version) is None:
+            raise FileNotFoundError(f"Model version '{version}' not found")
+        tmp_path = os.path.join(self.root, ACTIVE_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp_path, os.path.join(self.root, ACTIVE_FILE))
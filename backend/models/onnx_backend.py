@@ -0,0 +1,48 @@
+import os
+from typing import Dict
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+class OnnxRiskModel:
+    """
+    onnxruntime (CPU) runner for the calibrated voting ensemble exported by
+    ml-research/export_onnx.py.
+
+    The graph takes the dense feature vector produced by the fitted
+    preprocessor (float32) and returns class probabilities.
+    """
+
+    def __init__(self, model_path: str, intra_op_threads: int = 1):
+        if ort is None:
+            raise ImportError("onnxruntime not installed. Cannot use the ONNX backend.")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX model not found at {model_path}. Run ml-research/export_onnx.py first.")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.n_features = self.session.get_inputs()[0].shape[1]
+        self.metadata: Dict[str, str] = dict(self.session.get_modelmeta().custom_metadata_map)
+
+        # Output named "probabilities" (zipmap disabled at export)
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.proba_output = "probabilities" if "probabilities" in outputs else outputs[-1]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Returns probability of the positive class for each row of X.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        probs = self.session.run([self.proba_output], {self.input_name: X})[0]
+        return probs[:, 1].astype(np.float64)
@@ -1,6 +1,7 @@
 from fpdf import FPDF
 import os
 from datetime import datetime
+from .metrics import timed
 
 class PDFReport(FPDF):
     def header(self):
@@ -20,6 +21,7 @@ class PDFService:
         self.output_dir = os.path.join(os.getcwd(), output_dir)
         os.makedirs(self.output_dir, exist_ok=True)
 
+    @timed("pdf_service", "render")
     def generate_report(self, patient_data: dict, risk_score: float, risk_level: str, llm_summary: str) -> str:
         """
         Generates PDF and returns the absolute file path.
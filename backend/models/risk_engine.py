@@ -1,19 +1,99 @@
 import joblib
+import json
 import os
+import hashlib
+import threading
+import time
 import pandas as pd
 import numpy as np
-import shap
+from .explainability import Explainability
+from .prediction_cache import PredictionCache
+from .fast_transform import CompiledPreprocessor, cut_label
+from .onnx_backend import OnnxRiskModel
+from .metrics import timed, stage_timer
+
+# Binning used by train_pro.py (pd.cut, right-closed)
+AGE_BINS = [0, 30, 45, 60, 100]
+AGE_LABELS = ['Young', 'Middle', 'Senior', 'Elderly']
+BMI_BINS = [0, 18.5, 25, 30, 100]
+BMI_LABELS = ['Underweight', 'Normal', 'Overweight', 'Obese']
+
+def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the engineered columns from train_pro.py to a raw patient frame (in place).
+    """
+    # Interaction: BMI * Age
+    if 'bmi' in df.columns and 'age' in df.columns:
+        df['BMI_Age_Interaction'] = df['bmi'] * df['age']
+
+    # Interaction: Glucose * HbA1c
+    if 'blood_glucose_level' in df.columns and 'HbA1c_level' in df.columns:
+        df['Glucose_HbA1c_Interaction'] = df['blood_glucose_level'] * df['HbA1c_level']
+
+    # Age Categories (risk zones)
+    if 'age' in df.columns:
+        df['Age_Category'] = pd.cut(df['age'], bins=AGE_BINS, labels=AGE_LABELS)
+
+    # BMI Categories (WHO classification)
+    if 'bmi' in df.columns:
+        df['BMI_Category'] = pd.cut(df['bmi'], bins=BMI_BINS, labels=BMI_LABELS)
+
+    return df
 
 class RiskEngine:
-    def __init__(self, model_dir="backend/models"):
+    BACKENDS = ("sklearn", "onnx")
+    # Batches up to this size skip pandas and use the compiled preprocessor row by row
+    FAST_PATH_MAX_ROWS = 64
+
+    def __init__(self, model_dir="backend/models", explainer_mode="tree",
+                 cache_size=1024, cache_ttl=300.0, artifact_check_interval=1.0,
+                 backend="sklearn", onnx_threads=1, mmap_mode=None, explain_tier="exact"):
         self.model_path = os.path.join(model_dir, "risk_pipeline_v1.joblib")
+        self.onnx_path = os.path.join(model_dir, "risk_pipeline_v1.onnx")
         self.bg_path = os.path.join(model_dir, "background_data.joblib")
+        # Present when model_dir is a ModelRegistry version directory
+        self.manifest_path = os.path.join(model_dir, "manifest.json")
+        self.explainer_mode = explainer_mode
+        if explain_tier not in Explainability.TIERS:
+            raise ValueError(f"Unknown explanation tier '{explain_tier}'. Use one of {tuple(Explainability.TIERS)}.")
+        # Default quality tier for explain_risk (fast / standard / exact)
+        self.explain_tier = explain_tier
+        
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Use one of {self.BACKENDS}.")
+        self.backend = backend
+        self.onnx_threads = onnx_threads
+        # "r" maps model arrays read-only so forked workers share them
+        self.mmap_mode = mmap_mode
         
         # Load pipeline
         if not os.path.exists(self.model_path):
             raise FileNotFoundError(f"Model not found at {self.model_path}. Run train_pro.py first.")
-            
-        self.pipeline = joblib.load(self.model_path)
+        
+        # Prediction / explanation cache (keyed by feature hash + model version)
+        self.cache = PredictionCache(max_size=cache_size, ttl_seconds=cache_ttl)
+        self.artifact_check_interval = artifact_check_interval
+        self._artifact_lock = threading.Lock()
+        self._last_artifact_check = time.monotonic()
+        
+        self._load_artifacts()
+
+    def _load_artifacts(self):
+        """
+        Loads the pipeline and the SHAP explainer, and records the model version.
+        """
+        self._artifact_signature = self._read_artifact_signature()
+        manifest = self._read_manifest()
+        if manifest is not None:
+            # Registry versions are immutable: trust the manifest instead of rehashing
+            self.artifact_hash = manifest["files"][os.path.basename(self.model_path)][:12]
+            self.model_version = manifest["version"]
+        else:
+            self.artifact_hash = self._hash_artifact()
+            self.model_version = self.artifact_hash
+        self.pipeline = joblib.load(self.model_path, mmap_mode=self.mmap_mode)
+        self._compile_fast_path()
+        self._load_onnx()
         
         # Initialize SHAP Explainer
         self.explainer = None
@@ -23,99 +103,327 @@ class RiskEngine:
         # Try to load background data for SHAP (optional, not critical)
         if os.path.exists(self.bg_path):
             try:
-                self.background_data = joblib.load(self.bg_path)
+                self.background_data = joblib.load(self.bg_path, mmap_mode=self.mmap_mode)
                 # Store columns for reconstruction
                 self.feature_columns = self.background_data.columns.tolist()
                 
-                # Initialize SHAP KernelExplainer
+                # Initialize SHAP explainer ("tree" = per-member exact SHAP, "kernel" = fallback)
                 print("Initializing SHAP explainer...")
-                self.explainer = shap.KernelExplainer(
-                    self._predict_for_shap, 
-                    self.background_data,
-                    link="identity"  # We're already working with probabilities
-                )
-                print("✅ SHAP explainer initialized successfully.")
+                self.explainer = Explainability(self.pipeline, self.background_data, mode=self.explainer_mode)
+                print(f"✅ SHAP explainer initialized successfully ({self.explainer.mode} mode).")
             except Exception as bg_e:
                 print(f"Warning: Could not initialize SHAP explainer: {bg_e}")
                 self.explainer = None
                 self.background_data = None
 
+    def _compile_fast_path(self):
+        """
+        Compiles the fitted preprocessor into a numpy-only transform for
+        single-row scoring. Falls back to the pandas path if it can't.
+        """
+        self.fast_transform = None
+        self.classifier = self.pipeline.steps[-1][1]
+        try:
+            for name, step in self.pipeline.steps[:-1]:
+                if name != 'preprocessor' and not hasattr(step, 'fit_resample'):
+                    raise TypeError(f"unsupported pipeline step '{name}'")
+            self.fast_transform = CompiledPreprocessor(self.pipeline.named_steps['preprocessor'])
+        except Exception as e:
+            print(f"Warning: Fast inference path disabled: {e}")
 
-    def _preprocess(self, data: dict) -> pd.DataFrame:
+    def _load_onnx(self):
         """
-        Replicates the preprocessing steps from training.
+        Loads the onnxruntime session when backend="onnx".
+        Falls back to sklearn if the ONNX file is missing or was exported from another model version.
         """
-        # Convert single dict to DataFrame
-        df = pd.DataFrame([data])
+        self.onnx_model = None
+        if self.backend != "onnx":
+            return
+        if self.fast_transform is None:
+            print("Warning: ONNX backend needs the compiled preprocessor. Using sklearn.")
+            return
+        try:
+            onnx_model = OnnxRiskModel(self.onnx_path, intra_op_threads=self.onnx_threads)
+        except Exception as e:
+            print(f"Warning: Could not load ONNX backend ({e}). Using sklearn.")
+            return
+
+        source_version = onnx_model.metadata.get("source_version")
+        if source_version != self.artifact_hash:
+            print(f"Warning: ONNX model was exported from version {source_version}, "
+                  f"pipeline is {self.artifact_hash}. Re-run export_onnx.py. Using sklearn.")
+            return
+
+        self.onnx_model = onnx_model
+        print(f"✅ ONNX backend loaded ({self.onnx_threads} intra-op threads).")
+
+    @timed("risk_engine", "predict_proba")
+    def _predict_dense(self, X: np.ndarray) -> np.ndarray:
+        """
+        Scores already-transformed feature rows with the active backend.
+        """
+        if self.onnx_model is not None:
+            return self.onnx_model.predict_proba(X)
+        return self.classifier.predict_proba(X)[:, 1]
+
+    @timed("risk_engine", "predict_proba")
+    def _predict_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Scores engineered feature rows with the active backend.
+        """
+        if self.onnx_model is not None:
+            return self.onnx_model.predict_proba(self.pipeline.named_steps['preprocessor'].transform(df))
+        return self.pipeline.predict_proba(df)[:, 1]
+
+    def _read_artifact_signature(self) -> tuple:
+        stat = os.stat(self.model_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _hash_artifact(self) -> str:
+        digest = hashlib.sha256()
+        with open(self.model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()[:12]
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Ignoring unreadable model manifest: {e}")
+            return None
+
+    def _check_artifact(self):
+        """
+        Reloads the model and flushes the cache if the artifact on disk changed.
+        Checked at most once per artifact_check_interval seconds.
+        """
+        now = time.monotonic()
+        if now - self._last_artifact_check < self.artifact_check_interval:
+            return
+        self._last_artifact_check = now
         
-        # Feature Engineering: BMI * Age (matches train_pro.py)
-        if 'bmi' in df.columns and 'age' in df.columns:
-            df['BMI_Age_Interaction'] = df['bmi'] * df['age']
+        try:
+            signature = self._read_artifact_signature()
+        except OSError:
+            return
+        if signature == self._artifact_signature:
+            return
         
+        with self._artifact_lock:
+            if signature == self._artifact_signature:
+                return
+            print("Model artifact changed on disk. Reloading and flushing cache...")
+            self._load_artifacts()
+            self.cache.clear()
+
+    def _cache_key(self, kind: str, features: dict) -> str:
+        return PredictionCache.make_key(kind, features, self.model_version)
+
+    def cache_stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["model_version"] = self.model_version
+        stats["backend"] = "onnx" if self.onnx_model is not None else "sklearn"
+        return stats
+
+    def _engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds the engineered columns used at training time.
+        Works on any number of rows at once.
+        """
+        df = engineer_features(df)
+
+        # Keep the column order the explainer was built with
+        if self.feature_columns and all(c in df.columns for c in self.feature_columns):
+            df = df[self.feature_columns]
+
         return df
 
-    def _predict_for_shap(self, data):
+    @timed("risk_engine", "feature_engineering")
+    def _engineer_row(self, data: dict) -> dict:
         """
-        Wrapper for SHAP that handles prediction on preprocessed data.
-        Background data is already preprocessed, so we work directly with it.
+        Pandas-free equivalent of _engineer_features for one patient.
         """
-        # Handle different input types
-        if isinstance(data, np.ndarray):
-            # Convert numpy array back to DataFrame using stored column names
-            data = pd.DataFrame(data, columns=self.feature_columns)
-        
-        # Data is already preprocessed (has engineered features)
-        # Just pass it directly to the pipeline
-        probs = self.pipeline.predict_proba(data)
-        
-        # Return probability of positive class (diabetes)
-        return probs[:, 1]
+        row = dict(data)
+        age, bmi = row.get('age'), row.get('bmi')
+        glucose, hba1c = row.get('blood_glucose_level'), row.get('HbA1c_level')
+
+        if bmi is not None and age is not None:
+            row['BMI_Age_Interaction'] = bmi * age
+        if glucose is not None and hba1c is not None:
+            row['Glucose_HbA1c_Interaction'] = glucose * hba1c
+        if age is not None:
+            row['Age_Category'] = cut_label(age, AGE_BINS, AGE_LABELS)
+        if bmi is not None:
+            row['BMI_Category'] = cut_label(bmi, BMI_BINS, BMI_LABELS)
+
+        if self.feature_columns and all(c in row for c in self.feature_columns):
+            row = {c: row[c] for c in self.feature_columns}
+        return row
+
+    def _preprocess(self, data: dict) -> pd.DataFrame:
+        """
+        Replicates the preprocessing steps from training.
+        """
+        return self._preprocess_batch([data])
+
+    @timed("risk_engine", "feature_engineering")
+    def _preprocess_batch(self, patients) -> pd.DataFrame:
+        """
+        Builds one feature matrix for many patients.
+        Accepts a DataFrame, or a list of dicts / PatientRequest objects.
+        """
+        if isinstance(patients, pd.DataFrame):
+            df = patients.reset_index(drop=True).copy()
+        else:
+            rows = [p.dict() if hasattr(p, 'dict') else p for p in patients]
+            df = pd.DataFrame(rows)
+
+        return self._engineer_features(df)
 
     def predict_risk(self, patient_data: dict) -> float:
         """
         Returns probability of diabetes (0.0 to 1.0)
         """
-        df = self._preprocess(patient_data)
+        self._check_artifact()
+        if hasattr(patient_data, 'dict'):
+            patient_data = patient_data.dict()
+        
+        if self.fast_transform is not None:
+            row = self._engineer_row(patient_data)
+        else:
+            df = self._preprocess(patient_data)
+            row = df.iloc[0].to_dict()
+        key = self._cache_key("score", row)
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
         
         try:
-            prob = self.pipeline.predict_proba(df)[0, 1]
-            return float(prob)
+            if self.fast_transform is not None:
+                # Numpy-only path: compiled preprocessor -> calibrated ensemble
+                with stage_timer("risk_engine", "transform"):
+                    X = self.fast_transform.transform_row(row)
+                prob = float(self._predict_dense(X)[0])
+            else:
+                prob = float(self._predict_frame(df)[0])
         except Exception as e:
             print(f"Prediction error: {e}")
             raise
+        
+        self.cache.set(key, prob)
+        return prob
+
+    def predict_risk_batch(self, patients, use_cache: bool = True) -> list:
+        """
+        Returns probability of diabetes for each patient, in input order.
+        Runs feature engineering and predict_proba once over the whole matrix;
+        rows already in the cache are not rescored. use_cache=False scores
+        every row and stores nothing, for one-off candidate matrices
+        (counterfactual search, sensitivity grids) that would only evict
+        real patients from the cache.
+        """
+        self._check_artifact()
+        if not use_cache:
+            df = self._preprocess_batch(patients)
+            return self._predict_frame(df).astype(float).tolist() if not df.empty else []
+        if (self.fast_transform is not None and not isinstance(patients, pd.DataFrame)
+                and len(patients) <= self.FAST_PATH_MAX_ROWS):
+            return self._predict_rows(patients)
+
+        df = self._preprocess_batch(patients)
+        if df.empty:
+            return []
+
+        keys = [self._cache_key("score", row) for row in df.to_dict("records")]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
+            try:
+                probs = self._predict_frame(df.iloc[missing])
+            except Exception as e:
+                print(f"Batch prediction error: {e}")
+                raise
+
+            for i, prob in zip(missing, probs.astype(float).tolist()):
+                scores[i] = prob
+                self.cache.set(keys[i], prob)
+
+        return scores
+
+    def score_batch(self, patients, use_cache: bool = True) -> tuple:
+        """
+        predict_risk_batch plus the model version that produced the scores.
+        """
+        scores = self.predict_risk_batch(patients, use_cache)
+        return scores, self.model_version
 
-    def explain_risk(self, patient_data: dict) -> list:
+    def _predict_rows(self, patients) -> list:
+        """
+        Small-batch variant of predict_risk_batch on the numpy fast path.
+        """
+        rows = [self._engineer_row(p.dict() if hasattr(p, 'dict') else p) for p in patients]
+        if not rows:
+            return []
+
+        keys = [self._cache_key("score", row) for row in rows]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
+            with stage_timer("risk_engine", "transform"):
+                X = np.vstack([self.fast_transform.transform_row(rows[i]) for i in missing])
+            try:
+                probs = self._predict_dense(X)
+            except Exception as e:
+                print(f"Batch prediction error: {e}")
+                raise
+
+            for i, prob in zip(missing, probs.astype(float).tolist()):
+                scores[i] = prob
+                self.cache.set(keys[i], prob)
+
+        return scores
+
+    def explain_risk(self, patient_data: dict, tier: str = None, budget_ms: float = None) -> list:
         """
         Returns list of feature contributions.
         """
+        return self.explain_risk_detailed(patient_data, tier, budget_ms)["explanations"]
+
+    def explain_risk_detailed(self, patient_data: dict, tier: str = None, budget_ms: float = None) -> dict:
+        """
+        Feature contributions at a quality tier (fast / standard / exact),
+        optionally capped by a latency budget in ms, plus how they were
+        computed: folds used, stop reason, elapsed ms and additivity error.
+        """
+        self._check_artifact()
         if not self.explainer:
-            return []
-            
+            return {"explanations": [], "tier": None, "additivity_error": None}
+
+        tier = tier or self.explain_tier
+        if tier not in Explainability.TIERS:
+            raise ValueError(f"Unknown explanation tier '{tier}'. Use one of {tuple(Explainability.TIERS)}.")
+
         df = self._preprocess(patient_data)
-        
-        # SHAP values for binary classification (nsamples, nfeatures)
-        shap_values = self.explainer.shap_values(df)
-        
-        # Handle different SHAP output formats
-        if isinstance(shap_values, list):
-            # List of arrays [class0_matrix, class1_matrix]
-            # Take class 1, sample 0
-            risk_shap = shap_values[1][0]
-        elif isinstance(shap_values, np.ndarray) and len(shap_values.shape) == 3:
-            # 3D Array (samples, features, classes)
-            # Take sample 0, all features, class 1
-            risk_shap = shap_values[0, :, 1]
-        elif isinstance(shap_values, np.ndarray) and len(shap_values.shape) == 2:
-            # 2D Array (samples, features) - KernelExplainer output
-            # Take sample 0, all features
-            risk_shap = shap_values[0]
-        elif isinstance(shap_values, np.ndarray) and len(shap_values.shape) == 1:
-            # 1D Array (features) - single sample
-            risk_shap = shap_values
-        else:
-            # Unexpected format, fallback to printing shape and returning empty
-            print(f"Unexpected SHAP output format: {type(shap_values)}, shape: {shap_values.shape if hasattr(shap_values, 'shape') else 'N/A'}")
-            return []
+        row = df.iloc[0].to_dict()
+
+        # A cached exact explanation answers any tier
+        for cached_tier in dict.fromkeys(("exact", tier)):
+            cached = self.cache.get(self._cache_key(f"explain-{self.explainer.mode}-{cached_tier}", row))
+            if cached is not None:
+                return dict(cached, explanations=[dict(e) for e in cached["explanations"]])
+
+        # Additivity is checked against the served (usually cached) score
+        prediction = self.predict_risk(patient_data)
+        with stage_timer("risk_engine", "shap"):
+            values, info = self.explainer.explain(df, tier=tier, budget_ms=budget_ms, prediction=[prediction])
+        risk_shap = values[0]
         
         explanations = []
         feature_names = df.columns
@@ -133,4 +441,10 @@ class RiskEngine:
             
         # Sort by absolute impact
         explanations.sort(key=lambda x: abs(x['impact_score']), reverse=True)
-        return explanations
+        result = {"explanations": explanations, **info}
+
+        # Budget-truncated results depend on load at the time: don't cache them
+        if info["stop_reason"] != "budget":
+            key = self._cache_key(f"explain-{self.explainer.mode}-{tier}", row)
+            self.cache.set(key, dict(result, explanations=[dict(e) for e in explanations]))
+        return result
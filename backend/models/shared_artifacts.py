@@ -0,0 +1,108 @@
+import gc
+import json
+import os
+import resource
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Set by backend/gunicorn_conf.py (or the environment) to load artifacts
+# memory-mapped so forked workers share their pages.
+SHARED_ARTIFACTS_ENV = "SHARED_ARTIFACTS"
+COLUMN_BLOCKS_MANIFEST = "columns.json"
+
+
+def shared_artifacts_enabled() -> bool:
+    return os.environ.get(SHARED_ARTIFACTS_ENV, "0") == "1"
+
+
+def artifact_mmap_mode():
+    """
+    mmap_mode for joblib.load / np.load: read-only maps in shared mode, else None.
+    Artifacts loaded this way must be replaced by rename (os.replace), never
+    rewritten in place, while workers are running.
+    """
+    return "r" if shared_artifacts_enabled() else None
+
+
+def write_column_blocks(df: pd.DataFrame, directory: str, source_mtime: float = None):
+    """
+    Stores a DataFrame as one .npy block per column so it can be memory-mapped.
+    String columns are stored as int codes plus a category list.
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series):
+            np.save(os.path.join(directory, f"{col}.npy"), np.ascontiguousarray(series.to_numpy()))
+            columns.append({"name": col, "kind": "numeric"})
+        else:
+            cat = pd.Categorical(series)
+            np.save(os.path.join(directory, f"{col}.npy"), cat.codes)
+            columns.append({"name": col, "kind": "categorical", "categories": [str(c) for c in cat.categories]})
+
+    manifest = {"rows": len(df), "columns": columns, "source_mtime": source_mtime}
+    tmp_path = os.path.join(directory, COLUMN_BLOCKS_MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, COLUMN_BLOCKS_MANIFEST))
+
+
+def read_column_blocks_manifest(directory: str):
+    try:
+        with open(os.path.join(directory, COLUMN_BLOCKS_MANIFEST), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def read_column_blocks(directory: str, mmap_mode="r") -> pd.DataFrame:
+    """
+    Loads blocks written by write_column_blocks without copying numeric columns.
+    """
+    manifest = read_column_blocks_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No column blocks found in {directory}")
+
+    data = {}
+    for col in manifest["columns"]:
+        values = np.load(os.path.join(directory, f"{col['name']}.npy"), mmap_mode=mmap_mode)
+        if col["kind"] == "categorical":
+            values = pd.Categorical.from_codes(values, categories=col["categories"])
+        data[col["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def freeze_for_fork():
+    """
+    Call in the master after loading everything and before forking workers.
+    gc.freeze() moves live objects out of the collector so collections in
+    the workers don't write to (and un-share) their pages.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def memory_usage() -> Dict[str, float]:
+    """
+    Resident / proportional / private memory of this process in MB.
+    PSS splits shared pages between the processes mapping them, so summing
+    PSS across workers gives the real footprint.
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        # Non-Linux: only peak RSS is available
+        usage["Rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    if "Private_Clean" in usage:
+        usage["Private"] = usage.pop("Private_Clean") + usage.pop("Private_Dirty")
+        usage["Shared"] = usage.pop("Shared_Clean") + usage.pop("Shared_Dirty")
+    return {k: round(v, 1) for k, v in usage.items()}
@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .metrics import timed
+
+
+class SimulationSession:
+    """
+    One patient's what-if state: the validated patient dict plus the
+    baseline risk and explanation, computed once when the session starts.
+    """
+
+    def __init__(self, session_id: str, patient: Dict[str, Any]):
+        self.session_id = session_id
+        self.patient = patient
+        self.original_risk = None
+        self.explanations = None
+        self.model_version = None
+        self.created_at = time.time()
+        self.last_access = time.monotonic()
+        self.simulations = 0
+        self.size_bytes = 0
+
+    def summary(self, ttl_seconds: float) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "patient": self.patient,
+            "original_risk": self.original_risk,
+            "explanations": self.explanations,
+            "model_version": self.model_version,
+            "simulations": self.simulations,
+            "expires_in": round(max(0.0, ttl_seconds - (time.monotonic() - self.last_access)), 1),
+        }
+
+
+class SimulationSessionManager:
+    """
+    Interactive what-if sessions for /simulate/sessions.
+
+    create() scores and explains the patient once; simulate() then scores
+    only the modified patient and returns deltas against the stored
+    baseline, so slider moves no longer pay for the baseline each time.
+    If the model is hot-swapped, a session's baseline is recomputed on its
+    next use so deltas never mix versions.
+
+    Sessions expire after ttl_seconds without use. The store is an LRU
+    capped by count (max_sessions) and by approximate memory (max_memory_mb,
+    measured as the JSON size of each session); the least recently used
+    sessions are evicted first.
+    """
+
+    def __init__(self, risk_engine, ttl_seconds: float = 900.0, max_sessions: int = 10_000,
+                 max_memory_mb: float = 64.0, explain: bool = True):
+        self.risk_engine = risk_engine
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.explain = explain
+        self._sessions: "OrderedDict[str, SimulationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_bytes = 0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _baseline(self, session: SimulationSession):
+        scores, session.model_version = self.risk_engine.score_batch([session.patient])
+        session.original_risk = scores[0]
+        if self.explain and getattr(self.risk_engine, "explainer", None) is not None:
+            session.explanations = self.risk_engine.explain_risk(session.patient)
+        session.size_bytes = len(json.dumps(session.summary(self.ttl_seconds), default=str))
+
+    def _rebase(self, session: SimulationSession):
+        """
+        Recomputes the baseline after a model swap, keeping the memory total in step.
+        """
+        old_size = session.size_bytes
+        self._baseline(session)
+        with self._lock:
+            if self._sessions.get(session.session_id) is session:
+                self._memory_bytes += session.size_bytes - old_size
+
+    @timed("simulation_sessions", "create")
+    def create(self, patient: Dict[str, Any]) -> Dict[str, Any]:
+        session = SimulationSession(uuid.uuid4().hex, dict(patient))
+        self._baseline(session)
+        with self._lock:
+            self._purge_expired()
+            self._sessions[session.session_id] = session
+            self._memory_bytes += session.size_bytes
+            self.created += 1
+            self._enforce_limits()
+        return session.summary(self.ttl_seconds)
+
+    def get(self, session_id: str) -> Optional[SimulationSession]:
+        """
+        Returns the live session (refreshing its TTL), or None.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.monotonic() - session.last_access > self.ttl_seconds:
+                self._remove(session_id)
+                self.expired += 1
+                return None
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.get(session_id)
+        return session.summary(self.ttl_seconds) if session else None
+
+    @timed("simulation_sessions", "simulate")
+    def simulate(self, session_id: str, modifications: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Scores the session's patient with modifications applied. Returns the
+        new risk, the delta against the baseline and the changed features
+        (from / to), or None if the session is unknown or expired.
+        Raises ValueError for modifications of fields the patient doesn't have.
+        """
+        session = self.get(session_id)
+        if session is None:
+            return None
+        unknown = set(modifications) - set(session.patient)
+        if unknown:
+            raise ValueError(f"Unknown features: {sorted(unknown)}")
+
+        if session.model_version != getattr(self.risk_engine, "model_version", session.model_version):
+            self._rebase(session)
+
+        changes = {name: {"from": session.patient[name], "to": value}
+                   for name, value in modifications.items() if value != session.patient[name]}
+        if changes:
+            modified = dict(session.patient, **modifications)
+            scores, model_version = self.risk_engine.score_batch([modified])
+            new_risk = scores[0]
+            if model_version != session.model_version:
+                # Swapped between the checks above: rebase so the delta is one version
+                self._rebase(session)
+        else:
+            new_risk, model_version = session.original_risk, session.model_version
+        session.simulations += 1
+
+        return {
+            "session_id": session_id,
+            "original_risk": session.original_risk,
+            "new_risk": new_risk,
+            "risk_reduction": session.original_risk - new_risk,
+            "changes": changes,
+            "model_version": model_version,
+        }
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id)
+
+    def _remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._memory_bytes -= session.size_bytes
+        return True
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        # Oldest access first: stop at the first live session
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            self._remove(session_id)
+            self.expired += 1
+
+    def _enforce_limits(self):
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self._memory_bytes > self.max_memory_bytes):
+            self._remove(next(iter(self._sessions)))
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge_expired()
+            return {
+                "active": len(self._sessions),
+                "memory_mb": round(self._memory_bytes / (1024 * 1024), 3),
+                "max_sessions": self.max_sessions,
+                "max_memory_mb": round(self.max_memory_bytes / (1024 * 1024), 3),
+                "ttl_seconds": self.ttl_seconds,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,291 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.stats import multivariate_normal, norm
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Strata: the categorical mix plus the label, which drives most of the lab-value structure
+STRATA_COLS = ["gender", "smoking_history", "diabetes"]
+NUMERIC_COLS = ["age", "hypertension", "heart_disease", "bmi", "HbA1c_level", "blood_glucose_level"]
+COLUMN_ORDER = ["gender", "age", "hypertension", "heart_disease", "smoking_history",
+                "bmi", "HbA1c_level", "blood_glucose_level", "diabetes"]
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def _fit_marginal(values: np.ndarray, max_levels: int, quantiles: int) -> Dict[str, Any]:
+    """
+    Inverse-CDF description of one column: the exact support and cumulative
+    probabilities for discrete columns, an interpolated quantile grid otherwise.
+    """
+    levels, counts = np.unique(values, return_counts=True)
+    if len(levels) <= max_levels:
+        return {"kind": "discrete", "levels": levels.tolist(),
+                "cdf": (np.cumsum(counts) / counts.sum()).tolist()}
+    grid = np.linspace(0.0, 1.0, quantiles)
+    return {"kind": "quantiles", "values": np.quantile(values, grid).tolist()}
+
+
+def _inverse_cdf(marginal: Dict[str, Any], u: np.ndarray) -> np.ndarray:
+    if marginal["kind"] == "discrete":
+        cdf = np.asarray(marginal["cdf"])
+        idx = np.minimum(np.searchsorted(cdf, u, side="right"), len(cdf) - 1)
+        return np.asarray(marginal["levels"])[idx]
+    values = np.asarray(marginal["values"])
+    return np.interp(u, np.linspace(0.0, 1.0, len(values)), values)
+
+
+def _normal_scores(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # Ties (binaries, repeated lab values) are broken at random: the
+    # distributional transform, which keeps correlations with discrete
+    # columns from being attenuated
+    ranks = np.empty(len(values))
+    ranks[np.lexsort((rng.random(len(values)), values))] = np.arange(1, len(values) + 1)
+    return norm.ppf(ranks / (len(values) + 1))
+
+
+def _tetrachoric(x: np.ndarray, y: np.ndarray) -> float:
+    """
+    Latent normal correlation of two binary columns (bisection on the
+    bivariate normal probability of both being 0).
+    """
+    px, py = x.mean(), y.mean()
+    if min(px, py) == 0.0 or max(px, py) == 1.0:
+        return 0.0
+    target = np.mean((x == 0) & (y == 0))
+    tx, ty = norm.ppf(1 - px), norm.ppf(1 - py)
+    lo, hi = -0.999, 0.999
+    for _ in range(30):
+        mid = (lo + hi) / 2
+        joint = multivariate_normal.cdf([tx, ty], cov=[[1.0, mid], [mid, 1.0]])
+        lo, hi = (mid, hi) if joint < target else (lo, mid)
+    return (lo + hi) / 2
+
+
+def _polyserial(scores: np.ndarray, y: np.ndarray) -> float:
+    """
+    Latent normal correlation between normal scores and a binary column
+    (point-biserial correlation rescaled by the threshold density).
+    """
+    p = y.mean()
+    if p in (0.0, 1.0):
+        return 0.0
+    return np.corrcoef(scores, y)[0, 1] * np.sqrt(p * (1 - p)) / norm.pdf(norm.ppf(p))
+
+
+def _fit_copula(df: pd.DataFrame, rng: np.random.Generator) -> List[List[float]]:
+    """
+    Correlation matrix of the latent Gaussian copula. Binary columns use
+    tetrachoric / polyserial estimates; a plain correlation of 0/1 values
+    would understate how strongly they move with age or BMI.
+    """
+    columns = [df[col].to_numpy() for col in NUMERIC_COLS]
+    binary = [np.isin(values, (0, 1)).all() for values in columns]
+    scores = [values if is_binary else _normal_scores(values, rng) for values, is_binary in zip(columns, binary)]
+
+    k = len(NUMERIC_COLS)
+    corr = np.eye(k)
+    for i in range(k):
+        for j in range(i + 1, k):
+            if binary[i] and binary[j]:
+                r = _tetrachoric(scores[i], scores[j])
+            elif binary[i] or binary[j]:
+                r = _polyserial(scores[j], scores[i]) if binary[i] else _polyserial(scores[i], scores[j])
+            else:
+                r = np.corrcoef(scores[i], scores[j])[0, 1]
+            corr[i, j] = corr[j, i] = np.clip(np.nan_to_num(r), -0.999, 0.999)  # nan: constant column
+    # Nearest positive definite matrix (clip eigenvalues) so Cholesky always works
+    eigvals, eigvecs = np.linalg.eigh(corr)
+    corr = eigvecs @ np.diag(np.clip(eigvals, 1e-6, None)) @ eigvecs.T
+    d = np.sqrt(np.diag(corr))
+    return (corr / np.outer(d, d)).tolist()
+
+
+def _generate_chunk(params: Dict[str, Any], size: int, seed: int, index: int, fmt: str):
+    """
+    Worker entry point: one chunk, already encoded for text formats so the
+    formatting work is spread over the pool too.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    df = SyntheticPatientGenerator(params).sample(size, rng)
+    if fmt == "csv":
+        return df.to_csv(index=False, header=index == 0).encode()
+    if fmt == "jsonl":
+        return df.to_json(orient="records", lines=True).rstrip("\n").encode() + b"\n"
+    return df
+
+
+class SyntheticPatientGenerator:
+    """
+    Synthetic patients drawn from a model fitted to the real dataset.
+
+    The (gender, smoking_history, diabetes) mix is sampled from its observed
+    joint frequencies. Within each stratum, the numeric columns (including
+    the hypertension / heart_disease flags) come from a Gaussian copula: the
+    correlation of their normal scores is fitted per stratum, and each column
+    is mapped back through its empirical marginal, so HbA1c / glucose / BMI
+    keep both their observed values and their correlation. Strata with fewer
+    than min_stratum_rows rows borrow the copula and marginals of all rows
+    with the same diabetes label.
+
+    Parameters are plain JSON (save / load), so a fitted model can be shipped
+    with a benchmark instead of the 100k-row dataset.
+    """
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self._strata = params["strata"]
+        self._probs = np.array([s["weight"] for s in self._strata])
+        self._probs /= self._probs.sum()
+        self._chol = [np.linalg.cholesky(np.asarray(s["corr"])) for s in self._strata]
+
+    @classmethod
+    def fit(cls, data_path: str = "data/diabetes_dataset.csv", min_stratum_rows: int = 500,
+            max_levels: int = 256, quantiles: int = 513, seed: int = 0) -> "SyntheticPatientGenerator":
+        df = pd.read_csv(data_path)
+        rng = np.random.default_rng(seed)
+        decimals = {col: cls._decimals(df[col]) for col in NUMERIC_COLS}
+        fallback = {label: df[df["diabetes"] == label] for label in df["diabetes"].unique()}
+        fallback_corr = {label: _fit_copula(rows, rng) for label, rows in fallback.items()}
+
+        strata = []
+        for (gender, smoking, label), group in df.groupby(STRATA_COLS, sort=True):
+            small = len(group) < min_stratum_rows
+            # Sparse strata also borrow the marginals, so a handful of real
+            # rows is never replayed verbatim
+            source = fallback[label] if small else group
+            strata.append({
+                "gender": gender,
+                "smoking_history": smoking,
+                "diabetes": int(label),
+                "weight": len(group) / len(df),
+                "rows": len(group),
+                "corr": fallback_corr[label] if small else _fit_copula(group, rng),
+                "marginals": {col: _fit_marginal(source[col].to_numpy(), max_levels, quantiles)
+                              for col in NUMERIC_COLS},
+            })
+        return cls({"source": os.path.basename(data_path), "rows": len(df), "decimals": decimals,
+                    "strata": strata})
+
+    @staticmethod
+    def _decimals(series: pd.Series) -> int:
+        if pd.api.types.is_integer_dtype(series):
+            return 0
+        for places in range(6):
+            if np.allclose(series, series.round(places)):
+                return places
+        return 6
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.params, f)
+
+    @classmethod
+    def load(cls, path: str) -> "SyntheticPatientGenerator":
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def sample(self, n: int, rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
+        """
+        Returns n synthetic patients in the dataset's column order.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        counts = rng.multinomial(n, self._probs)
+        frames = []
+        for stratum, chol, count in zip(self._strata, self._chol, counts):
+            if count == 0:
+                continue
+            z = rng.standard_normal((count, len(NUMERIC_COLS))) @ chol.T
+            u = norm.cdf(z)
+            block = {"gender": np.full(count, stratum["gender"], dtype=object),
+                     "smoking_history": np.full(count, stratum["smoking_history"], dtype=object),
+                     "diabetes": np.full(count, stratum["diabetes"], dtype=np.int64)}
+            for j, col in enumerate(NUMERIC_COLS):
+                values = _inverse_cdf(stratum["marginals"][col], u[:, j])
+                places = self.params["decimals"][col]
+                block[col] = values.round().astype(np.int64) if places == 0 else values.round(places)
+            frames.append(pd.DataFrame(block))
+
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMN_ORDER)
+        # Strata were generated in blocks: shuffle so chunks look like real traffic
+        return df.iloc[rng.permutation(len(df))].reset_index(drop=True)[COLUMN_ORDER]
+
+    def patients(self, n: int, seed: int = 42) -> List[Dict[str, Any]]:
+        """
+        n synthetic patients as request-ready dicts (no diabetes label).
+        """
+        df = self.sample(n, np.random.default_rng(seed))
+        return df.drop(columns=["diabetes"]).to_dict("records")
+
+    def iter_chunks(self, n: int, chunk_size: int = 100_000, seed: int = 42,
+                    workers: int = 1, fmt: str = "frame") -> Iterator[Any]:
+        """
+        Yields n patients in chunks of chunk_size, in order.
+
+        Chunk i is drawn from its own seed (SeedSequence(seed, spawn_key=(i,))),
+        so the output is identical for any number of workers. With workers > 1
+        chunks are generated in a process pool with at most 2 * workers chunks
+        in flight, which bounds memory regardless of n.
+        """
+        sizes = [chunk_size] * (n // chunk_size) + ([n % chunk_size] if n % chunk_size else [])
+        if workers <= 1:
+            for index, size in enumerate(sizes):
+                yield _generate_chunk(self.params, size, seed, index, fmt)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for index, size in enumerate(sizes):
+                pending.append(pool.submit(_generate_chunk, self.params, size, seed, index, fmt))
+                if len(pending) >= 2 * workers:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def write(self, path: str, n: int, fmt: Optional[str] = None, chunk_size: int = 100_000,
+              seed: int = 42, workers: int = 1,
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Streams n patients to path as CSV, JSONL or Parquet (format from the
+        extension unless given). Parquet needs pyarrow; each chunk becomes a
+        row group.
+        """
+        fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'. Choose from {FORMATS}")
+        if fmt == "parquet" and pa is None:
+            raise ImportError("pyarrow not installed. Cannot write Parquet.")
+
+        tmp_path = path + ".part"
+        written, writer = 0, None
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in self.iter_chunks(n, chunk_size, seed, workers, fmt):
+                    if fmt == "parquet":
+                        table = pa.Table.from_pandas(chunk, preserve_index=False)
+                        if writer is None:
+                            writer = pq.ParquetWriter(f, table.schema)
+                        writer.write_table(table)
+                        written += len(chunk)
+                    else:
+                        f.write(chunk)
+                        written = min(n, written + chunk_size)
+                    if progress:
+                        progress(written, n)
+                if writer is not None:
+                    writer.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {"path": path, "format": fmt, "rows": written, "bytes": os.path.getsize(path)}
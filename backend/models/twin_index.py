@@ -0,0 +1,305 @@
+"""
+Neighbour indexes behind CohortEngine.find_digital_twins.
+
+Both index types work on the scaled feature matrix and share one interface:
+fit(X), search(Q, k) -> (distances, row ids), add(X) -> new row ids, plus
+save(directory) / load(directory) for the persistent kind.
+
+- ExactIndex wraps sklearn's NearestNeighbors: exact, refit at every start.
+- IVFIndex is an inverted-file index: k-means centroids partition the rows,
+  which are stored grouped by partition, and a query only scans the nprobe
+  partitions whose centroids are closest. It is built once (offline, see
+  `python -m backend.models.twin_index`), saved as .npy blocks and loaded
+  memory-mapped, so large registries neither refit nor copy at startup.
+
+Build offline (from the repo root):
+    python -m backend.models.twin_index --out data/cohort_index
+    python -m backend.models.twin_index --data registry.csv --out data/registry_index --nlist 4096
+"""
+import argparse
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import KDTree, NearestNeighbors
+
+INDEX_MANIFEST = "index.json"
+INDEX_FORMAT_VERSION = 1
+# Queries ranked together in one padded candidate matrix
+QUERY_BLOCK = 256
+
+
+class ExactIndex:
+    kind = "exact"
+    persistent = False
+
+    def __init__(self, nn_model: Optional[NearestNeighbors] = None, X: Optional[np.ndarray] = None):
+        # Pass X with an already fitted nn_model (e.g. one loaded from a snapshot)
+        self.nn_model = nn_model if nn_model is not None else NearestNeighbors(n_neighbors=5)
+        self._X = X
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._X) if self._X is not None else 0
+
+    def fit(self, X: np.ndarray) -> "ExactIndex":
+        self.nn_model.fit(X)
+        self._X = X
+        return self
+
+    def search(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.nn_model.kneighbors(Q, n_neighbors=min(k, self.ntotal))
+
+    def add(self, X: np.ndarray) -> np.ndarray:
+        """
+        Exact search has no incremental structure: refits on all rows.
+        """
+        ids = np.arange(self.ntotal, self.ntotal + len(X))
+        self.fit(np.vstack([self._X, X]))
+        return ids
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF-flat) approximate nearest-neighbour index.
+
+    Rows are stored float32, sorted by partition; offsets[l]:offsets[l + 1]
+    is partition l. add() assigns new rows to their nearest centroid and
+    keeps them in a small in-memory tail that every search scans in full;
+    save() merges the tail into the stored partitions. nprobe trades
+    recall for latency; queries whose probed partitions hold fewer than k
+    rows are retried with more partitions.
+    """
+    kind = "ivf"
+    persistent = True
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self.vectors = None
+        self.ids = None
+        self.offsets = None
+        self.meta = {}
+        self._centroid_tree = None
+        self._clear_tail()
+
+    def _clear_tail(self):
+        dim = self.centroids.shape[1] if self.centroids is not None else 0
+        self._tail_vectors = np.zeros((0, dim), dtype=np.float32)
+        self._tail_ids = np.zeros(0, dtype=np.int64)
+        self._tail_lists = np.zeros(0, dtype=np.int64)
+
+    @property
+    def ntotal(self) -> int:
+        return (len(self.ids) if self.ids is not None else 0) + len(self._tail_ids)
+
+    def _nearest_centroids(self, X: np.ndarray, n: int = 1) -> np.ndarray:
+        # Centroids are few and low-dimensional: a KD-tree over them beats a distance matrix
+        if self._centroid_tree is None:
+            self._centroid_tree = KDTree(self.centroids)
+        return self._centroid_tree.query(np.asarray(X, dtype=np.float64), k=n, return_distance=False)
+
+    def _assign(self, X: np.ndarray) -> np.ndarray:
+        return self._nearest_centroids(X)[:, 0].astype(np.int64)
+
+    @staticmethod
+    def _median_splits(X: np.ndarray, nlist: int) -> np.ndarray:
+        """
+        Means of balanced cells from recursive median splits along the widest
+        dimension: a cheap, deterministic k-means start.
+        """
+        max_size = int(np.ceil(len(X) / nlist))
+        pending, cells = [np.arange(len(X))], []
+        while pending:
+            idx = pending.pop()
+            if len(idx) <= max_size:
+                cells.append(idx)
+                continue
+            values = X[idx]
+            dim = np.argmax(values.max(axis=0) - values.min(axis=0))
+            half = len(idx) // 2
+            order = np.argpartition(values[:, dim], half)
+            pending += [idx[order[:half]], idx[order[half:]]]
+        return np.array([X[idx].mean(axis=0) for idx in cells], dtype=np.float32)
+
+    def _store(self, vectors: np.ndarray, ids: np.ndarray, lists: np.ndarray):
+        order = np.argsort(lists, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order], dtype=np.float32)
+        self.ids = np.ascontiguousarray(ids[order], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(self.centroids)))])
+
+    def fit(self, X: np.ndarray, train_size: int = 64, iterations: int = 10) -> "IVFIndex":
+        """
+        Trains the partition centroids with k-means on a sample (train_size
+        rows per partition), started from balanced median splits, then
+        stores every row in its nearest partition. nlist defaults to
+        4 * sqrt(n); the splits round it up to a power of two.
+        """
+        n = len(X)
+        nlist = min(self.nlist or int(np.clip(4 * np.sqrt(n), 1, 65536)), n)
+        rng = np.random.default_rng(self.seed)
+        sample = np.asarray(X[np.sort(rng.choice(n, min(n, train_size * nlist), replace=False))], dtype=np.float64)
+        self.centroids = self._median_splits(sample, nlist)
+        for _ in range(iterations):
+            self._centroid_tree = None
+            lists = self._assign(sample)
+            counts = np.bincount(lists, minlength=len(self.centroids))
+            sums = np.stack([np.bincount(lists, weights=sample[:, j], minlength=len(self.centroids))
+                             for j in range(sample.shape[1])], axis=1)
+            # Empty partitions keep their centroid
+            filled = counts > 0
+            self.centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+        self._centroid_tree = None
+        self.nlist = len(self.centroids)
+        self._clear_tail()
+        self._store(np.asarray(X, dtype=np.float32), np.arange(n, dtype=np.int64), self._assign(X))
+        return self
+
+    def add(self, X: np.ndarray) -> np.ndarray:
+        """
+        Inserts rows without retraining; returns their row ids (appended after existing ones).
+        """
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        ids = np.arange(self.ntotal, self.ntotal + len(X), dtype=np.int64)
+        self._tail_vectors = np.vstack([self._tail_vectors, X])
+        self._tail_ids = np.concatenate([self._tail_ids, ids])
+        self._tail_lists = np.concatenate([self._tail_lists, self._assign(X)])
+        return ids
+
+    def search(self, Q: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (distances, row ids), both (len(Q), k), nearest first.
+        Queries are answered in blocks: the candidates of every query in a
+        block are laid out in one padded matrix and ranked with one argpartition.
+        """
+        Q = np.asarray(Q, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        k = min(k, self.ntotal)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        distances = np.empty((len(Q), k), dtype=np.float64)
+        indices = np.empty((len(Q), k), dtype=np.int64)
+        for start in range(0, len(Q), QUERY_BLOCK):
+            block = slice(start, start + QUERY_BLOCK)
+            distances[block], indices[block] = self._search_block(Q[block], k, nprobe)
+        return distances, indices
+
+    def _search_block(self, Q: np.ndarray, k: int, nprobe: int):
+        m = len(Q)
+        probe = self._nearest_centroids(Q, nprobe)
+
+        # Rows of every probed partition, flattened, then scattered into one row per query
+        seg_starts = self.offsets[probe].ravel()
+        seg_lens = (self.offsets[probe + 1] - self.offsets[probe]).ravel()
+        counts = seg_lens.reshape(m, nprobe).sum(axis=1)
+        total = int(counts.sum())
+        rows = np.repeat(seg_starts - (np.cumsum(seg_lens) - seg_lens), seg_lens) + np.arange(total)
+        query = np.repeat(np.arange(m), counts)
+        column = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        width = int(counts.max())
+        d = np.full((m, width + len(self._tail_ids)), np.inf, dtype=np.float32)
+        ids = np.zeros(d.shape, dtype=np.int64)
+        d[query, column] = ((np.asarray(self.vectors[rows]) - Q[query]) ** 2).sum(axis=1)
+        ids[query, column] = self.ids[rows]
+        if len(self._tail_ids):
+            # Inserted rows are few: scan them all
+            d[:, width:] = ((Q[:, None, :] - self._tail_vectors[None, :, :]) ** 2).sum(axis=2)
+            ids[:, width:] = self._tail_ids
+
+        top = np.argpartition(d, k - 1, axis=1)[:, :k] if d.shape[1] > k else np.tile(np.arange(k), (m, 1))
+        top = np.take_along_axis(top, np.argsort(np.take_along_axis(d, top, axis=1), axis=1, kind="stable"), axis=1)
+        distances = np.sqrt(np.take_along_axis(d, top, axis=1).astype(np.float64))
+        indices = np.take_along_axis(ids, top, axis=1)
+
+        # Probed partitions held fewer than k rows: widen for those queries
+        short = np.flatnonzero(counts + len(self._tail_ids) < k)
+        if len(short):
+            distances[short], indices[short] = self._search_block(Q[short], k, min(nprobe * 2, len(self.centroids)))
+        return distances, indices
+
+    def save(self, directory: str, **meta):
+        """
+        Writes the index (tail merged in) as .npy blocks plus a manifest.
+        Files are replaced by rename, so processes mapping the old files keep working.
+        """
+        if len(self._tail_ids):
+            lists = np.concatenate([np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets)), self._tail_lists])
+            self._store(np.vstack([self.vectors, self._tail_vectors]),
+                        np.concatenate([self.ids, self._tail_ids]), lists)
+            self._clear_tail()
+
+        os.makedirs(directory, exist_ok=True)
+        for name in ("centroids", "vectors", "ids", "offsets"):
+            tmp_path = os.path.join(directory, f"{name}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+
+        self.meta = {**self.meta, **meta}
+        manifest = {"kind": self.kind, "format_version": INDEX_FORMAT_VERSION, "rows": self.ntotal,
+                    "dim": int(self.centroids.shape[1]), "nlist": int(len(self.centroids)),
+                    "nprobe": self.nprobe, "meta": self.meta}
+        tmp_path = os.path.join(directory, INDEX_MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, INDEX_MANIFEST))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "IVFIndex":
+        """
+        Maps a saved index; raises FileNotFoundError if there is none and
+        ValueError if it was written by another index type or format version.
+        """
+        manifest = read_index_manifest(directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No twin index found in {directory}")
+        if manifest.get("kind") != cls.kind or manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported twin index in {directory}: {manifest.get('kind')} "
+                             f"v{manifest.get('format_version')}")
+
+        index = cls(nlist=manifest["nlist"], nprobe=manifest["nprobe"])
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode=mmap_mode)
+        index.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode=mmap_mode)
+        # Small and read on every query: kept in memory
+        index.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        index.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        index.meta = manifest.get("meta", {})
+        index._clear_tail()
+        return index
+
+
+INDEX_TYPES = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def read_index_manifest(directory: str):
+    try:
+        with open(os.path.join(directory, INDEX_MANIFEST), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the persisted digital-twin (IVF) index")
+    parser.add_argument("--data", default="data/diabetes_dataset.csv", help="Cohort CSV, relative to the repo root")
+    parser.add_argument("--out", default="data/cohort_index", help="Index directory")
+    parser.add_argument("--nlist", type=int, default=None, help="Partitions (default 4 * sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, default=8, help="Partitions scanned per query")
+    args = parser.parse_args()
+
+    from .cohort_engine import CohortEngine
+
+    started = time.perf_counter()
+    # No index_dir: always builds (never loads a stale index), then saves
+    cohort = CohortEngine(data_path=args.data, index="ivf", index_params={"nlist": args.nlist, "nprobe": args.nprobe})
+    if cohort.df is None:
+        raise SystemExit(f"Could not load {args.data}")
+    cohort.save_index(args.out)
+    print(f"✅ Twin index ({cohort.index.nlist} partitions, {cohort.index.ntotal:,} rows) saved to {args.out} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,64 @@
-from fastapi import APIRouter, HTTPException
-from backend.schemas.patient import PatientRequest, CohortAnalysisResponse, DigitalTwinResponse
-from backend.models.cohort_engine import CohortEngine
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from backend.schemas.patient import (
+    PatientRequest, BatchPatientRequest, CohortAnalysisResponse, BatchCohortAnalysisResponse, DigitalTwinResponse,
+    BatchDigitalTwinResponse, CohortStatsRequest, CohortStatsResponse
+)
+from backend.dependencies import get_engine
 
 router = APIRouter(prefix="/cohort", tags=["Cohort"])
 
-# Initialize Engine
-try:
-    cohort_engine = CohortEngine()
-except Exception as e:
-    print(f"Failed to initialize CohortEngine: {e}")
-    cohort_engine = None
+StratifyBy = Optional[Literal["gender", "age_band", "hypertension"]]
+TwinMode = Literal["numeric", "mixed"]
 
 @router.post("/analysis", response_model=CohortAnalysisResponse)
-def get_cohort_analysis(patient: PatientRequest):
+def get_cohort_analysis(patient: PatientRequest, stratify_by: StratifyBy = Query(None),
+                        cohort_engine=Depends(get_engine("cohort"))):
     if not cohort_engine or cohort_engine.df is None:
         raise HTTPException(status_code=503, detail="Cohort Engine not ready")
     
-    percentiles = cohort_engine.get_percentiles(patient.dict())
-    return {"percentiles": percentiles}
+    patient_data = patient.dict()
+    percentiles = cohort_engine.get_percentiles(patient_data, stratify_by)
+    stratum = cohort_engine.stratum_of(patient_data, stratify_by) if stratify_by else None
+    return {"percentiles": percentiles, "stratify_by": stratify_by, "stratum": stratum}
+
+@router.post("/analysis/batch", response_model=BatchCohortAnalysisResponse)
+def get_cohort_analysis_batch(request: BatchPatientRequest, stratify_by: StratifyBy = Query(None),
+                              cohort_engine=Depends(get_engine("cohort"))):
+    if not cohort_engine or cohort_engine.df is None:
+        raise HTTPException(status_code=503, detail="Cohort Engine not ready")
+    
+    patients = [p.dict() for p in request.patients]
+    percentiles = cohort_engine.get_percentiles_batch(patients, stratify_by)
+    return {"results": [
+        {"percentiles": pct, "stratify_by": stratify_by,
+         "stratum": cohort_engine.stratum_of(p, stratify_by) if stratify_by else None}
+        for p, pct in zip(patients, percentiles)
+    ]}
 
 @router.post("/twins", response_model=DigitalTwinResponse)
-def get_digital_twins(patient: PatientRequest):
+def get_digital_twins(patient: PatientRequest, k: int = Query(5, ge=1, le=100), mode: TwinMode = Query("numeric"),
+                      cohort_engine=Depends(get_engine("cohort"))):
+    if not cohort_engine or cohort_engine.df is None:
+        raise HTTPException(status_code=503, detail="Cohort Engine not ready")
+    
+    return cohort_engine.find_digital_twins_batch([patient.dict()], k, mode=mode)[0]
+
+@router.post("/twins/batch", response_model=BatchDigitalTwinResponse)
+def get_digital_twins_batch(request: BatchPatientRequest, k: int = Query(5, ge=1, le=100),
+                            mode: TwinMode = Query("numeric"), cohort_engine=Depends(get_engine("cohort"))):
     if not cohort_engine or cohort_engine.df is None:
         raise HTTPException(status_code=503, detail="Cohort Engine not ready")
     
-    twins = cohort_engine.find_digital_twins(patient.dict())
-    return {"twins": twins}
+    return {"results": cohort_engine.find_digital_twins_batch([p.dict() for p in request.patients], k, mode=mode)}
+
+@router.post("/stats", response_model=CohortStatsResponse)
+def get_cohort_stats(request: CohortStatsRequest, cohort_engine=Depends(get_engine("cohort"))):
+    if not cohort_engine or cohort_engine.cube is None:
+        raise HTTPException(status_code=503, detail="Cohort stats not available")
+
+    filters = {dim: spec.dict(exclude_none=True) for dim, spec in request.filters.items()}
+    try:
+        return cohort_engine.cohort_stats(filters, request.group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
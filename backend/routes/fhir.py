@@ -1,33 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from backend.schemas.patient import PatientRequest
 from backend.utils.fhir_converter import FHIRConverter
-from backend.models.risk_engine import RiskEngine
+from backend.dependencies import get_engine
 
 router = APIRouter(prefix="/fhir", tags=["FHIR Interoperability"])
 
-# Load Risk Engine (Singleton ideally, but lazy load here for safety or import from api?)
-# Circular import if I import from api. 
-# Best practice: Dependency Injection or just duplicate instantiation if lightweight (XGBoost is fast).
-# But RiskEngine loads model.
-# I will assume `RiskEngine` is singleton safe or lightweight enough. 
-# Actually, I should use `request.app.state.risk_engine` if I stored it there.
-# But `api.py` defined it as global.
-# I will lazily instantiate.
-
-risk_engine = None
-
-def get_risk_engine():
-    global risk_engine
-    if risk_engine is None:
-        try:
-            risk_engine = RiskEngine()
-        except:
-            pass
-    return risk_engine
-
 @router.post("/bundle")
-def convert_to_fhir(patient: PatientRequest):
-    engine = get_risk_engine()
+def convert_to_fhir(patient: PatientRequest, engine=Depends(get_engine("risk"))):
     if not engine:
         raise HTTPException(status_code=503, detail="Risk Engine not ready")
         
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class PatientRequest(BaseModel):
     gender: str
@@ -14,13 +14,37 @@ class PatientRequest(BaseModel):
 class RiskResponse(BaseModel):
     risk_score: float
     risk_level: str
+    model_version: Optional[str] = None
+
+class BatchPatientRequest(BaseModel):
+    patients: List[PatientRequest]
+
+class BatchRiskResponse(BaseModel):
+    results: List[RiskResponse]
+    model_version: Optional[str] = None
 
 class ExplanationResponse(BaseModel):
     explanations: List[Dict[str, Any]]
+    tier: Optional[str] = None
+    mode: Optional[str] = None
+    folds_used: Optional[int] = None
+    stop_reason: Optional[str] = None
+    elapsed_ms: Optional[float] = None
+    additivity_error: Optional[float] = None
+    model_version: Optional[str] = None
+
+class ExplanationJobResponse(BaseModel):
+    job_id: str
+    status: str
+    submitted_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    explanations: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
 
 class ReportResponse(BaseModel):
     report: str
-    pdf_url: str = None
+    pdf_url: Optional[str] = None
+    model_version: Optional[str] = None
 
 class SimulationRequest(BaseModel):
     patient: PatientRequest
@@ -30,9 +54,102 @@ class SimulationResponse(BaseModel):
     original_risk: float
     new_risk: float
     risk_reduction: float
+    model_version: Optional[str] = None
+
+class ScenarioRequest(BaseModel):
+    patient: PatientRequest
+    scenarios: Optional[List[str]] = None  # names from the scenario library; None = all
+    top_k: Optional[int] = None
+
+class ScenarioResult(BaseModel):
+    name: str
+    change_description: str
+    modifications: Dict[str, Any]
+    new_risk: float
+    risk_reduction: float
+
+class ScenarioResponse(BaseModel):
+    original_risk: float
+    scenarios: List[ScenarioResult]
+    model_version: Optional[str] = None
+
+class FeatureRange(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    step: Optional[float] = None
+    values: Optional[List[str]] = None  # categorical features (smoking_history)
+
+class CounterfactualRequest(BaseModel):
+    patient: PatientRequest
+    target_risk: float = 0.2  # below the Moderate threshold
+    features: Optional[Dict[str, FeatureRange]] = None  # None = default actionable ranges
+    top_k: int = 3
+    time_limit_ms: float = 1000.0
+
+class CounterfactualPlan(BaseModel):
+    modifications: Dict[str, Any]
+    new_risk: float
+    risk_reduction: float
+    cost: float
+
+class CounterfactualResponse(BaseModel):
+    original_risk: float
+    target_risk: float
+    plans: List[CounterfactualPlan]
+    stop_reason: str
+    candidates_evaluated: int
+    candidates_pruned: int
+    grid_size: int
+    elapsed_ms: float
+    model_version: Optional[str] = None
+
+class SensitivityAxis(BaseModel):
+    feature: str
+    min: Optional[float] = None
+    max: Optional[float] = None
+    points: int = 50
+    values: Optional[List[Any]] = None  # explicit grid (e.g. smoking_history categories)
+
+class SensitivityRequest(BaseModel):
+    patient: PatientRequest
+    axes: List[SensitivityAxis]  # one feature (curve) or two (heatmap)
+
+class SensitivityResponse(BaseModel):
+    features: List[str]
+    grid: Dict[str, List[Any]]
+    risks: List[Any]  # 1D: one risk per grid value; 2D: rows follow the first axis
+    original_risk: float
+    model_version: Optional[str] = None
+    cached: bool = False
+    elapsed_ms: Optional[float] = None
+
+class SimulationSessionResponse(BaseModel):
+    session_id: str
+    patient: Dict[str, Any]
+    original_risk: float
+    explanations: Optional[List[Dict[str, Any]]] = None
+    model_version: Optional[str] = None
+    simulations: int = 0
+    expires_in: Optional[float] = None
+
+class SessionSimulationRequest(BaseModel):
+    modifications: Dict[str, Any]
+
+class SessionSimulationResponse(BaseModel):
+    session_id: str
+    original_risk: float
+    new_risk: float
+    risk_reduction: float
+    changes: Dict[str, Dict[str, Any]]  # feature -> {"from": ..., "to": ...}
+    model_version: Optional[str] = None
 
 class CohortAnalysisResponse(BaseModel):
     percentiles: Dict[str, float]
+    stratify_by: Optional[str] = None
+    stratum: Optional[str] = None  # None: compared against the whole cohort
+
+class BatchCohortAnalysisResponse(BaseModel):
+    results: List[CohortAnalysisResponse]
 
 class DigitalTwin(BaseModel):
     gender: str
@@ -44,9 +161,40 @@ class DigitalTwin(BaseModel):
     HbA1c_level: float
     blood_glucose_level: float
     diabetes: int
+    distance: Optional[float] = None  # standardized vitals units; mode=mixed: Gower-style, 0 to 1
 
 class DigitalTwinResponse(BaseModel):
     twins: List[DigitalTwin]
+    distances: List[float] = []
+
+class BatchDigitalTwinResponse(BaseModel):
+    results: List[DigitalTwinResponse]
+
+class StatsFilter(BaseModel):
+    # Binned measures take min / max on bin edges; categories take values
+    min: Optional[float] = None
+    max: Optional[float] = None
+    values: Optional[List[Any]] = None
+
+class CohortStatsRequest(BaseModel):
+    filters: Dict[str, StatsFilter] = {}
+    group_by: List[str] = []
+
+class CohortStatsGroup(BaseModel):
+    key: Dict[str, Any]
+    count: int
+    diabetes_cases: int
+    diabetes_rate: Optional[float] = None
+
+class CohortStatsResponse(BaseModel):
+    rows: int
+    count: int
+    diabetes_cases: int
+    diabetes_rate: Optional[float] = None
+    group_by: List[str]
+    groups: List[CohortStatsGroup]
+    filters: Dict[str, List[Any]]  # dimension -> labels of the cells selected
+    elapsed_ms: float
 
 class FeedbackRequest(BaseModel):
     patient_data: PatientRequest
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import urllib.error
+import urllib.request
+from typing import Callable, Dict, Optional
+
+CHUNK_SIZE = 1 << 20
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resumable_download(url: str, dest_path: str, expected_sha256: Optional[str] = None,
+                       expected_size: Optional[int] = None, headers: Optional[Dict[str, str]] = None,
+                       progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                       timeout: float = 60.0) -> str:
+    """
+    Downloads url to dest_path through a "<dest_path>.part" file.
+
+    An interrupted download resumes from the partial file with an HTTP Range
+    request. The finished file is checked against expected_sha256 (and
+    expected_size) before it is renamed into place; on mismatch the partial
+    file is deleted and ValueError is raised, so the next attempt starts clean.
+    """
+    part_path = dest_path + ".part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if expected_size is not None and offset > expected_size:
+        os.remove(part_path)
+        offset = 0
+
+    if expected_size is None or offset < expected_size:
+        request = urllib.request.Request(url, headers=dict(headers or {}))
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            # 416: nothing left to fetch, the partial file is already complete
+            if e.code != 416:
+                raise
+            response = None
+
+        if response is not None:
+            with response:
+                if offset and response.status != 206:
+                    # Server ignored the Range header: start over
+                    offset = 0
+                length = response.headers.get("Content-Length")
+                total = offset + int(length) if length is not None else expected_size
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                        f.write(chunk)
+                        offset += len(chunk)
+                        if progress:
+                            progress(offset, total)
+
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        raise IOError(f"Incomplete download of {url}: {size} of {expected_size} bytes")
+
+    if expected_sha256:
+        actual = sha256_file(part_path)
+        if actual != expected_sha256.lower():
+            os.remove(part_path)
+            raise ValueError(f"Checksum mismatch for {os.path.basename(dest_path)}: "
+                             f"expected {expected_sha256}, got {actual}")
+
+    os.replace(part_path, dest_path)
+    return dest_path
@@ -0,0 +1,127 @@
+"""
+Benchmark: tree-native SHAP vs KernelExplainer.
+
+Compares per-patient latency and attribution agreement between the two
+Explainability modes on rows sampled from the training dataset, then the
+latency / additivity trade-off of the tree mode's quality tiers.
+
+Usage (from the repo root):
+    python benchmarks/bench_explainers.py --samples 20
+    python benchmarks/bench_explainers.py --samples 200 --tiers-only --budget-ms 80
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+from backend.models.risk_engine import RiskEngine
+from backend.models.explainability import Explainability
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+
+
+def time_explainer(explainer, frames):
+    latencies, values = [], []
+    for df in frames:
+        start = time.perf_counter()
+        values.append(explainer.shap_values(df)[0])
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000, np.vstack(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tree vs Kernel SHAP benchmark")
+    parser.add_argument("--samples", type=int, default=20, help="Number of patients to explain")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tiers-only", action="store_true", help="Skip the (slow) kernel comparison")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Also run the exact tier under this budget")
+    args = parser.parse_args()
+
+    engine = RiskEngine(explainer_mode="tree")
+    if engine.explainer is None:
+        print("Background data not found - cannot build explainers.")
+        sys.exit(1)
+
+    patients = pd.read_csv(DATA_PATH).drop(columns=["diabetes"]).sample(args.samples, random_state=args.seed)
+    frames = [engine._preprocess(row.to_dict()) for _, row in patients.iterrows()]
+
+    tree = engine.explainer
+    if not args.tiers_only:
+        compare_modes(engine, tree, frames, args)
+    compare_tiers(engine, tree, frames, args)
+
+
+def compare_modes(engine, tree, frames, args):
+    kernel = Explainability(engine.pipeline, engine.background_data, mode="kernel")
+
+    tree_ms, tree_phi = time_explainer(tree, frames)
+    kernel_ms, kernel_phi = time_explainer(kernel, frames)
+
+    # Additivity: attributions should sum to f(x) - E[f(x)]
+    preds = engine.predict_risk_batch(pd.concat(frames, ignore_index=True))
+    tree_err = np.abs(tree_phi.sum(axis=1) - (np.array(preds) - tree.expected_value))
+    kernel_err = np.abs(kernel_phi.sum(axis=1) - (np.array(preds) - kernel.expected_value))
+
+    # Agreement between the two modes
+    corr = [np.corrcoef(t, k)[0, 1] for t, k in zip(tree_phi, kernel_phi)]
+    top3 = [
+        len(set(np.argsort(-np.abs(t))[:3]) & set(np.argsort(-np.abs(k))[:3])) / 3
+        for t, k in zip(tree_phi, kernel_phi)
+    ]
+
+    print(f"\n{'='*60}")
+    print(f"{'EXPLAINER BENCHMARK':^60}")
+    print(f"{'='*60}")
+    print(f"  Patients explained:      {args.samples}")
+    print(f"  Tree mode:               p50 {np.percentile(tree_ms, 50):8.1f} ms   p99 {np.percentile(tree_ms, 99):8.1f} ms")
+    print(f"  Kernel mode:             p50 {np.percentile(kernel_ms, 50):8.1f} ms   p99 {np.percentile(kernel_ms, 99):8.1f} ms")
+    print(f"  Speedup (p50):           {np.percentile(kernel_ms, 50) / np.percentile(tree_ms, 50):8.1f}x")
+    print(f"{'─'*60}")
+    print(f"  Additivity error (tree):   max {tree_err.max():.2e}")
+    print(f"  Additivity error (kernel): max {kernel_err.max():.2e}")
+    print(f"  Pearson r (mean):        {np.nanmean(corr):.3f}")
+    print(f"  Top-3 feature overlap:   {np.mean(top3) * 100:.1f}%")
+    print(f"  Mean |tree - kernel|:    {np.abs(tree_phi - kernel_phi).mean():.4f}")
+    print(f"{'='*60}\n")
+
+
+def compare_tiers(engine, tree, frames, args):
+    preds = engine.predict_risk_batch(pd.concat(frames, ignore_index=True))
+    runs = [(tier, None) for tier in tree.TIERS]
+    if args.budget_ms:
+        runs.append(("exact", args.budget_ms))
+
+    exact_phi = None
+    print(f"\n{'='*76}")
+    print(f"{'EXPLANATION QUALITY TIERS':^76}")
+    print(f"{'='*76}")
+    print(f"  {'Tier':<22} {'p50 ms':>8} {'p99 ms':>8} {'folds':>6} {'max add. err':>13} {'mean |d exact|':>15}")
+    print(f"{'─'*76}")
+    # Exact first so the other tiers can be compared against it
+    runs.sort(key=lambda r: (r[0] != "exact" or r[1] is not None))
+    for tier, budget in runs:
+        latencies, values, infos = [], [], []
+        for df, pred in zip(frames, preds):
+            start = time.perf_counter()
+            phi, info = tree.explain(df, tier=tier, budget_ms=budget, prediction=[pred])
+            latencies.append((time.perf_counter() - start) * 1000)
+            values.append(phi[0])
+            infos.append(info)
+        values = np.vstack(values)
+        if tier == "exact" and budget is None:
+            exact_phi = values
+        drift = np.abs(values - exact_phi).mean() if exact_phi is not None else float("nan")
+        label = tier if budget is None else f"{tier} @ {budget:g} ms"
+        folds = np.mean([i.get("folds_used", 0) for i in infos])
+        print(f"  {label:<22} {np.percentile(latencies, 50):8.1f} {np.percentile(latencies, 99):8.1f} "
+              f"{folds:6.1f} {max(i['additivity_error'] for i in infos):13.2e} {drift:15.4f}")
+    print(f"{'='*76}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Microbenchmark: pandas single-row inference vs the compiled numpy fast path.
+
+Reports p50/p99 per-row latency for preprocessing alone and for the full
+predict_risk call (cache disabled), over rows from the training dataset.
+
+Usage (from the repo root):
+    python benchmarks/bench_fast_path.py --rows 500
+    python benchmarks/bench_fast_path.py --backend onnx --onnx-threads 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+from backend.models.risk_engine import RiskEngine
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+
+
+def measure(fn, rows):
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        fn(row)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def report(label, ms):
+    print(f"  {label:<28} p50 {np.percentile(ms, 50):8.3f} ms   p99 {np.percentile(ms, 99):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-row inference microbenchmark")
+    parser.add_argument("--rows", type=int, default=500, help="Number of patients to score")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=RiskEngine.BACKENDS, default="sklearn")
+    parser.add_argument("--onnx-threads", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = RiskEngine(cache_size=0, backend=args.backend, onnx_threads=args.onnx_threads)
+    if engine.fast_transform is None:
+        print("Fast path could not be compiled for this pipeline.")
+        sys.exit(1)
+
+    df = pd.read_csv(DATA_PATH).drop(columns=["diabetes"]).sample(args.rows, random_state=args.seed)
+    rows = df.to_dict("records")
+    preprocessor = engine.pipeline.named_steps["preprocessor"]
+
+    # Warm up both paths
+    for row in rows[:10]:
+        engine.pipeline.predict_proba(engine._preprocess(row))
+        engine.predict_risk(row)
+
+    pandas_pre = measure(lambda r: preprocessor.transform(engine._preprocess(r)), rows)
+    fast_pre = measure(lambda r: engine.fast_transform.transform_row(engine._engineer_row(r)), rows)
+    pandas_full = measure(lambda r: engine.pipeline.predict_proba(engine._preprocess(r)), rows)
+    fast_full = measure(engine.predict_risk, rows)
+
+    print(f"\n{'='*68}")
+    print(f"{'SINGLE-ROW INFERENCE LATENCY':^68}")
+    print(f"{'='*68}")
+    print(f"  Rows: {args.rows}   Backend: {engine.cache_stats()['backend']}")
+    print(f"{'─'*68}")
+    report("Preprocess (pandas)", pandas_pre)
+    report("Preprocess (numpy fast path)", fast_pre)
+    report("predict (pandas)", pandas_full)
+    report("predict (numpy fast path)", fast_full)
+    print(f"{'─'*68}")
+    print(f"  Preprocess speedup (p50):    {np.percentile(pandas_pre, 50) / np.percentile(fast_pre, 50):.1f}x")
+    print(f"  End-to-end speedup (p50):    {np.percentile(pandas_full, 50) / np.percentile(fast_full, 50):.2f}x")
+    print(f"{'='*68}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: mixed-type (Gower-style) twin search vs the 4-feature search.
+
+Builds the current numeric twin search (exact NearestNeighbors on scaled
+age, BMI, HbA1c and glucose) and the partitioned Gower index over the
+dataset, or --rows synthetic patients, then reports build time, per-query
+latency, and how often the returned twins share the patient's gender,
+smoking history, hypertension and heart disease. A sample of queries is
+checked against a brute-force Gower scan to confirm the index is exact.
+
+Usage (from the repo root):
+    python benchmarks/bench_mixed_twins.py
+    python benchmarks/bench_mixed_twins.py --rows 1000000 --k 10 --weights hypertension=2,heart_disease=2
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.getcwd())
+
+from backend.models.mixed_twin_index import CATEGORICAL_FEATURES, NUMERIC_FEATURES, GowerTwinIndex, parse_weights
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+
+
+def load_cohort(rows, queries, seed):
+    """
+    Returns (cohort, queries) frames. Queries are patients not in the cohort.
+    """
+    if rows:
+        from backend.models.synthetic_patients import SyntheticPatientGenerator
+
+        generator = SyntheticPatientGenerator.fit(DATA_PATH)
+        df = generator.sample(rows + queries, np.random.default_rng(seed))
+    else:
+        df = pd.read_csv(DATA_PATH).sample(frac=1.0, random_state=seed)
+    df = df.reset_index(drop=True)
+    return df.iloc[queries:].reset_index(drop=True), df.iloc[:queries].reset_index(drop=True)
+
+
+def category_agreement(cohort, queries, indices):
+    """
+    Share of returned twins matching the query on all four categorical features.
+    """
+    matches = np.ones(indices.shape, dtype=bool)
+    for c in CATEGORICAL_FEATURES:
+        values = cohort[c].astype(str).to_numpy()
+        matches &= values[indices] == queries[c].astype(str).to_numpy()[:, None]
+    return matches.mean()
+
+
+def brute_force(index, cohort, queries, k):
+    X = cohort[index.numeric].to_numpy(dtype=np.float64) * index.scale
+    Q = queries[index.numeric].to_numpy(dtype=np.float64) * index.scale
+    categories = [cohort[c].astype(str).to_numpy() for c in index.categorical]
+    distances = []
+    for i in range(len(queries)):
+        d = np.abs(X - Q[i]).sum(axis=1)
+        for c, values in zip(index.categorical, categories):
+            d += index.weights[c] * (values != str(queries[c].iloc[i]))
+        distances.append(np.sort(d)[:k] / index.total_weight)
+    return np.array(distances)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed-type vs numeric twin search benchmark")
+    parser.add_argument("--rows", type=int, default=0, help="Synthetic cohort size (default: the dataset)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--weights", default="", help="Gower weights, e.g. hypertension=2,gender=0.5")
+    parser.add_argument("--verify", type=int, default=50, help="Queries checked against a brute-force scan")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    cohort, queries = load_cohort(args.rows, args.queries, args.seed)
+
+    started = time.perf_counter()
+    scaler = StandardScaler().fit(cohort[NUMERIC_FEATURES].to_numpy(dtype=np.float64))
+    numeric = NearestNeighbors().fit(scaler.transform(cohort[NUMERIC_FEATURES].to_numpy(dtype=np.float64)))
+    numeric_build = time.perf_counter() - started
+    started = time.perf_counter()
+    Q = scaler.transform(queries[NUMERIC_FEATURES].to_numpy(dtype=np.float64))
+    _, numeric_idx = numeric.kneighbors(Q, n_neighbors=args.k)
+    numeric_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    started = time.perf_counter()
+    mixed = GowerTwinIndex(parse_weights(args.weights)).fit(cohort)
+    mixed_build = time.perf_counter() - started
+    records = queries.to_dict("records")
+    started = time.perf_counter()
+    mixed_d, mixed_idx = mixed.search(records, args.k)
+    mixed_ms = (time.perf_counter() - started) / len(queries) * 1000
+    started = time.perf_counter()
+    single = [mixed.search([p], args.k) for p in records[:200]]
+    single_ms = (time.perf_counter() - started) / len(single) * 1000
+
+    verify = min(args.verify, len(queries))
+    exact = np.allclose(brute_force(mixed, cohort, queries.iloc[:verify], args.k), mixed_d[:verify])
+
+    print(f"\n{'='*68}")
+    print(f"{'DIGITAL TWINS: MIXED-TYPE (GOWER) vs 4-FEATURE':^68}")
+    print(f"{'='*68}")
+    print(f"  Cohort: {len(cohort):,} rows   Queries: {len(queries):,}   k: {args.k}   "
+          f"Partitions: {len(mixed.keys)}")
+    print(f"  Weights: {', '.join(f'{c}={w:g}' for c, w in mixed.weights.items())}")
+    print(f"{'─'*68}")
+    print(f"  {'Search':<24} {'Build ms':>10} {'ms / query':>12} {'Category match':>16}")
+    print(f"  {'numeric (4 features)':<24} {numeric_build * 1000:10.1f} {numeric_ms:12.3f} "
+          f"{category_agreement(cohort, queries, numeric_idx):15.1%}")
+    print(f"  {'mixed (batched)':<24} {mixed_build * 1000:10.1f} {mixed_ms:12.3f} "
+          f"{category_agreement(cohort, queries, mixed_idx):15.1%}")
+    print(f"  {'mixed (one at a time)':<24} {'':>10} {single_ms:12.3f}")
+    print(f"{'─'*68}")
+    print(f"  Matches brute-force Gower on {verify} queries: {'yes' if exact else 'NO'}")
+    print(f"{'='*68}\n")
+
+
+if __name__ == "__main__":
+    main()
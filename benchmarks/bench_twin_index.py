@@ -0,0 +1,105 @@
+"""
+Benchmark: digital-twin index, IVF (approximate) vs exact.
+
+Builds both indexes on the scaled twin features (age, BMI, HbA1c, glucose)
+of the dataset, or of --rows synthetic patients to try registry sizes, then
+reports build / load time and, for each nprobe, per-query latency and
+recall@k against the exact neighbours. Recall counts a returned twin as
+correct when it is no farther than the exact k-th neighbour, so ties
+between identical patients don't count as misses.
+
+Usage (from the repo root):
+    python benchmarks/bench_twin_index.py
+    python benchmarks/bench_twin_index.py --rows 2000000 --nprobe 1 2 4 8 16 32 --k 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.getcwd())
+
+from backend.models.twin_index import IVFIndex
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+FEATURES = ["age", "bmi", "HbA1c_level", "blood_glucose_level"]
+
+
+def load_features(rows, queries, seed):
+    """
+    Returns (cohort matrix, query matrix), unscaled. Queries are patients
+    not in the cohort.
+    """
+    if rows:
+        from backend.models.synthetic_patients import SyntheticPatientGenerator
+
+        generator = SyntheticPatientGenerator.fit(DATA_PATH)
+        df = generator.sample(rows + queries, np.random.default_rng(seed))
+    else:
+        df = pd.read_csv(DATA_PATH).sample(frac=1.0, random_state=seed)
+    X = df[FEATURES].to_numpy(dtype=np.float64)
+    return X[queries:], X[:queries]
+
+
+def timed_search(search, Q, k):
+    started = time.perf_counter()
+    distances, indices = search(Q, k)
+    return distances, indices, (time.perf_counter() - started) / len(Q) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Twin index recall vs latency benchmark")
+    parser.add_argument("--rows", type=int, default=0, help="Synthetic cohort size (default: the dataset)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF partitions (default 4 * sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    X, Q = load_features(args.rows, args.queries, args.seed)
+    scaler = StandardScaler().fit(X)
+    X, Q = scaler.transform(X), scaler.transform(Q)
+
+    started = time.perf_counter()
+    exact = NearestNeighbors().fit(X)
+    exact_build = time.perf_counter() - started
+    exact_d, _, exact_ms = timed_search(lambda q, k: exact.kneighbors(q, n_neighbors=k), Q, args.k)
+    kth = exact_d[:, -1:] + 1e-6
+
+    started = time.perf_counter()
+    ivf = IVFIndex(nlist=args.nlist).fit(X)
+    ivf_build = time.perf_counter() - started
+    with tempfile.TemporaryDirectory() as directory:
+        ivf.save(directory)
+        started = time.perf_counter()
+        ivf = IVFIndex.load(directory, mmap_mode="r")
+        ivf_load = time.perf_counter() - started
+
+        print(f"\n{'='*68}")
+        print(f"{'DIGITAL TWIN INDEX: IVF vs EXACT':^68}")
+        print(f"{'='*68}")
+        print(f"  Cohort: {len(X):,} rows   Queries: {len(Q):,}   k: {args.k}   "
+              f"IVF partitions: {len(ivf.centroids):,}")
+        print(f"{'─'*68}")
+        print(f"  Exact fit (every start)    {exact_build * 1000:10.1f} ms")
+        print(f"  IVF build (offline)        {ivf_build * 1000:10.1f} ms")
+        print(f"  IVF load (memory-mapped)   {ivf_load * 1000:10.1f} ms")
+        print(f"{'─'*68}")
+        print(f"  {'Index':<16} {'Recall@k':>10} {'ms / query':>12} {'Speedup':>10}")
+        print(f"  {'exact':<16} {1.0:10.3f} {exact_ms:12.3f} {1.0:9.1f}x")
+        for nprobe in args.nprobe:
+            d, _, ms = timed_search(lambda q, k: ivf.search(q, k, nprobe=nprobe), Q, args.k)
+            recall = (d <= kth).mean()
+            print(f"  {f'ivf nprobe={nprobe}':<16} {recall:10.3f} {ms:12.3f} {exact_ms / ms:9.1f}x")
+        print(f"{'='*68}\n")
+
+
+if __name__ == "__main__":
+    main()
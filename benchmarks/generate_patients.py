@@ -0,0 +1,119 @@
+"""
+Synthetic patient generator for load and soak tests.
+
+Fits SyntheticPatientGenerator to data/diabetes_dataset.csv (or loads saved
+parameters) and streams any number of patients to CSV, JSONL or Parquet in
+fixed-size chunks, so memory stays flat at 10M+ rows. Output is identical
+for a given --seed whatever --workers is.
+
+With --score, chunks are also pushed through RiskEngine.score_batch and the
+batch scoring throughput is reported (a soak test of the scoring path).
+
+Usage (from the repo root):
+    python benchmarks/generate_patients.py --rows 10000000 --out data/synthetic_patients.csv --workers 8
+    python benchmarks/generate_patients.py --rows 1000000 --out /tmp/patients.jsonl --save-params /tmp/params.json
+    python benchmarks/generate_patients.py --rows 2000000 --score --chunk-size 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from backend.models.synthetic_patients import SyntheticPatientGenerator, NUMERIC_COLS
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+
+
+def fidelity_report(generator, data_path, rows, seed):
+    """
+    Prints real vs synthetic means and the largest correlation difference.
+    """
+    import pandas as pd
+
+    real = pd.read_csv(data_path)
+    synthetic = generator.sample(rows, np.random.default_rng(seed))
+    cols = NUMERIC_COLS + ["diabetes"]
+    corr_diff = (real[cols].corr() - synthetic[cols].corr()).abs()
+
+    print(f"  {'Column':<22} {'real mean':>12} {'synthetic':>12}")
+    for col in cols:
+        print(f"  {col:<22} {real[col].mean():12.3f} {synthetic[col].mean():12.3f}")
+    worst = corr_diff.stack().idxmax()
+    print(f"  Max |corr diff|: {corr_diff.values.max():.3f} ({worst[0]} / {worst[1]})")
+
+
+def score_stream(generator, rows, chunk_size, seed, workers):
+    from backend.models.risk_engine import RiskEngine
+
+    engine = RiskEngine(cache_size=0)
+    scored, started = 0, time.perf_counter()
+    for chunk in generator.iter_chunks(rows, chunk_size, seed, workers):
+        scores, _ = engine.score_batch(chunk.drop(columns=["diabetes"]).to_dict("records"))
+        scored += len(scores)
+    return scored, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream synthetic patients to CSV / JSONL / Parquet")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--out", default=None, help="Output file; format from extension (.csv, .jsonl, .parquet)")
+    parser.add_argument("--format", choices=("csv", "jsonl", "parquet"), default=None)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data", default=DATA_PATH, help="Dataset to fit")
+    parser.add_argument("--params", default=None, help="Load fitted parameters instead of fitting")
+    parser.add_argument("--save-params", default=None, help="Write fitted parameters (JSON)")
+    parser.add_argument("--score", action="store_true", help="Score every chunk with RiskEngine.score_batch")
+    parser.add_argument("--report", action="store_true", help="Compare synthetic vs real distributions")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generator = (SyntheticPatientGenerator.load(args.params) if args.params
+                 else SyntheticPatientGenerator.fit(args.data))
+    fit_seconds = time.perf_counter() - started
+    if args.save_params:
+        generator.save(args.save_params)
+
+    print(f"\n{'='*68}")
+    print(f"{'SYNTHETIC PATIENTS':^68}")
+    print(f"{'='*68}")
+    print(f"  Source: {generator.params['source']} ({generator.params['rows']} rows, "
+          f"{len(generator.params['strata'])} strata)   Fit: {fit_seconds:.2f}s")
+    print(f"  Rows: {args.rows}   Chunk: {args.chunk_size}   Workers: {args.workers}   Seed: {args.seed}")
+
+    if args.report:
+        print(f"{'─'*68}")
+        fidelity_report(generator, args.data, min(args.rows, 200_000), args.seed)
+
+    if args.out:
+        print(f"{'─'*68}")
+
+        def progress(done, total):
+            print(f"\r  Written {done:>12,} / {total:,}", end="", flush=True)
+
+        started = time.perf_counter()
+        try:
+            result = generator.write(args.out, args.rows, fmt=args.format, chunk_size=args.chunk_size,
+                                     seed=args.seed, workers=args.workers, progress=progress)
+        except (ImportError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        elapsed = time.perf_counter() - started
+        print(f"\n  {result['path']} ({result['format']}): {result['bytes'] / 1e6:.1f} MB in {elapsed:.1f}s "
+              f"({result['rows'] / elapsed:,.0f} rows/s)")
+
+    if args.score:
+        print(f"{'─'*68}")
+        scored, elapsed = score_stream(generator, args.rows, args.chunk_size, args.seed, args.workers)
+        print(f"  Scored {scored:,} patients in {elapsed:.1f}s ({scored / elapsed:,.0f} rows/s)")
+
+    print(f"{'='*68}\n")
+
+
+if __name__ == "__main__":
+    main()
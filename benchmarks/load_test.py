@@ -0,0 +1,317 @@
+"""
+Load test: latency and throughput of every API endpoint.
+
+Drives the endpoints with a pool of concurrent clients, either in-process
+(FastAPI TestClient, no network) or over HTTP (a uvicorn server started
+here, or any running server via --base-url). The Clinical LLM is replaced
+by a deterministic local fake, and history / feedback / PDFs go to a temp
+directory, so the suite runs offline and leaves the repo untouched.
+
+Results (p50/p95/p99 ms, requests/s, errors per endpoint) can be saved as
+a JSON baseline and compared against later: --compare exits with status 1
+if any endpoint's latency grows (or throughput drops) by more than
+--threshold.
+
+Usage (from the repo root):
+    python benchmarks/load_test.py --concurrency 8 --requests 200 --save benchmarks/baseline.json
+    python benchmarks/load_test.py --concurrency 8 --requests 200 --compare benchmarks/baseline.json
+    python benchmarks/load_test.py --transport http --endpoints predict,explain
+    python benchmarks/load_test.py --workload synthetic --patients 500000 --endpoints predict_batch
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+PERCENTILES = (50, 95, 99)
+
+
+class FakeClinicalLLM:
+    """
+    Deterministic stand-in for ClinicalLLM: same interface, no model.
+    latency_ms simulates generation time.
+    """
+
+    state = "ready"
+    error = None
+    is_ready = True
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    def status(self):
+        return {"state": self.state, "error": None, "download": {"bytes": 0, "total": None}}
+
+    def _generate(self, text: str) -> str:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return text
+
+    def generate_report(self, patient_data, risk_score, risk_level, explanations):
+        top = explanations[0]["feature"] if explanations else "none"
+        return self._generate(f"{risk_level} risk ({risk_score:.2f}). Main factor: {top}.")
+
+    def generate_simulation_report(self, original_data, modified_data, original_risk, new_risk):
+        return self._generate(f"Risk changes from {original_risk:.2f} to {new_risk:.2f}.")
+
+
+def build_app(workdir: str, llm_latency_ms: float):
+    """
+    Imports the API and swaps side-effecting engines for offline / temp-dir ones.
+    """
+    from backend.api import app
+    from backend.models.history_engine import HistoryEngine
+    from backend.models.pdf_service import PDFService
+    from backend.routes import feedback
+
+    engines = app.state.engines
+    engines.override("clinical_llm", FakeClinicalLLM(llm_latency_ms))
+    engines.override("history", HistoryEngine(storage_file=os.path.join(workdir, "history.json")))
+    engines.override("pdf", PDFService(output_dir=os.path.join(workdir, "pdfs")))
+    feedback.FEEDBACK_FILE = os.path.join(workdir, "feedback.csv")
+    # Build the real engines before timing anything
+    engines.init_eager()
+    return app
+
+
+BATCH_SIZE = 16
+# name -> (method, path, body builder taking patient(i) accessor and request index)
+ENDPOINTS = {
+    "predict": ("POST", "/predict", lambda p, i: p(i)),
+    "predict_batch": ("POST", "/predict/batch", lambda p, i: {"patients": [p(i * BATCH_SIZE + k) for k in range(BATCH_SIZE)]}),
+    "explain": ("POST", "/explain", lambda p, i: p(i)),
+    "explain_fast": ("POST", "/explain?tier=fast", lambda p, i: p(i)),
+    "simulate": ("POST", "/simulate", lambda p, i: {"patient": p(i), "modifications": {"bmi": 24.0}}),
+    "simulate_scenarios": ("POST", "/simulate/scenarios", lambda p, i: {"patient": p(i)}),
+    "simulate_sensitivity": ("POST", "/simulate/sensitivity", lambda p, i: {
+        "patient": p(i), "axes": [{"feature": "HbA1c_level", "points": 100},
+                                  {"feature": "blood_glucose_level", "points": 100}]}),
+    "simulate_report": ("POST", "/simulate/report", lambda p, i: {"patient": p(i), "modifications": {"bmi": 24.0}}),
+    "report": ("POST", "/report", lambda p, i: p(i)),
+    "cohort_analysis": ("POST", "/cohort/analysis", lambda p, i: p(i)),
+    "cohort_twins": ("POST", "/cohort/twins", lambda p, i: p(i)),
+    "cohort_stats": ("POST", "/cohort/stats", lambda p, i: {
+        "filters": {"age": {"min": 45}, "smoking_history": {"values": [p(i)["smoking_history"]]}},
+        "group_by": ["gender", "hypertension"]}),
+    "fhir_bundle": ("POST", "/fhir/bundle", lambda p, i: p(i)),
+    "history": ("GET", "/history?limit=10", lambda p, i: None),
+    "feedback": ("POST", "/feedback/", lambda p, i: {"patient_data": p(i), "predicted_risk": 0.5, "agreed": True}),
+}
+
+
+# Patients one request consumes, where not 1
+PATIENTS_PER_REQUEST = {"predict_batch": BATCH_SIZE}
+
+
+def endpoint_requests(patients, names, requests_per_endpoint):
+    """
+    name -> function(i) returning (method, path, json body) for request i.
+    Each endpoint gets its own disjoint slice of patients, sized to what
+    its requests consume, so one endpoint's cached results don't make the
+    next one look fast. Raises ValueError if there are too few patients.
+    """
+    def make(offset, method, path, body):
+        patient = lambda i: patients[offset + i]
+        return lambda i: (method, path, body(patient, i))
+
+    strides = [requests_per_endpoint * PATIENTS_PER_REQUEST.get(name, 1) for name in names]
+    if len(patients) < sum(strides):
+        raise ValueError(f"{len(patients):,} patients, but the selected endpoints need {sum(strides):,} "
+                         f"distinct ones. Raise --patients or lower --requests.")
+    offsets = np.cumsum([0] + strides[:-1])
+    return {name: make(int(offset), *ENDPOINTS[name]) for name, offset in zip(names, offsets)}
+
+
+def load_patients(n, seed, workload="dataset"):
+    if workload == "synthetic":
+        # Not limited to the dataset's 100k rows, and never repeats a real patient
+        from backend.models.synthetic_patients import SyntheticPatientGenerator
+        return SyntheticPatientGenerator.fit(DATA_PATH).patients(n, seed)
+    df = pd.read_csv(DATA_PATH).drop(columns=["diabetes"]).sample(n, random_state=seed)
+    return df.to_dict("records")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_http_server(app):
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn not installed. Use --transport inprocess or pass --base-url.")
+        sys.exit(1)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def run_endpoint(send, make_request, n_requests, concurrency, warmup):
+    for i in range(warmup):
+        send(*make_request(i))
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            status = send(*make_request(warmup + i))
+        except Exception:
+            status = 0
+        return (time.perf_counter() - started) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - started
+
+    latencies = np.array([ms for ms, _ in results])
+    errors = sum(1 for _, status in results if not 200 <= status < 300)
+    stats = {f"p{p}_ms": round(float(np.percentile(latencies, p)), 3) for p in PERCENTILES}
+    stats.update(rps=round(n_requests / wall, 2), requests=n_requests, errors=errors)
+    return stats
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, threshold, metrics):
+    """
+    Returns a list of regression messages (empty if none).
+    """
+    regressions = []
+    for name, current in results["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if base is None:
+            continue
+        for metric in metrics:
+            if base.get(metric) and current[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {base[metric]:.2f} -> {current[metric]:.2f} ms "
+                                   f"(+{(current[metric] / base[metric] - 1) * 100:.0f}%)")
+        if base.get("rps") and current["rps"] < base["rps"] / (1 + threshold):
+            regressions.append(f"{name}: rps {base['rps']:.1f} -> {current['rps']:.1f}")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: errors {base.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API load test with JSON baselines")
+    parser.add_argument("--transport", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--base-url", default=None, help="Target a running server instead (http transport)")
+    parser.add_argument("--endpoints", default="all", help="Comma-separated endpoint names, or 'all'")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint")
+    parser.add_argument("--patients", type=int, default=10000,
+                        help="Distinct patients, split between the endpoints without overlap")
+    parser.add_argument("--workload", choices=("dataset", "synthetic"), default="dataset",
+                        help="Sample real rows or generate synthetic patients")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated fake-LLM generation time")
+    parser.add_argument("--save", default=None, help="Write results to this JSON baseline")
+    parser.add_argument("--compare", default=None, help="Compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed relative regression (0.20 = 20%%)")
+    parser.add_argument("--metrics", default="p50_ms,p95_ms", help="Latency metrics checked by --compare")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    names = list(ENDPOINTS) if args.endpoints == "all" else args.endpoints.split(",")
+    unknown = [n for n in names if n not in ENDPOINTS]
+    if unknown:
+        print(f"❌ Unknown endpoints: {unknown}. Choose from {list(ENDPOINTS)}")
+        sys.exit(1)
+    patients = load_patients(args.patients, args.seed, args.workload)
+    try:
+        requests_by_name = endpoint_requests(patients, names, args.requests + args.warmup)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    import httpx
+    if args.transport == "inprocess":
+        from fastapi.testclient import TestClient
+        client = TestClient(build_app(workdir, args.llm_latency_ms))
+    else:
+        base_url = args.base_url or start_http_server(build_app(workdir, args.llm_latency_ms))[0]
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        client = httpx.Client(base_url=base_url, limits=limits, timeout=120.0)
+
+    def send(method, path, body):
+        return client.request(method, path, json=body).status_code
+
+    results = {
+        "meta": {
+            "transport": args.transport if not args.base_url else f"http {args.base_url}",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "patients": args.patients,
+            "workload": args.workload,
+            "seed": args.seed,
+            "llm_latency_ms": args.llm_latency_ms,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.time(),
+        },
+        "endpoints": {},
+    }
+
+    print(f"\n{'='*78}")
+    print(f"{'API LOAD TEST':^78}")
+    print(f"{'='*78}")
+    print(f"  Transport: {results['meta']['transport']}   Concurrency: {args.concurrency}   "
+          f"Requests/endpoint: {args.requests}")
+    print(f"{'─'*78}")
+    print(f"  {'Endpoint':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+    print(f"{'─'*78}")
+    for name in names:
+        stats = run_endpoint(send, requests_by_name[name], args.requests, args.concurrency, args.warmup)
+        results["endpoints"][name] = stats
+        print(f"  {name:<18} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} "
+              f"{stats['rps']:9.1f} {stats['errors']:7d}")
+    print(f"{'='*78}\n")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.metrics.split(","))
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold * 100:.0f}% "
+                  f"vs {args.compare} (commit {baseline['meta'].get('commit')}):")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.threshold * 100:.0f}% vs {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Per-worker memory report: independent workers vs preload + fork sharing.
+
+"independent" forks bare workers that each load their own RiskEngine and
+CohortEngine (what `uvicorn --workers N` does). "shared" loads the engines
+once in the master with memory-mapped artifacts, freezes the GC and then
+forks (what backend/gunicorn_conf.py does). Each worker scores a few
+patients before reporting, so numbers include pages touched at inference.
+
+Summed PSS is the real footprint: shared pages are split between workers.
+Linux only (reads /proc/self/smaps_rollup).
+
+Usage (from the repo root):
+    python benchmarks/memory_report.py --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+from backend.models import shared_artifacts
+from backend.models.cohort_engine import CohortEngine
+from backend.models.risk_engine import RiskEngine
+
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+COHORT_SNAPSHOT_DIR = os.path.join("data", "cohort_snapshot")
+
+
+def load_engines(shared):
+    mmap_mode = "r" if shared else None
+    risk_engine = RiskEngine(cache_size=0, mmap_mode=mmap_mode)
+    cohort_engine = CohortEngine(snapshot_dir=COHORT_SNAPSHOT_DIR if shared else None)
+    return risk_engine, cohort_engine
+
+
+def exercise(engines, patients):
+    risk_engine, cohort_engine = engines
+    for patient in patients:
+        risk_engine.predict_risk(patient)
+        cohort_engine.get_percentiles(patient)
+        cohort_engine.find_digital_twins(patient)
+
+
+def worker(engines, patients, barrier, results):
+    if engines is None:
+        engines = load_engines(shared=False)
+    exercise(engines, patients)
+    # Report only once every worker is up, so PSS reflects the final sharing
+    barrier.wait()
+    results.put((os.getpid(), shared_artifacts.memory_usage()))
+    barrier.wait()
+
+
+def run(mode, n_workers, patients):
+    ctx = multiprocessing.get_context("fork")
+    engines = None
+    if mode == "shared":
+        engines = load_engines(shared=True)
+        exercise(engines, patients)
+        shared_artifacts.freeze_for_fork()
+
+    barrier, results = ctx.Barrier(n_workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(engines, patients, barrier, results)) for _ in range(n_workers)]
+    for proc in procs:
+        proc.start()
+    usages = [results.get() for _ in procs]
+    if engines is not None:
+        # The master holds its share of the mapped pages too
+        usages.append(("master", shared_artifacts.memory_usage()))
+    for proc in procs:
+        proc.join()
+    return usages
+
+
+def report(mode, usages):
+    print(f"  {mode}")
+    for pid, usage in usages:
+        print(f"    {pid if pid == 'master' else f'worker {pid}':<15} RSS {usage.get('Rss', 0):8.1f}   PSS {usage.get('Pss', 0):8.1f}   "
+              f"Private {usage.get('Private', 0):8.1f}   Shared {usage.get('Shared', 0):8.1f}")
+    total_pss = sum(u.get("Pss", 0) for _, u in usages)
+    total_private = sum(u.get("Private", 0) for _, u in usages)
+    print(f"    {'total':<15} PSS {total_pss:8.1f} MB   Private {total_private:8.1f} MB")
+    return total_pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory: independent vs preload + fork")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--patients", type=int, default=20, help="Patients each worker scores before reporting")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("This report needs Linux (/proc/self/smaps_rollup).")
+        sys.exit(1)
+
+    patients = pd.read_csv(DATA_PATH).drop(columns=["diabetes"]).head(args.patients).to_dict("records")
+
+    independent = run("independent", args.workers, patients)
+    shared = run("shared", args.workers, patients)
+
+    print(f"\n{'='*80}")
+    print(f"{'PER-WORKER MEMORY (MB)':^80}")
+    print(f"{'='*80}")
+    before = report("independent (each worker loads its own engines)", independent)
+    print(f"{'─'*80}")
+    after = report("shared (preload, mmap artifacts, gc.freeze, fork)", shared)
+    print(f"{'─'*80}")
+    print(f"  Summed PSS saved: {before - after:.1f} MB ({(1 - after / before) * 100:.0f}%) across {args.workers} workers")
+    print(f"{'='*80}\n")
+
+
+if __name__ == "__main__":
+    main()
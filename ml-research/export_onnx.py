@@ -0,0 +1,161 @@
+"""
+Export the risk pipeline's calibrated voting ensemble to ONNX.
+
+The fitted preprocessor stays in numpy (RiskEngine compiles it at load time)
+because running it in float32 inside ONNX shifts the interaction features
+enough to move predictions. The exported graph takes the dense float32
+feature vector and returns class probabilities.
+
+The artifact is only written if onnxruntime reproduces the joblib
+pipeline's probabilities within --atol on rows of the dataset.
+
+Requires: skl2onnx, onnxmltools, onnxruntime
+
+Usage (from the repo root):
+    python ml-research/export_onnx.py --atol 0.01
+"""
+import argparse
+import copy
+import hashlib
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+# --- Configuration ---
+DATA_PATH = os.path.join("data", "diabetes_dataset.csv")
+MODEL_DIR = os.path.join("backend", "models")
+MODEL_PATH = os.path.join(MODEL_DIR, "risk_pipeline_v1.joblib")
+ONNX_PATH = os.path.join(MODEL_DIR, "risk_pipeline_v1.onnx")
+RANDOM_SEED = 42
+
+
+def hash_artifact(path):
+    """Same short SHA-256 RiskEngine records as artifact_hash."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def register_xgboost_converter():
+    import xgboost as xgb
+    from skl2onnx import update_registered_converter
+    from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+    from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+
+    update_registered_converter(
+        xgb.XGBClassifier, "XGBoostXGBClassifier",
+        calculate_linear_classifier_output_shapes, convert_xgboost,
+        options={"nocl": [True, False], "zipmap": [True, False, "columns"]}
+    )
+
+
+def converter_friendly_copy(classifier):
+    """
+    skl2onnx needs VotingClassifier.weights as an array and
+    flatten_transform=False. Neither changes predict_proba.
+    """
+    classifier = copy.deepcopy(classifier)
+    estimators = [cc.estimator for cc in getattr(classifier, "calibrated_classifiers_", [])] or [classifier]
+    for est in estimators:
+        if hasattr(est, "flatten_transform"):
+            est.flatten_transform = False
+        if getattr(est, "weights", None) is not None:
+            est.weights = np.asarray(est.weights, dtype=float)
+    return classifier
+
+
+def convert(classifier, n_features, opset):
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    register_xgboost_converter()
+    return convert_sklearn(
+        classifier,
+        initial_types=[("input", FloatTensorType([None, n_features]))],
+        options={id(classifier): {"zipmap": False}},
+        target_opset={"": opset, "ai.onnx.ml": 3}
+    )
+
+
+def load_check_rows(rows):
+    from backend.models.risk_engine import engineer_features
+
+    df = pd.read_csv(DATA_PATH).drop(columns=["diabetes"])
+    if rows and rows < len(df):
+        df = df.sample(rows, random_state=RANDOM_SEED)
+
+    # Same feature engineering the API uses
+    return engineer_features(df.reset_index(drop=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export risk_pipeline_v1.joblib to ONNX")
+    parser.add_argument("--model", default=MODEL_PATH, help="Path to the joblib pipeline")
+    parser.add_argument("--output", default=ONNX_PATH, help="Where to write the ONNX model")
+    parser.add_argument("--atol", type=float, default=0.01, help="Max allowed |p_onnx - p_joblib| on any row")
+    parser.add_argument("--mean-atol", type=float, default=1e-4, help="Max allowed mean |p_onnx - p_joblib|")
+    parser.add_argument("--rows", type=int, default=20000, help="Dataset rows to check (0 = all)")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("❌ onnxruntime not installed. pip install skl2onnx onnxmltools onnxruntime")
+        sys.exit(1)
+
+    print(f"Loading pipeline from {args.model}...")
+    pipeline = joblib.load(args.model)
+    preprocessor = pipeline.named_steps["preprocessor"]
+    classifier = pipeline.steps[-1][1]
+
+    check_df = load_check_rows(args.rows)
+    X = preprocessor.transform(check_df)
+
+    print("Converting calibrated ensemble to ONNX...")
+    onnx_model = convert(converter_friendly_copy(classifier), X.shape[1], args.opset)
+
+    # --- Numeric equivalence check ---
+    session = ort.InferenceSession(onnx_model.SerializeToString(), providers=["CPUExecutionProvider"])
+    onnx_probs = session.run(["probabilities"], {"input": X.astype(np.float32)})[0][:, 1]
+    ref_probs = pipeline.predict_proba(check_df)[:, 1]
+    diff = np.abs(onnx_probs - ref_probs)
+
+    print(f"\n{'='*60}")
+    print(f"{'ONNX EQUIVALENCE CHECK':^60}")
+    print(f"{'='*60}")
+    print(f"  Rows checked:         {len(diff):,}")
+    print(f"  Max |diff|:           {diff.max():.2e}  (limit {args.atol:.0e})")
+    print(f"  Mean |diff|:          {diff.mean():.2e}  (limit {args.mean_atol:.0e})")
+    print(f"  p99 |diff|:           {np.percentile(diff, 99):.2e}")
+    print(f"{'='*60}\n")
+
+    if diff.max() > args.atol or diff.mean() > args.mean_atol:
+        print("❌ ONNX model drifts past tolerance. Artifact NOT written.")
+        sys.exit(1)
+
+    meta = {
+        "source_model": os.path.basename(args.model),
+        "source_version": hash_artifact(args.model),
+        "n_features": str(X.shape[1]),
+        "max_abs_diff": f"{diff.max():.6e}",
+        "mean_abs_diff": f"{diff.mean():.6e}",
+    }
+    for key, value in meta.items():
+        entry = onnx_model.metadata_props.add()
+        entry.key, entry.value = key, value
+
+    with open(args.output, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    print(f"✅ ONNX model saved to {args.output} (source version {meta['source_version']})")
+
+
+if __name__ == "__main__":
+    main()
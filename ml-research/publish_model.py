@@ -0,0 +1,64 @@
+"""
+Publish the artifacts written by train_pro.py / train_sota.py (and optionally
+export_onnx.py) as a new immutable version in the model registry.
+
+The running API keeps serving its current version. Activate the new one
+without a restart:
+
+    curl -X POST http://localhost:8001/admin/models/<version>/activate
+
+Usage (from the repo root):
+    python ml-research/publish_model.py --source train_pro.py
+    python ml-research/publish_model.py --version 2026-10-16 --with-onnx --activate
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from backend.models.model_registry import ModelRegistry, PIPELINE_FILE, BACKGROUND_FILE, ONNX_FILE
+
+MODEL_DIR = os.path.join("backend", "models")
+REGISTRY_DIR = os.path.join(MODEL_DIR, "registry")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish trained artifacts as a registry version")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Directory the training script wrote to")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--version", default=None, help="Version label (default: short SHA-256 of the pipeline)")
+    parser.add_argument("--source", default=None, help="Training script / run that produced the model")
+    parser.add_argument("--with-onnx", action="store_true", help="Include risk_pipeline_v1.onnx")
+    parser.add_argument("--activate", action="store_true",
+                        help="Point ACTIVE at the new version (running servers follow within seconds)")
+    args = parser.parse_args()
+
+    onnx_path = os.path.join(args.model_dir, ONNX_FILE) if args.with_onnx else None
+    registry = ModelRegistry(args.registry)
+    try:
+        manifest = registry.publish(
+            os.path.join(args.model_dir, PIPELINE_FILE),
+            os.path.join(args.model_dir, BACKGROUND_FILE),
+            onnx_path=onnx_path, version=args.version, source=args.source
+        )
+    except (FileExistsError, FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"\n{'='*60}")
+    print(f"{'MODEL PUBLISHED':^60}")
+    print(f"{'='*60}")
+    print(f"  Version:  {manifest['version']}")
+    print(f"  Path:     {registry.version_dir(manifest['version'])}")
+    for name, sha in manifest["files"].items():
+        print(f"  {name:<28} {sha[:16]}")
+    print(f"{'='*60}\n")
+
+    if args.activate:
+        registry.set_active(manifest["version"])
+        print(f"✅ ACTIVE -> {manifest['version']}")
+
+
+if __name__ == "__main__":
+    main()
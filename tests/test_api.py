@@ -45,3 +45,377 @@ def test_validation_error():
     
     response = client.post("/predict", json=invalid_data)
     assert response.status_code == 422
+
+def test_predict_batch_endpoint():
+    second = SAMPLE_PATIENT.copy()
+    second['HbA1c_level'] = 8.5
+    second['blood_glucose_level'] = 220
+    
+    response = client.post("/predict/batch", json={"patients": [SAMPLE_PATIENT, second]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 2
+    
+    # Batch scores must match single-patient scores, in input order
+    single = client.post("/predict", json=second).json()
+    assert abs(results[1]["risk_score"] - single["risk_score"]) < 1e-9
+    assert results[1]["risk_level"] == single["risk_level"]
+
+def test_fhir_bundle_shares_prediction_cache():
+    client.post("/predict", json=SAMPLE_PATIENT)
+    before = client.get("/cache/stats").json()
+    
+    response = client.post("/fhir/bundle", json=SAMPLE_PATIENT)
+    assert response.status_code == 200
+    
+    after = client.get("/cache/stats").json()
+    assert after["hits"] == before["hits"] + 1
+
+def test_coalescer_stats_endpoint():
+    client.post("/predict", json=SAMPLE_PATIENT)
+    response = client.get("/predict/coalescer/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["requests"] >= 1
+    assert "queue_depth" in stats
+    assert "+Inf" in stats["wait_ms"]["buckets"]
+
+def test_explain_async_job():
+    import time
+    
+    first = client.post("/explain/async", json=SAMPLE_PATIENT)
+    assert first.status_code == 202
+    job_id = first.json()["job_id"]
+    
+    # Duplicate submission attaches to the same job
+    second = client.post("/explain/async", json=SAMPLE_PATIENT)
+    assert second.json()["job_id"] == job_id
+    
+    deadline = time.time() + 120
+    job = first.json()
+    while job["status"] in ("pending", "running") and time.time() < deadline:
+        time.sleep(0.5)
+        job = client.get(f"/explain/jobs/{job_id}").json()
+    
+    assert job["status"] == "completed"
+    assert isinstance(job["explanations"], list)
+
+def test_explain_job_not_found():
+    response = client.get("/explain/jobs/does-not-exist")
+    assert response.status_code == 404
+
+def test_engine_registry_stats():
+    client.post("/predict", json=SAMPLE_PATIENT)
+    response = client.get("/engines")
+    assert response.status_code == 200
+    risk = response.json()["risk"]
+    assert risk["status"] == "ready"
+    assert risk["init_seconds"] is not None
+
+class FakeRiskEngine:
+    def predict_risk(self, patient_data):
+        return 0.75
+
+    def predict_risk_batch(self, patients):
+        return [0.75] * len(patients)
+
+def test_engines_can_be_swapped_for_fakes():
+    from backend.dependencies import get_engine
+    
+    app.dependency_overrides[get_engine("risk")] = FakeRiskEngine
+    app.dependency_overrides[get_engine("coalescer")] = lambda: None
+    app.dependency_overrides[get_engine("history")] = lambda: None
+    try:
+        response = client.post("/predict", json=SAMPLE_PATIENT)
+        assert response.json()["risk_score"] == 0.75
+        assert response.json()["risk_level"] == "High"
+        
+        # Routers resolve the same engine
+        bundle = client.post("/fhir/bundle", json=SAMPLE_PATIENT).json()
+        assert bundle["entry"][1]["resource"]["prediction"][0]["probabilityDecimal"] == 0.75
+    finally:
+        app.dependency_overrides.clear()
+
+class FakeClinicalLLM:
+    def __init__(self, state):
+        self.state = state
+        self.error = None
+
+    @property
+    def is_ready(self):
+        return self.state == "ready"
+
+    def status(self):
+        return {"state": self.state, "error": self.error, "download": {"bytes": 0, "total": None}}
+
+    def generate_report(self, patient_data, risk_score, risk_level, explanations):
+        return "Fake report"
+
+def test_report_waits_for_llm_with_retry_after():
+    from backend.dependencies import get_engine
+    
+    app.dependency_overrides[get_engine("clinical_llm")] = lambda: FakeClinicalLLM("loading")
+    try:
+        ready = client.get("/ready")
+        assert ready.status_code == 200  # predictions are already served
+        assert ready.json()["status"] == "loading"
+        assert ready.json()["components"]["clinical_llm"]["state"] == "loading"
+        
+        response = client.post("/report", json=SAMPLE_PATIENT)
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) > 0
+    finally:
+        app.dependency_overrides.clear()
+
+def test_report_when_llm_ready():
+    from backend.dependencies import get_engine
+    
+    from contextlib import contextmanager
+    
+    risk_engine = app.state.engines.get("risk")
+    class CountingLeases:
+        # Score and explanation must come from one lease (one model version)
+        leases = 0
+        
+        @contextmanager
+        def lease(self):
+            CountingLeases.leases += 1
+            yield risk_engine
+    
+    app.dependency_overrides[get_engine("clinical_llm")] = lambda: FakeClinicalLLM("ready")
+    app.dependency_overrides[get_engine("pdf")] = lambda: None
+    try:
+        assert client.get("/ready").json()["status"] == "ready"
+        response = client.post("/report", json=SAMPLE_PATIENT)
+        assert response.status_code == 200
+        assert response.json()["report"] == "Fake report"
+        assert response.json()["model_version"] == risk_engine.model_version
+        
+        app.dependency_overrides[get_engine("risk")] = lambda: CountingLeases()
+        assert client.post("/report", json=SAMPLE_PATIENT).status_code == 200
+        assert CountingLeases.leases == 1
+    finally:
+        app.dependency_overrides.clear()
+
+def test_predict_reports_model_version():
+    data = client.post("/predict", json=SAMPLE_PATIENT).json()
+    assert data["model_version"] == client.get("/cache/stats").json()["model_version"]
+    
+    batch = client.post("/predict/batch", json={"patients": [SAMPLE_PATIENT]}).json()
+    assert batch["model_version"] == data["model_version"]
+    explained = client.post("/explain", json=SAMPLE_PATIENT).json()
+    assert explained["model_version"] == data["model_version"]
+    simulated = client.post("/simulate", json={"patient": SAMPLE_PATIENT, "modifications": {"bmi": 24.0}}).json()
+    assert simulated["model_version"] == data["model_version"]
+
+def test_activate_unknown_model_version():
+    response = client.post("/admin/models/does-not-exist/activate")
+    assert response.status_code == 404
+    assert "active_version" in client.get("/admin/models").json()
+
+def test_explain_quality_tier():
+    response = client.post("/explain?tier=fast", json=dict(SAMPLE_PATIENT, age=52))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tier"] == "fast"
+    assert data["additivity_error"] is not None
+    
+    assert client.post("/explain?tier=instant", json=SAMPLE_PATIENT).status_code == 422
+
+def parse_prometheus_text(text):
+    """Strict-enough parser for the Prometheus text format: {(name, labels): value}, {family: type}."""
+    import re
+    sample_re = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(.*)\})? (\S+)$')
+    label_re = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(,|$)')
+    samples, types = {}, {}
+    for line in text.strip().split("\n"):
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram", "summary", "untyped")
+            types[name] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        match = sample_re.match(line)
+        assert match, f"unparseable line: {line}"
+        name, _, label_body, value = match.groups()
+        labels = tuple((k, v) for k, v, _ in label_re.findall(label_body or ""))
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert family in types, f"sample before TYPE: {line}"
+        samples[(name, labels)] = float(value)
+    return samples, types
+
+def test_metrics_endpoint_parses():
+    client.post("/predict", json=SAMPLE_PATIENT)
+    client.post("/explain?tier=fast", json=SAMPLE_PATIENT)
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples, types = parse_prometheus_text(response.text)
+    
+    assert types["clinical_risk_stage_duration_seconds"] == "histogram"
+    stages = {dict(labels).get("stage") for name, labels in samples if name == "clinical_risk_stage_duration_seconds_count"}
+    assert {"feature_engineering", "predict_proba", "shap"} <= stages
+    
+    # Buckets are cumulative and +Inf equals _count
+    shap_labels = (("component", "risk_engine"), ("stage", "shap"))
+    buckets = sorted(
+        (float(dict(labels)["le"]), value) for (name, labels), value in samples.items()
+        if name == "clinical_risk_stage_duration_seconds_bucket" and labels[:2] == shap_labels
+    )
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)
+    assert counts[-1] == samples[("clinical_risk_stage_duration_seconds_count", shap_labels)]
+    
+    routes = {dict(labels).get("route") for name, labels in samples if name.startswith("clinical_risk_http_request")}
+    assert "/predict" in routes
+
+def test_simulate_scenarios_ranked():
+    patient = dict(SAMPLE_PATIENT, bmi=33.0, HbA1c_level=7.5, smoking_history="current")
+    response = client.post("/simulate/scenarios", json={"patient": patient})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["model_version"]
+    reductions = [s["risk_reduction"] for s in data["scenarios"]]
+    assert len(reductions) > 10
+    assert reductions == sorted(reductions, reverse=True)
+    for s in data["scenarios"]:
+        assert s["new_risk"] == pytest.approx(data["original_risk"] - s["risk_reduction"])
+    
+    # Same scores as scoring each scenario on its own
+    quit_smoking = next(s for s in data["scenarios"] if s["name"] == "Quit Smoking")
+    assert quit_smoking["modifications"] == {"smoking_history": "never"}
+    single = client.post("/simulate", json={"patient": patient, "modifications": quit_smoking["modifications"]})
+    assert single.json()["new_risk"] == pytest.approx(quit_smoking["new_risk"])
+    
+    top = client.post("/simulate/scenarios", json={"patient": patient, "scenarios": ["Quit Smoking"], "top_k": 1})
+    assert [s["name"] for s in top.json()["scenarios"]] == ["Quit Smoking"]
+
+def test_simulate_optimize():
+    patient = dict(SAMPLE_PATIENT, bmi=33.0, HbA1c_level=7.5, blood_glucose_level=180)
+    body = {"patient": patient, "target_risk": 0.2, "top_k": 2, "time_limit_ms": 10000,
+            "features": {"HbA1c_level": {"min": 5.0}, "blood_glucose_level": {"min": 90}}}
+    response = client.post("/simulate/optimize", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["plans"]
+    for plan in data["plans"]:
+        assert set(plan["modifications"]) <= {"HbA1c_level", "blood_glucose_level"}
+        assert plan["new_risk"] < 0.2
+    
+    body["features"] = {"age": {"min": 30}}
+    assert client.post("/simulate/optimize", json=body).status_code == 422
+    
+    # Already below the default BMI minimum: BMI is simply left alone
+    low_bmi = dict(SAMPLE_PATIENT, bmi=17.0, HbA1c_level=8.8, blood_glucose_level=260)
+    response = client.post("/simulate/optimize", json={"patient": low_bmi, "target_risk": 0.5, "time_limit_ms": 10000})
+    assert response.status_code == 200
+    assert response.json()["plans"]
+    assert all("bmi" not in plan["modifications"] for plan in response.json()["plans"])
+    body["features"] = {"bmi": {"min": 30, "max": 25}}
+    assert client.post("/simulate/optimize", json=body).status_code == 422
+
+def test_simulate_sensitivity_grid():
+    patient = dict(SAMPLE_PATIENT, age=61)
+    body = {"patient": patient, "axes": [{"feature": "HbA1c_level", "min": 4.0, "max": 9.0, "points": 20},
+                                         {"feature": "blood_glucose_level", "points": 15}]}
+    response = client.post("/simulate/sensitivity", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["features"] == ["HbA1c_level", "blood_glucose_level"]
+    assert len(data["risks"]) == 20 and len(data["risks"][0]) == 15
+    assert data["cached"] is False
+    
+    # Grid points match single predictions
+    hba1c, glucose = data["grid"]["HbA1c_level"][3], data["grid"]["blood_glucose_level"][7]
+    single = client.post("/predict", json=dict(patient, HbA1c_level=hba1c, blood_glucose_level=glucose)).json()
+    assert data["risks"][3][7] == pytest.approx(single["risk_score"], abs=1e-6)
+    
+    again = client.post("/simulate/sensitivity", json=body).json()
+    assert again["cached"] is True
+    assert again["risks"] == data["risks"]
+    
+    curve = client.post("/simulate/sensitivity", json={"patient": patient, "axes": [{"feature": "bmi", "points": 5}]})
+    assert len(curve.json()["risks"]) == 5
+    
+    bad = client.post("/simulate/sensitivity", json={"patient": patient, "axes": [{"feature": "gender"}]})
+    assert bad.status_code == 422
+    unknown = client.post("/simulate/sensitivity", json={"patient": patient, "axes": [{"feature": "foo", "values": [1, 2]}]})
+    assert unknown.status_code == 422
+
+def test_simulation_session_flow():
+    created = client.post("/simulate/sessions", json=SAMPLE_PATIENT)
+    assert created.status_code == 201
+    session = created.json()
+    assert session["explanations"]
+    baseline = client.post("/predict", json=SAMPLE_PATIENT).json()["risk_score"]
+    assert session["original_risk"] == pytest.approx(baseline)
+    
+    url = f"/simulate/sessions/{session['session_id']}"
+    moved = client.post(f"{url}/simulate", json={"modifications": {"bmi": 24.0}}).json()
+    assert moved["changes"] == {"bmi": {"from": 28.5, "to": 24.0}}
+    expected = client.post("/simulate", json={"patient": SAMPLE_PATIENT, "modifications": {"bmi": 24.0}}).json()
+    assert moved["new_risk"] == pytest.approx(expected["new_risk"])
+    assert moved["risk_reduction"] == pytest.approx(expected["risk_reduction"])
+    
+    assert client.post(f"{url}/simulate", json={"modifications": {"weight": 80}}).status_code == 422
+    assert client.get(url).json()["simulations"] == 1
+    assert client.delete(url).status_code == 204
+    assert client.post(f"{url}/simulate", json={"modifications": {"bmi": 24.0}}).status_code == 404
+
+def test_cohort_percentiles_stratified_and_batch():
+    response = client.post("/cohort/analysis", json=SAMPLE_PATIENT)
+    assert response.status_code == 200
+    overall = response.json()
+    assert overall["stratum"] is None
+    assert set(overall["percentiles"]) == {"bmi_percentile", "HbA1c_level_percentile",
+                                           "blood_glucose_level_percentile", "age_percentile"}
+    
+    banded = client.post("/cohort/analysis?stratify_by=age_band", json=SAMPLE_PATIENT).json()
+    assert banded["stratum"] == "Middle"
+    assert banded["percentiles"] != overall["percentiles"]
+    assert client.post("/cohort/analysis?stratify_by=zip", json=SAMPLE_PATIENT).status_code == 422
+    
+    patients = [SAMPLE_PATIENT, dict(SAMPLE_PATIENT, age=70, bmi=35.0)]
+    batch = client.post("/cohort/analysis/batch?stratify_by=age_band", json={"patients": patients}).json()
+    assert batch["results"][0] == banded
+    assert batch["results"][1]["stratum"] == "Elderly"
+
+def test_digital_twins_k_and_batch():
+    response = client.post("/cohort/twins?k=3", json=SAMPLE_PATIENT)
+    assert response.status_code == 200
+    single = response.json()
+    assert len(single["twins"]) == 3
+    assert single["distances"] == sorted(single["distances"])
+    assert [t["distance"] for t in single["twins"]] == single["distances"]
+    assert client.post("/cohort/twins?k=0", json=SAMPLE_PATIENT).status_code == 422
+    
+    patients = [SAMPLE_PATIENT, dict(SAMPLE_PATIENT, age=70, bmi=35.0)]
+    batch = client.post("/cohort/twins/batch?k=3", json={"patients": patients}).json()
+    assert len(batch["results"]) == 2
+    assert batch["results"][0] == single
+    assert abs(batch["results"][1]["twins"][0]["age"] - 70) < abs(single["twins"][0]["age"] - 70)
+
+def test_digital_twins_mixed_mode_matches_categories():
+    response = client.post("/cohort/twins?mode=mixed&k=10", json=SAMPLE_PATIENT)
+    assert response.status_code == 200
+    twins = response.json()["twins"]
+    assert len(twins) == 10
+    for twin in twins:
+        assert all(twin[c] == SAMPLE_PATIENT[c] for c in ["gender", "smoking_history", "hypertension", "heart_disease"])
+    assert client.post("/cohort/twins?mode=gower", json=SAMPLE_PATIENT).status_code == 422
+
+def test_cohort_stats_filters_and_groups():
+    request = {"filters": {"age": {"min": 45, "max": 60}, "hypertension": {"values": [1]}},
+               "group_by": ["gender", "smoking_history"]}
+    response = client.post("/cohort/stats", json=request)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["filters"]["age"] == ["45-60"]
+    assert stats["count"] == sum(g["count"] for g in stats["groups"]) > 0
+    assert stats["diabetes_cases"] == sum(g["diabetes_cases"] for g in stats["groups"])
+    assert set(stats["groups"][0]["key"]) == {"gender", "smoking_history"}
+    
+    assert client.post("/cohort/stats", json={"filters": {"age": {"min": 50}}}).status_code == 422
+    assert client.post("/cohort/stats", json={"group_by": ["zip_code"]}).status_code == 422
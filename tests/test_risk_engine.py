@@ -3,6 +3,8 @@ import pandas as pd
 import numpy as np
 import os
 import sys
+import shutil
+import time
 
 # Ensure backend module can be imported
 sys.path.append(os.getcwd())
@@ -66,3 +68,489 @@ def test_categorical_handling(risk_engine):
     
     risk = risk_engine.predict_risk(bad_data)
     assert 0.0 <= risk <= 1.0
+
+def test_predict_risk_batch_matches_single(risk_engine):
+    """Batch scoring must agree with row-by-row scoring and keep input order."""
+    patients = [SAMPLE_DATA, dict(SAMPLE_DATA, age=70, bmi=35.0, HbA1c_level=8.0)]
+    batch = risk_engine.predict_risk_batch(patients)
+    assert len(batch) == 2
+    for patient, score in zip(patients, batch):
+        assert abs(score - risk_engine.predict_risk(patient)) < 1e-9
+
+    # DataFrame input gives the same result
+    df_batch = risk_engine.predict_risk_batch(pd.DataFrame(patients))
+    assert np.allclose(batch, df_batch)
+
+def test_tree_explainer_additivity(risk_engine):
+    """Tree-mode attributions must sum to f(x) - E[f(x)] over the input features."""
+    if not risk_engine.explainer or risk_engine.explainer.mode != "tree":
+        pytest.skip("Tree explainer not initialized")
+
+    df = risk_engine._preprocess(SAMPLE_DATA)
+    values = risk_engine.explainer.shap_values(df)
+    assert values.shape == (1, len(df.columns))
+
+    expected = risk_engine.predict_risk(SAMPLE_DATA) - risk_engine.explainer.expected_value
+    assert abs(values.sum() - expected) < 1e-6
+
+def test_prediction_cache_hits_and_keys(risk_engine):
+    """Equivalent payloads share one cache entry; repeat calls are hits."""
+    risk_engine.cache.clear()
+    before = risk_engine.cache_stats()
+
+    first = risk_engine.predict_risk(SAMPLE_DATA)
+    # Same patient with float-typed age must map to the same key
+    second = risk_engine.predict_risk(dict(SAMPLE_DATA, age=45.0))
+    assert first == second
+
+    stats = risk_engine.cache_stats()
+    assert stats["hits"] - before["hits"] == 1
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["model_version"] == risk_engine.model_version
+
+def test_prediction_cache_eviction():
+    from backend.models.prediction_cache import PredictionCache
+
+    cache = PredictionCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")       # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+    expired = PredictionCache(max_size=2, ttl_seconds=-1)
+    expired.set("a", 1)
+    assert expired.get("a") is None
+
+def test_fast_path_parity(risk_engine):
+    """The compiled numpy transform must match the sklearn pipeline over the dataset."""
+    if risk_engine.fast_transform is None:
+        pytest.skip("Fast inference path not compiled")
+
+    data_path = os.path.join("data", "diabetes_dataset.csv")
+    if not os.path.exists(data_path):
+        pytest.skip(f"Dataset not found at {data_path}")
+
+    df = pd.read_csv(data_path).drop(columns=['diabetes'])
+    # Edge cases: unseen categories and out-of-range bins
+    edge = pd.DataFrame([
+        dict(SAMPLE_DATA, gender='Alien', smoking_history='ChainSmoker'),
+        dict(SAMPLE_DATA, age=0, bmi=120.0),
+    ])
+    df = pd.concat([df, edge], ignore_index=True)
+
+    fast = np.vstack([
+        risk_engine.fast_transform.transform_row(risk_engine._engineer_row(row))
+        for row in df.to_dict('records')
+    ])
+    reference = risk_engine.pipeline.named_steps['preprocessor'].transform(risk_engine._preprocess_batch(df))
+    assert np.allclose(fast, reference, atol=1e-9)
+
+    sample = df.sample(500, random_state=42).index
+    fast_probs = risk_engine.classifier.predict_proba(fast[sample])[:, 1]
+    ref_probs = risk_engine.pipeline.predict_proba(risk_engine._preprocess_batch(df.loc[sample]))[:, 1]
+    assert np.allclose(fast_probs, ref_probs, atol=1e-9)
+
+def test_onnx_backend_matches_sklearn(risk_engine):
+    """The onnxruntime backend must agree with the joblib pipeline."""
+    pytest.importorskip("onnxruntime")
+    if not os.path.exists(risk_engine.onnx_path):
+        pytest.skip("ONNX model not exported. Run ml-research/export_onnx.py first.")
+
+    onnx_engine = RiskEngine(backend="onnx", cache_size=0)
+    if onnx_engine.onnx_model is None:
+        pytest.skip("ONNX model is stale or could not be loaded")
+
+    patients = [SAMPLE_DATA, dict(SAMPLE_DATA, age=70, bmi=35.0, HbA1c_level=8.0)]
+    assert np.allclose(onnx_engine.predict_risk_batch(patients), risk_engine.predict_risk_batch(patients), atol=1e-2)
+    assert abs(onnx_engine.predict_risk(SAMPLE_DATA) - risk_engine.predict_risk(SAMPLE_DATA)) < 1e-2
+
+def test_batch_coalescer_groups_concurrent_requests():
+    """Requests inside one window are scored with a single batch call."""
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.models.batch_coalescer import BatchCoalescer
+
+    class FakeEngine:
+        def __init__(self):
+            self.batch_sizes = []
+
+        def predict_risk_batch(self, patients):
+            self.batch_sizes.append(len(patients))
+            return [p['age'] / 100 for p in patients]
+
+    engine = FakeEngine()
+    coalescer = BatchCoalescer(engine, window_ms=200, max_batch_size=8)
+    try:
+        patients = [dict(SAMPLE_DATA, age=age) for age in range(20, 36)]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            scores = list(pool.map(coalescer.predict, patients))
+    finally:
+        coalescer.close()
+
+    # Every caller gets its own score back
+    assert scores == [p['age'] / 100 for p in patients]
+    assert sum(engine.batch_sizes) == 16
+    assert max(engine.batch_sizes) <= 8
+    assert len(engine.batch_sizes) < 16
+
+    stats = coalescer.stats()
+    assert stats["requests"] == 16
+    assert stats["batch_size"]["buckets"]["+Inf"] == len(engine.batch_sizes)
+
+def test_engine_registry_lazy_eager_and_failures():
+    from backend.models.engine_registry import EngineRegistry
+    
+    built = []
+    registry = EngineRegistry()
+    registry.register("eager", lambda: built.append("eager") or "eager-engine")
+    registry.register("lazy", lambda: built.append("lazy") or "lazy-engine", lazy=True)
+    registry.register("broken", lambda: 1 / 0)
+    
+    registry.init_eager()
+    assert built == ["eager"]
+    assert registry.get("broken") is None
+    assert registry.stats()["broken"]["status"] == "failed"
+    
+    # Lazy engines are built once, on first use
+    assert registry.get("lazy") == "lazy-engine"
+    assert registry.get("lazy") == "lazy-engine"
+    assert built == ["eager", "lazy"]
+    assert registry.stats()["lazy"]["init_seconds"] is not None
+    
+    registry.override("eager", "fake")
+    assert registry.get("eager") == "fake"
+
+def test_model_hot_swap_drains_in_flight_requests(risk_engine, tmp_path):
+    from backend.models.hot_swap import HotSwapRiskEngine
+    from backend.models.model_registry import ModelRegistry
+    
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    registry.publish(risk_engine.model_path, risk_engine.bg_path, version="v2", source="test")
+    assert [m["version"] for m in registry.list_versions()] == ["v2"]
+    
+    engine = HotSwapRiskEngine(risk_engine, registry, engine_factory=lambda d: RiskEngine(model_dir=d),
+                               follow_registry=False, drain_timeout=30)
+    before = engine.predict_risk(SAMPLE_DATA)
+    
+    # A request still holding the old version blocks the drain, not the swap
+    with engine.lease() as old:
+        engine.swap_to("v2")
+        deadline = time.time() + 60
+        while engine.status()["swap"]["state"] in ("loading", "warming") and time.time() < deadline:
+            time.sleep(0.05)
+        assert engine.model_version == "v2"
+        assert engine.status()["draining"] == [{"version": old.model_version, "in_flight": 1}]
+    
+    status = engine.wait_for_swap(timeout=30)
+    assert status["swap"]["state"] == "active"
+    assert status["swap"]["drained"] is True
+    assert status["draining"] == []
+    assert registry.active_version() == "v2"
+    # Same artifacts, same scores; versioned scores carry the new version
+    assert engine.score_batch([SAMPLE_DATA]) == ([pytest.approx(before)], "v2")
+
+def test_explanation_tiers(risk_engine):
+    fast = risk_engine.explain_risk_detailed(SAMPLE_DATA, tier="fast")
+    assert fast["tier"] == "fast"
+    assert fast["folds_used"] == 1
+    assert fast["additivity_error"] is not None
+    
+    exact = risk_engine.explain_risk_detailed(SAMPLE_DATA, tier="exact")
+    assert exact["folds_used"] == exact["folds_total"]
+    assert exact["additivity_error"] < 1e-6
+    
+    # Once an exact explanation is cached it answers cheaper tiers too
+    assert risk_engine.explain_risk_detailed(SAMPLE_DATA, tier="fast")["tier"] == "exact"
+    
+    with pytest.raises(ValueError):
+        risk_engine.explain_risk_detailed(SAMPLE_DATA, tier="instant")
+
+def test_explanation_budget_stops_early(risk_engine):
+    result = risk_engine.explain_risk_detailed(SAMPLE_DATA, tier="exact", budget_ms=1)
+    assert result["stop_reason"] == "budget"
+    assert result["folds_used"] == 1
+    # Budget-truncated explanations are not cached
+    assert risk_engine.explain_risk_detailed(SAMPLE_DATA, tier="exact")["stop_reason"] == "complete"
+
+def test_synthetic_patients_match_dataset(tmp_path):
+    from backend.models.synthetic_patients import SyntheticPatientGenerator
+    
+    generator = SyntheticPatientGenerator.fit()
+    real = pd.read_csv(os.path.join("data", "diabetes_dataset.csv"))
+    synthetic = generator.sample(50000, np.random.default_rng(0))
+    
+    assert list(synthetic.columns) == list(real.columns)
+    assert set(synthetic["smoking_history"]) <= set(real["smoking_history"])
+    mix = synthetic["smoking_history"].value_counts(normalize=True)
+    expected = real["smoking_history"].value_counts(normalize=True)
+    assert (mix - expected).abs().max() < 0.01
+    
+    cols = ["age", "bmi", "HbA1c_level", "blood_glucose_level", "hypertension", "diabetes"]
+    assert np.allclose(synthetic[cols].mean(), real[cols].mean(), rtol=0.05)
+    assert (synthetic[cols].corr() - real[cols].corr()).abs().values.max() < 0.05
+    
+    # Chunked output is the same whatever the number of workers
+    generator.write(str(tmp_path / "a.csv"), 2500, chunk_size=1000, workers=1)
+    generator.write(str(tmp_path / "b.csv"), 2500, chunk_size=1000, workers=2)
+    a, b = pd.read_csv(tmp_path / "a.csv"), pd.read_csv(tmp_path / "b.csv")
+    assert len(a) == 2500
+    pd.testing.assert_frame_equal(a, b)
+
+def test_scenario_library_validation(tmp_path):
+    from backend.models.counterfactuals import load_scenario_library
+    
+    assert len(load_scenario_library()) >= 20
+    path = tmp_path / "scenarios.json"
+    path.write_text('[{"name": "Grow Taller", "set": {"height": {"add": 5}}}]')
+    with pytest.raises(ValueError):
+        load_scenario_library(str(path))
+
+def test_scenarios_never_raise_risk_factors():
+    from backend.models.counterfactuals import Counterfactuals, LOWER_IS_BETTER
+    
+    counterfactuals = Counterfactuals(risk_engine=None)
+    for bmi, hba1c, glucose in [(26.0, 5.8, 80), (31.3, 6.1, 95), (45.7, 9.0, 300), (25.1, 5.65, 101)]:
+        patient = dict(SAMPLE_DATA, bmi=bmi, HbA1c_level=hba1c, blood_glucose_level=glucose, smoking_history="current")
+        for scenario in counterfactuals.build_scenarios(patient):
+            for feature, value in scenario["modifications"].items():
+                if feature in LOWER_IS_BETTER:
+                    assert value < patient[feature], (scenario["name"], feature, value)
+                    assert value == round(value, 2)
+
+def test_counterfactual_search_minimal_plans(risk_engine):
+    from backend.models.counterfactual_search import CounterfactualSearch
+    
+    patient = dict(SAMPLE_DATA, bmi=33.0, HbA1c_level=7.5, blood_glucose_level=180)
+    result = CounterfactualSearch(risk_engine).search(patient, target_risk=0.2, top_k=3, time_limit_ms=10000)
+    assert result["stop_reason"] == "complete"
+    assert len(result["plans"]) == 3
+    assert result["candidates_evaluated"] < result["grid_size"]
+    
+    costs = [plan["cost"] for plan in result["plans"]]
+    assert costs == sorted(costs)
+    for plan in result["plans"]:
+        assert plan["new_risk"] < 0.2
+        assert risk_engine.predict_risk(dict(patient, **plan["modifications"])) == pytest.approx(plan["new_risk"])
+        assert plan["modifications"].get("bmi", 33.0) <= 33.0
+    
+    # Already below target: nothing to search
+    low = CounterfactualSearch(risk_engine).search(patient, target_risk=1.01)
+    assert low["plans"] == [] and low["candidates_evaluated"] == 0
+
+def test_simulation_sessions_ttl_and_memory_cap(risk_engine):
+    from backend.models.simulation_sessions import SimulationSessionManager
+    
+    sessions = SimulationSessionManager(risk_engine, ttl_seconds=0.2, explain=False)
+    first = sessions.create(SAMPLE_DATA)["session_id"]
+    assert sessions.simulate(first, {"HbA1c_level": 5.5})["changes"] == {"HbA1c_level": {"from": 6.2, "to": 5.5}}
+    time.sleep(0.3)
+    assert sessions.simulate(first, {"HbA1c_level": 5.5}) is None
+    assert sessions.stats()["expired"] == 1
+    
+    # Memory cap keeps only what fits, evicting least recently used first
+    sessions = SimulationSessionManager(risk_engine, max_memory_mb=0.001, explain=False)
+    ids = [sessions.create(dict(SAMPLE_DATA, age=30 + i))["session_id"] for i in range(10)]
+    stats = sessions.stats()
+    assert 0 < stats["active"] < 10
+    assert stats["memory_mb"] <= stats["max_memory_mb"]
+    assert stats["evicted"] == 10 - stats["active"]
+    assert sessions.get(ids[0]) is None and sessions.get(ids[-1]) is not None
+
+def test_cohort_percentiles_match_full_scan():
+    from backend.models.cohort_engine import CohortEngine, age_band
+    
+    cohort = CohortEngine()
+    df = cohort.df
+    patients = [dict(SAMPLE_DATA, age=age, bmi=bmi) for age, bmi in [(45, 28.5), (18, 21.0), (77, 41.3)]]
+    for patient, result in zip(patients, cohort.get_percentiles_batch(patients, stratify_by="age_band")):
+        stratum = df[age_band(df["age"]) == age_band([patient["age"]])[0]]
+        for m in ["bmi", "HbA1c_level", "blood_glucose_level", "age"]:
+            assert result[f"{m}_percentile"] == round((stratum[m] < patient[m]).mean() * 100, 1)
+        assert cohort.get_percentiles(patient)["bmi_percentile"] == round((df["bmi"] < patient["bmi"]).mean() * 100, 1)
+
+def test_digital_twins_batch_matches_row_lookup():
+    from backend.models.cohort_engine import CohortEngine
+    
+    cohort = CohortEngine()
+    patients = [dict(SAMPLE_DATA, age=age, bmi=bmi) for age, bmi in [(45, 28.5), (18, 21.0), (77, 41.3)]]
+    query = cohort.scaler.transform(pd.DataFrame(patients)[cohort.feature_cols].to_numpy(dtype=np.float64))
+    distances, indices = cohort.nn_model.kneighbors(query, n_neighbors=4)
+    
+    results = cohort.find_digital_twins_batch(patients, k=4)
+    columns = cohort.find_digital_twins_batch(patients, k=4, layout="columns")
+    for i, result in enumerate(results):
+        expected = cohort.df.iloc[indices[i]].to_dict("records")
+        assert [{k: v for k, v in t.items() if k != "distance"} for t in result["twins"]] == expected
+        assert np.allclose(result["distances"], distances[i], atol=1e-6)
+        assert columns[i]["twins"]["bmi"] == [t["bmi"] for t in result["twins"]]
+    assert cohort.find_digital_twins(patients[0], k=4) == results[0]["twins"]
+
+def test_ivf_twin_index_persists_and_inserts(tmp_path):
+    from backend.models.cohort_engine import CohortEngine
+    from backend.models.twin_index import IVFIndex
+    
+    # add_patients appends to the source CSV: work on a copy
+    source = tmp_path / "cohort.csv"
+    shutil.copy("data/diabetes_dataset.csv", source)
+    built = CohortEngine(data_path=str(source), index="ivf", index_dir=str(tmp_path / "index"))
+    loaded = CohortEngine(data_path=str(source), index="ivf", index_dir=str(tmp_path / "index"))
+    assert isinstance(loaded.index, IVFIndex) and isinstance(loaded.index.vectors, np.memmap)
+    assert np.array_equal(loaded.index.centroids, built.index.centroids)
+    
+    exact = CohortEngine()
+    patients = [dict(SAMPLE_DATA, age=age, bmi=bmi) for age, bmi in [(45, 28.5), (18, 21.0), (77, 41.3)]]
+    for approx, truth in zip(loaded.find_digital_twins_batch(patients, k=5), exact.find_digital_twins_batch(patients, k=5)):
+        assert np.allclose(approx["distances"], truth["distances"], atol=1e-4)
+    
+    newcomer = dict(SAMPLE_DATA, age=33, bmi=61.7, HbA1c_level=8.8, blood_glucose_level=299, diabetes=1)
+    row = loaded.add_patients([newcomer])[0]
+    assert row == len(exact.df)
+    twin = loaded.find_digital_twins(newcomer, k=1)[0]
+    assert twin["distance"] < 1e-5 and twin["bmi"] == 61.7
+
+def test_cohort_snapshot_reused_until_checksum_changes(tmp_path):
+    from backend.models.cohort_engine import CohortEngine
+    
+    source = tmp_path / "cohort.csv"
+    pd.read_csv("data/diabetes_dataset.csv").head(5000).to_csv(source, index=False)
+    snapshots = tmp_path / "snapshots"
+    
+    built = CohortEngine(data_path=str(source), snapshot_dir=str(snapshots))
+    loaded = CohortEngine(data_path=str(source), snapshot_dir=str(snapshots))
+    fitted = CohortEngine(data_path=str(source))
+    assert loaded.snapshot_version == built.snapshot_version
+    assert isinstance(loaded.sorted_metrics["bmi"], np.memmap)
+    for stratify_by in [None, "gender", "age_band"]:
+        assert loaded.get_percentiles(SAMPLE_DATA, stratify_by) == fitted.get_percentiles(SAMPLE_DATA, stratify_by)
+    assert loaded.find_digital_twins(SAMPLE_DATA) == fitted.find_digital_twins(SAMPLE_DATA)
+    
+    # Touching the file keeps the snapshot; changing its content rebuilds it
+    os.utime(source, (time.time() + 60, time.time() + 60))
+    assert CohortEngine(data_path=str(source), snapshot_dir=str(snapshots)).snapshot_version == built.snapshot_version
+    with open(source, "a") as f:
+        f.write("Female,50.0,0,0,never,30.0,6.0,150,0\n")
+    rebuilt = CohortEngine(data_path=str(source), snapshot_dir=str(snapshots))
+    assert rebuilt.snapshot_version != built.snapshot_version and len(rebuilt.df) == 5001
+    assert (snapshots / "ACTIVE").read_text().strip() == rebuilt.snapshot_version
+
+def test_cohort_cube_matches_scan_and_refreshes_appends(tmp_path):
+    from backend.models.cohort_cube import CohortCube
+    
+    source = tmp_path / "cohort.csv"
+    df = pd.read_csv("data/diabetes_dataset.csv")
+    df.head(5000).to_csv(source, index=False)
+    cube = CohortCube.from_csv(str(source))
+    
+    stats = cube.query({"bmi": {"min": 30}, "HbA1c_level": {"min": 6.5, "max": 8.0}}, ["heart_disease"])
+    scan = df.head(5000)
+    scan = scan[(scan.bmi >= 30) & (scan.HbA1c_level >= 6.5) & (scan.HbA1c_level < 8.0)]
+    assert stats["count"] == len(scan) and stats["diabetes_cases"] == scan.diabetes.sum()
+    for group in stats["groups"]:
+        assert group["count"] == (scan.heart_disease == group["key"]["heart_disease"]).sum()
+    
+    # Appended rows are counted incrementally, the same as a full rebuild
+    df.iloc[5000:6000].to_csv(source, mode="a", header=False, index=False)
+    assert cube.refresh() == 1000
+    rebuilt = CohortCube.from_csv(str(source))
+    assert np.array_equal(cube.counts, rebuilt.counts) and np.array_equal(cube.outcomes, rebuilt.outcomes)
+    female = {"gender": {"values": ["Female"]}}
+    assert cube.query(female)["count"] == rebuilt.query(female)["count"] == (df.head(6000).gender == "Female").sum()
+
+def test_cohort_cube_concurrent_refreshes_count_appends_once(tmp_path):
+    import threading
+    from backend.models.cohort_cube import CohortCube
+    
+    source = tmp_path / "cohort.csv"
+    df = pd.read_csv("data/diabetes_dataset.csv")
+    df.head(20000).to_csv(source, index=False)
+    cube = CohortCube.from_csv(str(source))
+    df.iloc[20000:20500].to_csv(source, mode="a", header=False, index=False)
+    
+    start = threading.Barrier(8)
+    def refresh():
+        start.wait()
+        cube.refresh()
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cube.rows == 20500 and cube.counts.sum() == 20500
+    assert cube.outcomes.sum() == df.head(20500).diabetes.sum()
+
+def test_gower_twin_index_is_exact_and_weighted():
+    from backend.models.mixed_twin_index import GowerTwinIndex
+    
+    df = pd.read_csv("data/diabetes_dataset.csv").head(5000)
+    numeric = ["age", "bmi", "HbA1c_level", "blood_glucose_level"]
+    categorical = ["gender", "smoking_history", "hypertension", "heart_disease"]
+    weights = {"hypertension": 3.0, "gender": 0.0, "bmi": 2.0}
+    index = GowerTwinIndex(weights).fit(df.head(4000))
+    index.add(df.iloc[4000:])
+    
+    # Brute-force weighted Gower distances against the same ranges
+    X = df[numeric].to_numpy(dtype=np.float64)
+    ranges = X[:4000].max(axis=0) - X[:4000].min(axis=0)
+    w = dict({c: 1.0 for c in numeric + categorical}, **weights)
+    queries = df.sample(20, random_state=0)
+    distances, indices = index.search(queries.to_dict("records"), 5)
+    for row, (_, q) in enumerate(queries.iterrows()):
+        d = (np.abs(X - q[numeric].to_numpy(dtype=np.float64)) / ranges) @ np.array([w[c] for c in numeric])
+        d = d + sum(w[c] * (df[c].astype(str) != str(q[c])).to_numpy() for c in categorical)
+        d = d / sum(w.values())
+        assert np.allclose(distances[row], np.sort(d)[:5])
+        assert np.allclose(d[indices[row]], distances[row])
+    
+    with pytest.raises(ValueError):
+        GowerTwinIndex({"zip_code": 1.0})
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_clinical_llm_background_load_restarts_after_fork(monkeypatch):
+    import threading
+    from backend.models import clinical_llm
+    
+    parent = os.getpid()
+    release = threading.Event()
+    
+    class SlowLLM(clinical_llm.ClinicalLLM):
+        def _load_model(self):
+            # Still loading in the parent when it forks; the child's own loader finishes
+            if os.getpid() == parent:
+                release.wait(10)
+            self.state = self.READY
+    
+    monkeypatch.setattr(clinical_llm, "GPT4All", object)
+    llm = SlowLLM(background=True)
+    assert llm.state == llm.LOADING
+    pid = os.fork()
+    if pid == 0:
+        ready = llm.wait_until_ready(timeout=5)
+        os._exit(0 if ready or llm.state == llm.FAILED else 1)
+    _, status = os.waitpid(pid, 0)
+    release.set()
+    assert os.WEXITSTATUS(status) == 0
+
+def test_cohort_engine_ingests_added_and_appended_rows_once(tmp_path):
+    from backend.models.cohort_engine import CohortEngine
+    
+    source = tmp_path / "cohort.csv"
+    df = pd.read_csv("data/diabetes_dataset.csv")
+    df.head(2000).to_csv(source, index=False)
+    cohort = CohortEngine(data_path=str(source))
+    
+    # add_patients persists to the CSV; the stats refresh must not count them again
+    added = df.iloc[2000:2010].to_dict("records")
+    assert cohort.add_patients(added) == list(range(2000, 2010))
+    assert len(pd.read_csv(source)) == 2010
+    assert cohort.cohort_stats()["count"] == len(cohort.df) == 2010
+    
+    # Rows appended to the CSV by others reach twins and percentiles, not only stats
+    outsider = dict(df.iloc[2010], age=33.0, bmi=61.7, HbA1c_level=8.8, blood_glucose_level=299)
+    pd.DataFrame([outsider] + df.iloc[2011:2020].to_dict("records")).to_csv(source, mode="a", header=False, index=False)
+    assert cohort.cohort_stats()["count"] == len(cohort.df) == 2020
+    assert cohort.find_digital_twins(outsider, k=1)[0]["bmi"] == 61.7
+    assert len(cohort.sorted_metrics["bmi"]) == 2020
+    assert cohort.cohort_stats()["diabetes_cases"] == df.head(2020).diabetes.sum()